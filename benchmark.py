@@ -0,0 +1,416 @@
+# Benchmark of the ingestion and of every query method of the processors, on
+# synthetic datasets of several sizes (see generate_data.py). It runs
+# offline: the graph side uses the local triplestore (.db) backend or, with
+# --http, the same store behind a local SPARQL endpoint (see
+# utils/sparql_server.py) that answers after --latency seconds, so the
+# round trips cost what they cost with a remote triplestore.
+#
+#   python benchmark.py --scales tiny,small --out results.json --baseline baseline.json --threshold 0.25
+#   python benchmark.py --scales small --http --latency 0.002
+#
+# Every measure records the wall time (best of --repeat runs), the rows
+# returned and the rows per second, together with the peak of the memory
+# allocated by the call (tracemalloc, on one more call: tracing slows the
+# calls down, so it is off while they are timed). A call that raises, returns
+# False, returns no rows or reports an error its processor caught is recorded
+# as failed, with the error, and its measures are not compared. With
+# --baseline the results are compared with a previous results file and the
+# exit status is 1 when a measure is slower than the baseline by more than
+# --threshold (0.25 = 25%).
+from argparse import ArgumentParser
+from csv import reader
+from json import dump, load
+from os import chdir, getcwd, makedirs
+from os.path import join, abspath, basename
+from platform import platform, python_version
+from resource import getrusage, RUSAGE_SELF
+from sys import platform as sys_platform
+from tempfile import mkdtemp
+from time import perf_counter
+from tracemalloc import is_tracing, start as start_tracing, stop as stop_tracing, reset_peak, get_traced_memory
+from datetime import datetime, timezone
+from utils.metrics import MetricsRegistry
+from utils.sparql_client import close_clients
+from utils.sparql_server import SparqlServer
+from generate_data import generate, collection_id, manifest_id, canvas_id
+from impl import (AnnotationProcessor, MetadataProcessor, CollectionProcessor, RelationalQueryProcessor,
+                  TriplestoreQueryProcessor, GenericQueryProcessor)
+
+# collections, manifests per collection, canvases per manifest, annotations per canvas
+SCALES = {
+    "tiny": (1, 5, 5, 1),
+    "small": (2, 10, 20, 1),
+    "medium": (5, 20, 50, 2),
+    "large": (10, 100, 100, 1)
+}
+
+# the query methods, with the arguments taken from the dataset (see arguments)
+RELATIONAL_METHODS = [
+    ("getAllAnnotations", []),
+    ("getAllImages", []),
+    ("getAnnotationsWithBody", ["body"]),
+    ("getAnnotationsWithBodyAndTarget", ["body", "canvas"]),
+    ("getAnnotationsWithTarget", ["canvas"]),
+    ("getEntitiesWithCreator", ["creator"]),
+    ("getEntitiesWithTitle", ["title"]),
+    ("getEntities", []),
+    ("getEntitiesWithIds", ["manifests"]),
+    ("getAnnotationsWithTargets", ["canvases"])
+]
+
+TRIPLESTORE_METHODS = [
+    ("getAllCanvases", []),
+    ("getAllCollections", []),
+    ("getAllManifests", []),
+    ("getAllManifestsWithCanvases", []),
+    ("getAllEntities", []),
+    ("getCanvasesInCollection", ["collection"]),
+    ("getCanvasesInManifest", ["manifest"]),
+    ("getManifestsInCollection", ["collection"]),
+    ("getManifestsWithCanvasesInCollection", ["collection"]),
+    ("getEntityIdsInCollection", ["collection"]),
+    ("getEntitiesWithLabel", ["label"]),
+    ("getEntitiesWithCanvas", ["canvas"]),
+    ("getEntitiesWithId", ["manifest"]),
+    ("getEntitiesWithIds", ["manifests"])
+]
+
+GENERIC_METHODS = [
+    ("getAllAnnotations", []),
+    ("getAllCanvas", []),
+    ("getAllCollections", []),
+    ("getAllImages", []),
+    ("getAllManifests", []),
+    ("getAnnotationsToCanvas", ["canvas"]),
+    ("getAnnotationsToCollection", ["collection"]),
+    ("getAnnotationsToManifest", ["manifest"]),
+    ("getAnnotationsWithBody", ["body"]),
+    ("getAnnotationsWithBodyAndTarget", ["body", "canvas"]),
+    ("getAnnotationsWithTarget", ["canvas"]),
+    ("getCanvasesInCollection", ["collection"]),
+    ("getCanvasesInManifest", ["manifest"]),
+    ("getEntityById", ["manifest"]),
+    ("getEntitiesWithCreator", ["creator"]),
+    ("getEntitiesWithLabel", ["label"]),
+    ("getEntitiesWithTitle", ["title"]),
+    ("getImagesAnnotatingCanvas", ["canvas"]),
+    ("getManifestsInCollection", ["collection"])
+]
+
+
+def peak_rss_kib():
+    # peak RSS of the whole process so far, for the meta block of the results;
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys_platform == "darwin" else peak
+
+
+def peak_kib(function):
+    # KiB allocated at the peak of a call of function, above what was
+    # allocated before it (numpy and pandas buffers included, not the page
+    # cache of sqlite)
+    started = not is_tracing()
+    if started:
+        start_tracing()
+    try:
+        reset_peak()
+        before = get_traced_memory()[0]
+        function()
+        return (get_traced_memory()[1] - before) // 1024
+    finally:
+        if started:
+            stop_tracing()
+
+
+def reported_errors(registry):
+    # the errors counted by the processors (see utils.metrics), by labels
+    if registry is None:
+        return dict()
+    metric = registry.dump().get("processor_errors_total", {"values": []})
+    return {tuple(value["labels"].values()): value["value"] for value in metric["values"]}
+
+
+def count_rows(result):
+    if result is None:
+        return 0
+    if hasattr(result, "__len__"):
+        return len(result)
+    return 1
+
+
+def failure(result, errors:dict, expect_rows:bool):
+    # why a call that did not raise has failed, None when it has not: the
+    # processors catch most errors, print them and return False (uploads) or
+    # an empty result
+    if errors:
+        return "reported " + ", ".join(f"{error} in {processor}.{method}" for processor, method, error in sorted(errors))
+    if result is False:
+        return "returned False"
+    if expect_rows and count_rows(result) == 0:
+        return "empty result"
+    return None
+
+
+def measure(function, repeat:int, registry:MetricsRegistry=None, expect_rows:bool=True):
+    # best wall time of repeat calls, with the rows of the last result and the
+    # peak memory of one more call; registry is the one of the processors
+    best = None
+    rows = 0
+    error = None
+    for _ in range(repeat):
+        before = reported_errors(registry)
+        start = perf_counter()
+        try:
+            result = function()
+        except Exception as e:
+            error = repr(e)
+            break
+        elapsed = perf_counter() - start
+        after = reported_errors(registry)
+        error = failure(result, {labels: count for labels, count in after.items() if count > before.get(labels, 0)}, expect_rows)
+        if error is not None:
+            break
+        best = elapsed if best is None else min(best, elapsed)
+        rows = count_rows(result)
+    seconds = best if best is not None and error is None else 0.0
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        "rowsPerSecond": rows / seconds if seconds else 0.0,
+        "peakKiB": peak_kib(function) if error is None else None,
+        "error": error
+    }
+
+
+def set_rows(measures:dict, rows:int):
+    # the rows of an upload are the ones it wrote, not its True
+    measures["rows"] = rows
+    measures["rowsPerSecond"] = rows / measures["seconds"] if measures["seconds"] else 0.0
+    return measures
+
+
+def check_graph(triplestore:TriplestoreQueryProcessor, dataset:dict):
+    # None when the graph holds the collections, manifests and canvases of the
+    # dataset, once each, else what differs
+    found = {"collections": len(triplestore.getAllCollections()), "manifests": len(triplestore.getAllManifests()),
+             "canvases": len(triplestore.getAllCanvases())}
+    wrong = [f"{found[kind]} {kind} instead of {dataset[kind]}" for kind in found if found[kind] != dataset[kind]]
+    return "graph has " + ", ".join(wrong) if wrong else None
+
+
+def arguments(scale:tuple):
+    # the values the arguments of the query methods are taken from: ids,
+    # labels, titles and creators that exist in the generated dataset
+    collections, manifests, canvases, annotations = scale
+    with open("metadata.csv", encoding="utf-8", newline="") as f:
+        # header, first collection, first manifest
+        rows = reader(f)
+        next(rows)
+        next(rows)
+        manifest_row = next(rows)
+    creator = manifest_row[2].split(";")[0].strip()
+    return {
+        "collection": collection_id(1),
+        "manifest": manifest_id(1, 1),
+        "canvas": canvas_id(1, 1, 1),
+        "label": "Manifest 1-1",
+        "title": "Title of manifest 1-1",
+        "creator": creator,
+        "body": "https://example.org/iiif/2/1-1-1-1/full/699,800/0/default.jpg",
+        "manifests": [manifest_id(1, m) for m in range(1, manifests + 1)],
+        "canvases": [canvas_id(1, 1, v) for v in range(1, canvases + 1)]
+    }
+
+
+def run_scale(name:str, scale:tuple, repeat:int, latency:float=None):
+    # generate the dataset in the current directory, load it and query it;
+    # with a latency the graph is served by a local endpoint
+    collections, manifests, canvases, annotations = scale
+    server = None
+    graph = "graph.db"
+    if latency is not None:
+        server = SparqlServer("graph.db", latency=latency)
+        graph = server.start()
+    dataset = generate(".", collections, manifests, canvases, annotations)
+    results = []
+    # the errors the processors catch are counted here, see measure
+    registry = MetricsRegistry()
+
+    def record(kind:str, processor:str, method:str, measures:dict):
+        measures.update({"scale": name, "entities": dataset["entities"], "kind": kind,
+                         "processor": processor, "method": method})
+        results.append(measures)
+
+    # ingestion: every upload replaces the content of its database, so it can
+    # run once more for the memory
+    annotation = AnnotationProcessor()
+    annotation.setDbPathOrUrl("relational.db")
+    annotation.setMetrics(registry)
+    measures = measure(lambda: annotation.uploadData("annotations.csv"), 1, registry, False)
+    record("upload", "AnnotationProcessor", "uploadData", set_rows(measures, dataset["annotations"]))
+    metadata = MetadataProcessor()
+    metadata.setDbPathOrUrl("relational.db")
+    metadata.setMetrics(registry)
+    measures = measure(lambda: metadata.uploadData("metadata.csv"), 1, registry, False)
+    record("upload", "MetadataProcessor", "uploadData", set_rows(measures, dataset["metadataRows"]))
+    collection = CollectionProcessor()
+    collection.setDbPathOrUrl(graph)
+    collection.setMetrics(registry)
+    # the IRIs come from the IIIF ids, not from the counter files: the call
+    # for the memory writes the same triples again instead of new entities
+    collection.setIdMode("hash")
+    triples = []
+
+    def upload_collections():
+        triples.clear()
+        for path in dataset["files"]:
+            if path.endswith(".json"):
+                if not collection.uploadData(path):
+                    return False
+                triples.append(collection.getUploadStats().get("triples", 0))
+        return True
+
+    measures = measure(upload_collections, 1, registry, False)
+    record("upload", "CollectionProcessor", "uploadData", set_rows(measures, sum(triples)))
+
+    values = arguments(scale)
+    relational = RelationalQueryProcessor()
+    relational.setDbPathOrUrl("relational.db")
+    triplestore = TriplestoreQueryProcessor()
+    triplestore.setDbPathOrUrl(graph)
+    if measures["error"] is None:
+        # the queries are only timed on the dataset that was generated
+        measures["error"] = check_graph(triplestore, dataset)
+    generic = GenericQueryProcessor()
+    generic.addQueryProcessor(relational)
+    generic.addQueryProcessor(triplestore)
+    for processor in (relational, triplestore, generic):
+        processor.setMetrics(registry)
+
+    for processor, methods in ((relational, RELATIONAL_METHODS), (triplestore, TRIPLESTORE_METHODS), (generic, GENERIC_METHODS)):
+        for method, names in methods:
+            args = [values[name] for name in names]
+            function = getattr(processor, method)
+            record("query", type(processor).__name__, method, measure(lambda: function(*args), repeat, registry))
+
+    relational.close()
+    triplestore.close()
+    generic.close()
+    if server is not None:
+        close_clients()
+        server.stop()
+    return results
+
+
+def result_key(result:dict):
+    return (result["scale"], result["processor"], result["method"])
+
+
+def compare(results:list, baseline:list, threshold:float, min_seconds:float):
+    # the measures slower than the baseline by more than threshold; the very
+    # short ones (under min_seconds in both runs) are only noise
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None or result["error"] or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        result["baselineSeconds"] = before["seconds"]
+        result["ratio"] = ratio
+        if ratio > 1 + threshold and max(result["seconds"], before["seconds"]) >= min_seconds:
+            regressions.append(result)
+    return regressions
+
+
+def run(scales:list, repeat:int=3, workdir:str=None, latency:float=None):
+    # run every scale in its own directory and return the results document
+    workdir = abspath(workdir or mkdtemp(prefix="benchmark-"))
+    cwd = getcwd()
+    results = []
+    try:
+        for name in scales:
+            directory = join(workdir, name)
+            makedirs(directory, exist_ok=True)
+            # the CollectionProcessor writes its dump file (Graph_db.ttl) in
+            # the current directory
+            chdir(directory)
+            results += run_scale(name, SCALES[name], repeat, latency)
+            chdir(cwd)
+    finally:
+        chdir(cwd)
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": python_version(),
+            "platform": platform(),
+            "repeat": repeat,
+            "scales": {name: SCALES[name] for name in scales},
+            "workdir": workdir,
+            "graph": "graph.db" if latency is None else f"local endpoint, {latency} s latency",
+            "peakRssKiB": peak_rss_kib()
+        },
+        "results": results
+    }
+
+
+def parse_scale(value:str):
+    # "name" of SCALES or "name=CxMxVxA" (collections x manifests x canvases x annotations)
+    if "=" in value:
+        name, numbers = value.split("=", 1)
+        SCALES[name] = tuple(int(n) for n in numbers.split("x"))
+        return name
+    if value not in SCALES:
+        raise ValueError(f"unknown scale {value!r}, use one of {', '.join(SCALES)} or name=CxMxVxA")
+    return value
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the ingestion and the query methods of the processors")
+    parser.add_argument("--scales", default="tiny,small", help="comma-separated scales: " + ", ".join(SCALES) + " or name=CxMxVxA")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every query, the best one is kept")
+    parser.add_argument("--out", default="benchmark-results.json", help="JSON file of the results")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="measures under this time are never regressions")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file too")
+    parser.add_argument("--workdir", help="directory of the datasets and databases (default: a new temporary one)")
+    parser.add_argument("--http", action="store_true", help="query the graph through a local SPARQL endpoint")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the local endpoint waits before every answer")
+    args = parser.parse_args()
+
+    try:
+        scales = [parse_scale(value.strip()) for value in args.scales.split(",") if value.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+
+    document = run(scales, args.repeat, args.workdir, args.latency if args.http else None)
+
+    regressions = []
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(document["results"], load(f)["results"], args.threshold, args.min_seconds)
+        document["regressions"] = [result_key(result) for result in regressions]
+
+    with open(args.out, mode='w', encoding="utf-8") as f:
+        dump(document, f, indent=2)
+    if args.update_baseline and args.baseline:
+        with open(args.baseline, mode='w', encoding="utf-8") as f:
+            dump(document, f, indent=2)
+
+    for result in document["results"]:
+        line = f"{result['scale']:<8} {result['processor']:<27} {result['method']:<37} {result['seconds'] * 1000:10.2f} ms {result['rows']:>9} rows"
+        if "ratio" in result:
+            line += f"  x{result['ratio']:.2f}"
+        if result["error"]:
+            line += "  " + result["error"]
+        print(line)
+    for result in regressions:
+        print(f"REGRESSION {result['scale']} {result['processor']}.{result['method']}: "
+              f"{result['baselineSeconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms")
+    print(f"results written to {basename(args.out)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,16 @@
+from os.path import join
+import pytest
+from utils.sparql_server import SparqlServer
+from sample_data import build_graph
+
+
+@pytest.fixture(scope="class")
+def sparql_server(request, tmp_path_factory):
+    # a SparqlServer on a free port over the sample collections, given to the
+    # unittest classes as their server attribute
+    path = join(str(tmp_path_factory.mktemp("sparql")), "graph.db")
+    assert build_graph(path)
+    with SparqlServer(path) as server:
+        if request.cls is not None:
+            request.cls.server = server
+        yield server
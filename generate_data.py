@@ -0,0 +1,169 @@
+# Synthetic collection JSON, annotation CSV and metadata CSV files for scale
+# testing. The three kinds of file share the ids: every canvas of the
+# collections is the target of its annotations and every collection and
+# manifest has its row in the metadata, so the generic queries join them as
+# they do with the real data.
+#
+#   python generate_data.py synthetic/ --collections 10 --manifests 100 --canvases 100 --annotations 1
+#
+# writes 10 collections of 100 manifests of 100 canvases (about 10^5 entities)
+# and 10^5 annotations; the files can then be loaded with ingest.py.
+from argparse import ArgumentParser
+from csv import writer
+from json import dumps
+from os import makedirs
+from os.path import join, getsize
+from random import Random
+
+BASE_URL = "https://example.org"
+MOTIVATIONS = ["painting", "painting", "painting", "supplementing", "commenting"]
+
+
+def collection_id(c:int):
+    return f"{BASE_URL}/iiif/{c}/collection"
+
+
+def manifest_id(c:int, m:int):
+    return f"{BASE_URL}/iiif/2/{c}-{m}/manifest"
+
+
+def canvas_id(c:int, m:int, v:int):
+    return f"{BASE_URL}/iiif/2/{c}-{m}/canvas/p{v}"
+
+
+def entity_json(id:str, type:str, label:str):
+    # the opening of an entity object, the caller writes its items and closes it
+    return '{"id": %s, "type": "%s", "label": {"none": [%s]}' % (dumps(id), type, dumps(label))
+
+
+def write_collection(f, c:int, manifests:int, canvases:int):
+    # one collection written piece by piece, without building it in memory
+    f.write(entity_json(collection_id(c), "Collection", f"Collection {c}") + ', "items": [')
+    for m in range(1, manifests + 1):
+        if m > 1:
+            f.write(", ")
+        f.write(entity_json(manifest_id(c, m), "Manifest", f"Manifest {c}-{m}") + ', "items": [')
+        f.write(", ".join(entity_json(canvas_id(c, m, v), "Canvas", f"Canvas {c}-{m}-{v}") + "}"
+                          for v in range(1, canvases + 1)))
+        f.write("]}")
+    f.write("]}")
+
+
+def write_collections(out:str, collections:int, manifests:int, canvases:int, per_file:int):
+    # per_file collections in each file: one object, or a list when more than one
+    paths = []
+    for first in range(1, collections + 1, per_file):
+        numbers = range(first, min(first + per_file, collections + 1))
+        path = join(out, f"collection-{first}.json")
+        with open(path, mode='w', encoding="utf-8") as f:
+            if per_file > 1:
+                f.write("[")
+            for c in numbers:
+                if c > first:
+                    f.write(", ")
+                write_collection(f, c, manifests, canvases)
+            if per_file > 1:
+                f.write("]")
+        paths.append(path)
+    return paths
+
+
+def write_annotations(out:str, collections:int, manifests:int, canvases:int, annotations:int, rng:Random):
+    path = join(out, "annotations.csv")
+    rows = 0
+    with open(path, mode='w', encoding="utf-8", newline="") as f:
+        csv = writer(f)
+        csv.writerow(["id", "body", "target", "motivation"])
+        for c in range(1, collections + 1):
+            for m in range(1, manifests + 1):
+                for v in range(1, canvases + 1):
+                    for a in range(1, annotations + 1):
+                        csv.writerow([
+                            f"{BASE_URL}/iiif/2/{c}-{m}/annotation/p{v:04d}-image-{a}",
+                            f"{BASE_URL}/iiif/2/{c}-{m}-{v}-{a}/full/699,800/0/default.jpg",
+                            canvas_id(c, m, v),
+                            rng.choice(MOTIVATIONS)
+                        ])
+                        rows += 1
+    return path, rows
+
+
+def creators(rng:Random, pool:int, count:int):
+    # count distinct names out of a pool, so the same creator has many entities
+    names = rng.sample(range(1, pool + 1), min(count, pool))
+    return "; ".join(f"Creator{n}, Name{n}" for n in names)
+
+
+def write_metadata(out:str, collections:int, manifests:int, canvases:int, creators_per_entity:int,
+                   creator_pool:int, canvas_metadata:bool, rng:Random):
+    # as in data/metadata.csv: collections and manifests have a title and
+    # their creators, canvases have empty cells unless canvas_metadata is set
+    path = join(out, "metadata.csv")
+    rows = 0
+    with open(path, mode='w', encoding="utf-8", newline="") as f:
+        csv = writer(f)
+        csv.writerow(["id", "title", "creator"])
+        for c in range(1, collections + 1):
+            csv.writerow([collection_id(c), f"Title of collection {c}", creators(rng, creator_pool, creators_per_entity)])
+            rows += 1
+            for m in range(1, manifests + 1):
+                csv.writerow([manifest_id(c, m), f"Title of manifest {c}-{m}", creators(rng, creator_pool, creators_per_entity)])
+                rows += 1
+                for v in range(1, canvases + 1):
+                    if canvas_metadata:
+                        csv.writerow([canvas_id(c, m, v), f"Title of canvas {c}-{m}-{v}", creators(rng, creator_pool, creators_per_entity)])
+                    else:
+                        csv.writerow([canvas_id(c, m, v), "", ""])
+                    rows += 1
+    return path, rows
+
+
+def generate(out:str, collections:int=1, manifests:int=10, canvases:int=10, annotations:int=1,
+             creators_per_entity:int=2, creator_pool:int=1000, per_file:int=1,
+             canvas_metadata:bool=False, seed:int=0):
+    # write the dataset in the directory out and return a report of its files
+    makedirs(out, exist_ok=True)
+    rng = Random(seed)
+    collection_paths = write_collections(out, collections, manifests, canvases, per_file)
+    annotations_path, annotation_rows = write_annotations(out, collections, manifests, canvases, annotations, rng)
+    metadata_path, metadata_rows = write_metadata(out, collections, manifests, canvases, creators_per_entity,
+                                                  creator_pool, canvas_metadata, rng)
+    paths = collection_paths + [annotations_path, metadata_path]
+    return {
+        "collections": collections,
+        "manifests": collections * manifests,
+        "canvases": collections * manifests * canvases,
+        "entities": collections * (1 + manifests * (1 + canvases)),
+        "annotations": annotation_rows,
+        "metadataRows": metadata_rows,
+        "files": paths,
+        "bytes": sum(getsize(path) for path in paths)
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic dataset of collections, annotations and metadata")
+    parser.add_argument("out", help="directory of the generated files")
+    parser.add_argument("--collections", type=int, default=1, help="number of collections")
+    parser.add_argument("--manifests", type=int, default=10, help="manifests in each collection")
+    parser.add_argument("--canvases", type=int, default=10, help="canvases in each manifest")
+    parser.add_argument("--annotations", type=int, default=1, help="annotations of each canvas")
+    parser.add_argument("--creators", type=int, default=2, help="creators of each collection and manifest")
+    parser.add_argument("--creator-pool", type=int, default=1000, help="number of distinct creators")
+    parser.add_argument("--per-file", type=int, default=1, help="collections in each JSON file")
+    parser.add_argument("--canvas-metadata", action="store_true", help="give the canvases a title and creators too")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random choices")
+    args = parser.parse_args()
+
+    for name in ("collections", "manifests", "canvases", "per_file", "creator_pool"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+
+    report = generate(args.out, args.collections, args.manifests, args.canvases, args.annotations,
+                      args.creators, args.creator_pool, args.per_file, args.canvas_metadata, args.seed)
+    print(dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,18 +1,34 @@
 from sqlite3 import connect
-from pandas import read_sql, DataFrame, concat, read_csv, Series, merge
+from pandas import DataFrame, concat, read_csv, Series
 from utils.paths import RDF_DB_URL, SQL_DB_URL
-from rdflib import Graph, Namespace
-from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
-from sparql_dataframe import get 
+from rdflib import Graph, Namespace, Literal
 from clean_str import remove_special_chars
 from json import load
 from utils.CreateGraph import create_Graph
+from utils.sparql_upload import upload_lines, triple_lines
+from utils.stream_graph import stream_triples
+from utils.schema import create_tables, create_indexes, set_bulk_load
+from utils.connection_pool import ConnectionPool
+from utils.local_store import SQLiteTripleStore, is_local, open_graph, query_frame
+from utils.result_cache import ResultCache, cached, bump_generation
+from utils.result_batch import ResultBatch
+from utils.sparql_client import get_client
+from utils.tracing import traced, traced_as, span, read_sql, merge
+from utils.metrics import REGISTRY, MetricsRegistry, report_error
 from urllib.parse import urlparse
+from time import perf_counter, monotonic
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from threading import Lock
 
 
 #NOTE: BLOCK DATA MODEL
 
+# the model classes declare their attributes in __slots__: no per-object
+# dictionary, so millions of them fit in a fraction of the memory
+
 class IdentifiableEntity():
+    __slots__ = ("id",)
     def __init__(self, id:str):
         self.id = id
     def getId(self):
@@ -20,10 +36,11 @@ class IdentifiableEntity():
 
 
 class Image(IdentifiableEntity):
-    pass
+    __slots__ = ()
 
 
 class Annotation(IdentifiableEntity):
+    __slots__ = ("motivation", "target", "body")
     def __init__(self, id, motivation:str, target:IdentifiableEntity, body:Image):
         self.motivation = motivation
         self.target = target
@@ -38,6 +55,7 @@ class Annotation(IdentifiableEntity):
     
 
 class EntityWithMetadata(IdentifiableEntity):
+    __slots__ = ("label", "title", "creators")
     def __init__(self, id, label, title, creators):
         self.label = label 
         self.title = title
@@ -63,10 +81,12 @@ class EntityWithMetadata(IdentifiableEntity):
     
 
 class Canvas(EntityWithMetadata):
+    __slots__ = ()
     def __init__(self, id:str, label:str, title:str, creators:list[str]):
         super().__init__(id, label, title, creators)
 
 class Manifest(EntityWithMetadata):
+    __slots__ = ("items",)
     def __init__(self, id:str, label:str, title:str, creators:list[str], items:list[Canvas]):
         super().__init__(id, label, title, creators)
         self.items = items
@@ -74,6 +94,7 @@ class Manifest(EntityWithMetadata):
         return self.items
 
 class Collection(EntityWithMetadata):
+    __slots__ = ("items",)
     def __init__(self, id:str, label:str, title:str, creators:list[str], items:list[Manifest]):
         super().__init__(id, label, title, creators)
         self.items = items
@@ -83,14 +104,70 @@ class Collection(EntityWithMetadata):
 
 
 
+# cells turned into model objects when the model is built from its columns
+MODEL_WRAPS = {
+    Annotation: {"target": IdentifiableEntity, "body": Image}
+}
+
+
 # NOTE: BLOCK PROCESSORS
 
 
-class Processor(object):
+class Instrumented(object):
+    # tracer and metrics registry of all the processors, the generic one too
     def __init__(self):
+        super().__init__()
+        # spans of the calls, see utils.tracing (None: the default tracer,
+        # or the one of the GenericQueryProcessor calling them)
+        self.tracer = None
+        # counters and histograms of the calls, see utils.metrics (None: off)
+        self.metrics = REGISTRY
+    def getTracer(self):
+        return self.tracer
+    def setTracer(self, tracer):
+        self.tracer = tracer
+        return True
+    def getMetrics(self):
+        return self.metrics
+    def setMetrics(self, metrics):
+        if metrics is None or isinstance(metrics, MetricsRegistry):
+            self.metrics = metrics
+            return True
+        else:
+            return False
+
+
+class CachedQueries(object):
+    # opt-in cache of the query results of the query processors, see
+    # utils.result_cache; cacheTargets are the databases the results depend on
+    def __init__(self):
+        super().__init__()
+        self.resultCache = None
+    def getResultCache(self):
+        return self.resultCache
+    def setResultCache(self, resultCache):
+        # a ResultCache (possibly shared with other processors), None disables it
+        if resultCache is None or isinstance(resultCache, ResultCache):
+            self.resultCache = resultCache
+            return True
+        else:
+            return False
+    def getCacheStats(self):
+        return self.resultCache.getStats() if self.resultCache is not None else dict()
+    def cacheTargets(self):
+        return [self.getDbPathOrUrl()]
+
+
+class Processor(Instrumented):
+    def __init__(self):
+        super().__init__()
         self.dbPathOrUrl = ""
+        # figures about the last uploadData call (counts, timings)
+        self.uploadStats = dict()
     def getDbPathOrUrl(self):
         return self.dbPathOrUrl 
+    def getUploadStats(self):
+        return self.uploadStats
     def setDbPathOrUrl(self, newpath):
         if len(newpath)>=3 and newpath[-3:] == ".db":
             self.dbPathOrUrl = newpath
@@ -108,6 +185,7 @@ class QueryProcessor(Processor):
     def __init__(self):
         super().__init__()
 
+    @traced
     def getEntityById(self, entityId: str):
         entityId_stripped = entityId.strip("'")
         db_url = self.getDbPathOrUrl() if len(self.getDbPathOrUrl()) else SQL_DB_URL
@@ -120,8 +198,8 @@ class QueryProcessor(Processor):
                 " LEFT JOIN Annotation" +\
                 " ON Entity.id = Annotation.target" +\
                 " WHERE 1=1" +\
-                f" AND Entity.id='{entityId_stripped}'"
-                df = read_sql(query, con)
+                " AND Entity.id=?"
+                df = read_sql(query, con, params=(entityId_stripped,))
 
         elif db_url == RDF_DB_URL:
             endpoint = 'http://127.0.0.1:9999/blazegraph/sparql'
@@ -137,49 +215,109 @@ class QueryProcessor(Processor):
                 }
                 """ % entityId 
 
-            df = get(endpoint, query, True)
+            df = get_client(endpoint).select(query)
             return df
         return df
 
 
 class AnnotationProcessor(Processor):
     def __init__(self):
-        pass
+        super().__init__()
+        # number of CSV rows read and written at a time, 0 means the whole
+        # file in a single chunk
+        self.chunkSize = 0
+        # WAL journaling, relaxed synchronous and a large cache while loading
+        self.bulkLoad = False
+
+    def getChunkSize(self):
+        return self.chunkSize
+
+    def setChunkSize(self, chunkSize:int):
+        if type(chunkSize) == int and chunkSize >= 0:
+            self.chunkSize = chunkSize
+            return True
+        else:
+            return False
+
+    def getBulkLoad(self):
+        return self.bulkLoad
+
+    def setBulkLoad(self, bulkLoad:bool):
+        self.bulkLoad = bool(bulkLoad)
+        return True
+
+    @traced
     def uploadData(self, path:str): 
         try:
-            annotations = read_csv(path, 
+            chunks = read_csv(path, 
                                     keep_default_na=False,
                                     dtype={
                                         "id": "string",
                                         "body": "string",
                                         "target": "string",
                                         "motivation": "string"
-                                    })
-            annotations_internalId = []
-            for idx, row in annotations.iterrows():
-                annotations_internalId.append("annotation-" +str(idx))
-            annotations.insert(0, "annotationId", Series(annotations_internalId, dtype = "string"))
-            
-            image = annotations[["body"]]
-            image = image.rename(columns={"body": "id"})
-            image_internalId = []
-            for idx, row in image.iterrows():
-                image_internalId.append("image-" +str(idx))
-            image.insert(0, "imageId", Series(image_internalId, dtype = "string"))
+                                    },
+                                    chunksize=self.chunkSize if self.chunkSize else None)
+            if isinstance(chunks, DataFrame):
+                chunks = [chunks]
+            return self.uploadFrames(chunks)
+        
+        except Exception as e:
+            report_error(e)
+            return False
 
+    def uploadFrames(self, chunks):
+        # chunks is an iterable of DataFrames with the columns of the annotations
+        # CSV, e.g. the chunks of one file or the contents of several files
+        try:
             with connect(self.getDbPathOrUrl()) as con:
-                annotations.to_sql("Annotation", con, if_exists="replace", index=False)
-                image.to_sql("Image", con, if_exists="replace", index=False)
+                if self.bulkLoad:
+                    set_bulk_load(con)
+                # the old tables are replaced and all the chunks are appended
+                # inside the same transaction, committed when the block exits
+                con.execute("BEGIN")
+                create_tables(con, ["Annotation", "Image"])
+
+                offset = 0
+                for annotations in chunks:
+                    internal_idx = Series(range(offset, offset + len(annotations)), index=annotations.index).astype("string")
+                    offset += len(annotations)
+
+                    # assign returns a new frame: the caller's chunk is left as it is
+                    annotations = annotations.assign(annotationId="annotation-" + internal_idx)
+                    annotations = annotations[["annotationId", "id", "body", "target", "motivation"]]
+                    
+                    image = DataFrame({"imageId": "image-" + internal_idx, "id": annotations["body"]})
+
+                    con.executemany("INSERT INTO Annotation VALUES (?, ?, ?, ?, ?)", annotations.itertuples(index=False, name=None))
+                    con.executemany("INSERT INTO Image VALUES (?, ?)", image.itertuples(index=False, name=None))
 
+                create_indexes(con, ["Annotation", "Image"])
+
+            self.uploadStats = {
+                "annotations": offset
+            }
+            bump_generation(self.getDbPathOrUrl())
             return True
         
         except Exception as e:
-            print(str(e))
+            report_error(e)
             return False
 
 class MetadataProcessor(Processor):
     def __init__(self):
-        pass
+        super().__init__()
+        # WAL journaling, relaxed synchronous and a large cache while loading
+        self.bulkLoad = False
+
+    def getBulkLoad(self):
+        return self.bulkLoad
+
+    def setBulkLoad(self, bulkLoad:bool):
+        self.bulkLoad = bool(bulkLoad)
+        return True
+
+    @traced
     def uploadData(self, path:str):
         try: 
             entityWithMetadata= read_csv(path, 
@@ -189,36 +327,57 @@ class MetadataProcessor(Processor):
                                         "title": "string",
                                         "creator": "string"
                                     })
-            
-            metadata_internalId = []
-            for idx, row in entityWithMetadata.iterrows():
-                metadata_internalId.append("entity-" +str(idx))
-            entityWithMetadata.insert(0, "entityId", Series(metadata_internalId, dtype = "string"))
-            creator = entityWithMetadata[["entityId", "creator"]]
-            #I recreate entityMetadata since, as I will create a proxy table, I will have no need of
-            #coloumn creator
-            entityWithMetadata = entityWithMetadata[["entityId", "id", "title"]]
-            
-
-            for idx, row in creator.iterrows():
-                        for item_idx, item in row.iteritems():
-                            if "entity-" in item:
-                                entity_id = item
-                            if ";" in item:
-                                list_of_creators =  item.split(";")
-                                creator = creator.drop(idx)
-                                new_serie = []
-                                for i in range (len(list_of_creators)):
-                                    new_serie.append(entity_id)
-                                new_data = DataFrame({"entityId": new_serie, "creator": list_of_creators})
-                                creator = concat([creator.loc[:idx-1], new_data, creator.loc[idx:]], ignore_index=True)
+            return self.uploadFrames([entityWithMetadata])
+        except Exception as e:
+                report_error(e)
+                return False
 
+    def uploadFrames(self, frames):
+        # frames is an iterable of DataFrames with the columns of the metadata
+        # CSV, written as the new content of the Entity and Creators tables
+        try: 
             with connect(self.getDbPathOrUrl()) as con:
-                entityWithMetadata.to_sql("Entity", con, if_exists="replace", index = False)
-                creator.to_sql("Creators", con, if_exists="replace", index = False)
+                if self.bulkLoad:
+                    set_bulk_load(con)
+                con.execute("BEGIN")
+                create_tables(con, ["Entity", "Creators"])
+
+                offset = 0
+                creators = 0
+                creators_seconds = 0.0
+                for entityWithMetadata in frames:
+                    metadata_internalId = Series(range(offset, offset + len(entityWithMetadata)), index=entityWithMetadata.index).astype("string")
+                    offset += len(entityWithMetadata)
+                    # a new frame, the caller's one is left as it is
+                    entityWithMetadata = entityWithMetadata.assign(entityId="entity-" + metadata_internalId)
+                    creator = entityWithMetadata[["entityId", "creator"]]
+                    #I recreate entityMetadata since, as I will create a proxy table, I will have no need of
+                    #coloumn creator
+                    entityWithMetadata = entityWithMetadata[["entityId", "id", "title"]]
+                    
+                    # one row for each creator: the multi-creator cells ("Doe, John; Doe, Jane")
+                    # are split on ";" and exploded, keeping the entityId of the original row
+                    start = perf_counter()
+                    creator = creator.assign(creator=creator["creator"].str.split(";"))
+                    creator = creator.explode("creator", ignore_index=True)
+                    creator["creator"] = creator["creator"].str.strip()
+                    creators_seconds += perf_counter() - start
+                    creators += len(creator)
+
+                    con.executemany("INSERT INTO Entity VALUES (?, ?, ?)", entityWithMetadata.itertuples(index=False, name=None))
+                    con.executemany("INSERT INTO Creators VALUES (?, ?)", creator.itertuples(index=False, name=None))
+
+                create_indexes(con, ["Entity", "Creators"])
+
+            self.uploadStats = {
+                "entities": offset,
+                "creators": creators,
+                "creatorsSeconds": creators_seconds
+            }
+            bump_generation(self.getDbPathOrUrl())
             return True
         except Exception as e:
-                print(str(e))
+                report_error(e)
                 return False
 
 
@@ -227,12 +386,112 @@ class CollectionProcessor(Processor):
 
     def __init__(self):
         super().__init__()
+        # number of triples sent in each INSERT DATA request, 0 means the
+        # whole graph in a single request
+        self.batchSize = 1000
+        # "counter": internal ids from the counter files (the default)
+        # "hash": internal ids derived from the IIIF ids, safe for parallel
+        # and repeated ingestion of the same collections
+        self.idMode = "counter"
+        # parse the file incrementally and send the triples while they are
+        # generated, instead of loading the JSON and building a Graph first
+        self.streaming = False
+        # connections to the endpoint kept alive between the uploads
+        self.poolSize = 4
+        # also write the collection -> canvas "contains" shortcut and the
+        # position of every canvas in its manifest
+        self.containment = False
+
+    def getStreaming(self):
+        return self.streaming
+
+    def setStreaming(self, streaming:bool):
+        self.streaming = bool(streaming)
+        return True
+
+    def getIdMode(self):
+        return self.idMode
+
+    def setIdMode(self, idMode:str):
+        if idMode in ("counter", "hash"):
+            self.idMode = idMode
+            return True
+        else:
+            return False
+
+    def getPoolSize(self):
+        return self.poolSize
+
+    def setPoolSize(self, poolSize:int):
+        if type(poolSize) == int and poolSize > 0:
+            self.poolSize = poolSize
+            return True
+        else:
+            return False
+
+    def getContainment(self):
+        return self.containment
+
+    def setContainment(self, containment:bool):
+        self.containment = bool(containment)
+        return True
+
+    def getBatchSize(self):
+        return self.batchSize
+
+    def setBatchSize(self, batchSize:int):
+        if type(batchSize) == int and batchSize >= 0:
+            self.batchSize = batchSize
+            return True
+        else:
+            return False
+
+    def sendTriples(self, triples):
+        # send the triples to the endpoint in INSERT DATA batches
+        self.sendLines(triple_lines(triples))
+
+    def sendLines(self, lines):
+        # same as sendTriples for triples already serialized as N-Triples lines
+        endpoint = self.getDbPathOrUrl()
+
+        if is_local(endpoint):
+            # local triplestore: the lines are written straight into its table
+            store = SQLiteTripleStore()
+            store.open(endpoint, create=True)
+            start = perf_counter()
+            sent = store.add_lines(lines, self.batchSize)
+            batch_size = self.batchSize
+            elapsed = perf_counter() - start
+            store.close()
+        else:
+            # the shared client of the endpoint: its connections stay open
+            # for the next uploads and queries
+            client = get_client(endpoint, self.poolSize)
+            start = perf_counter()
+            sent, batch_size = upload_lines(client, lines, self.batchSize)
+            elapsed = perf_counter() - start
+        bump_generation(endpoint)
+
+        self.uploadStats = {
+            "triples": sent,
+            "seconds": elapsed,
+            "triplesPerSecond": sent / elapsed if elapsed else 0.0,
+            "batchSize": batch_size
+        }
 
+    @traced
     def uploadData(self, path: str):
 
         try: 
 
             base_url = "https://github.com/n1kg0r/ds-project-dhdk/"
+
+            if self.streaming:
+                # memory stays flat: only the batch being sent is kept
+                with open(path, mode='r', encoding="utf-8") as jsonfile:
+                    self.sendTriples(stream_triples(jsonfile, base_url, self.idMode, self.containment))
+                return True
+
             my_graph = Graph()
 
             # define namespaces 
@@ -252,22 +511,14 @@ class CollectionProcessor(Processor):
             #CREATE GRAPH
             if type(json_object) is list: #CONTROLLARE!!!
                 for collection in json_object:
-                    create_Graph(collection, base_url, my_graph)
+                    create_Graph(collection, base_url, my_graph, self.idMode, self.containment)
             
             else:
-                create_Graph(json_object, base_url, my_graph)
+                create_Graph(json_object, base_url, my_graph, self.idMode, self.containment)
             
                     
             #DB UPTDATE
-            store = SPARQLUpdateStore()
-
-            endpoint = self.getDbPathOrUrl()
-
-            store.open((endpoint, endpoint))
-
-            for triple in my_graph.triples((None, None, None)):
-                store.add(triple)
-            store.close()
+            self.sendTriples(my_graph.triples((None, None, None)))
             
             # FIX
             # my_graph.serialize(destination="Graph_db.ttl", format="turtle")
@@ -277,62 +528,288 @@ class CollectionProcessor(Processor):
             return True
         
         except Exception as e:
-            print(str(e))
+            report_error(e)
             return False
         
 
-class RelationalQueryProcessor(Processor):          
+class RelationalQueryProcessor(CachedQueries, Processor):          
+    def __init__(self):
+        super().__init__()
+        # settings of the connections kept open by the processor
+        self.cacheSize = 64 * 1024  # KiB of page cache per connection
+        self.mmapSize = 0  # bytes of memory-mapped I/O, 0 disables it
+        self.immutable = False  # read-only immutable=1 URI
+        self.cachedStatements = 128  # prepared statements kept per connection
+        self.inChunkSize = 500  # ids bound in each IN (...) list
+        self.pool = None
+        # the threads of a GenericQueryProcessor may ask for their first
+        # connection at the same time: only one of them creates the pool
+        self.poolLock = Lock()
+
+    def setDbPathOrUrl(self, newpath):
+        result = super().setDbPathOrUrl(newpath)
+        if result:
+            self.close()
+        return result
+
+    def getCacheSize(self):
+        return self.cacheSize
+
+    def setCacheSize(self, cacheSize:int):
+        if type(cacheSize) == int and cacheSize > 0:
+            self.close()
+            self.cacheSize = cacheSize
+            return True
+        else:
+            return False
+
+    def getMmapSize(self):
+        return self.mmapSize
+
+    def setMmapSize(self, mmapSize:int):
+        if type(mmapSize) == int and mmapSize >= 0:
+            self.close()
+            self.mmapSize = mmapSize
+            return True
+        else:
+            return False
+
+    def getImmutable(self):
+        return self.immutable
+
+    def setImmutable(self, immutable:bool):
+        self.close()
+        self.immutable = bool(immutable)
+        return True
+
+    def getCachedStatements(self):
+        return self.cachedStatements
+
+    def setCachedStatements(self, cachedStatements:int):
+        if type(cachedStatements) == int and cachedStatements >= 0:
+            self.close()
+            self.cachedStatements = cachedStatements
+            return True
+        else:
+            return False
+
+    def getInChunkSize(self):
+        return self.inChunkSize
+
+    def setInChunkSize(self, inChunkSize:int):
+        if type(inChunkSize) == int and inChunkSize > 0:
+            self.inChunkSize = inChunkSize
+            return True
+        else:
+            return False
+
+    def getConnection(self):
+        # the connection of the current thread, opened at the first call
+        with self.poolLock:
+            if self.pool is None:
+                self.pool = ConnectionPool(self.getDbPathOrUrl(), self.cacheSize, self.mmapSize, self.immutable, self.cachedStatements)
+            pool = self.pool
+        return pool.get()
+
+    def close(self):
+        with self.poolLock:
+            pool = self.pool
+            self.pool = None
+        if pool is not None:
+            pool.close()
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @traced
+    @cached
     def getAllAnnotations(self):
-        with connect(self.getDbPathOrUrl()) as con:
-            q1="SELECT * FROM Annotation;" 
-            q1_table = read_sql(q1, con)
-            return q1_table 
+        con = self.getConnection()
+        q1="SELECT * FROM Annotation;" 
+        q1_table = read_sql(q1, con)
+        return q1_table 
               
+    @traced
+    @cached
     def getAllImages(self):
-        with connect(self.getDbPathOrUrl()) as con:
-          q2="SELECT * FROM Image;" 
-          q2_table = read_sql(q2, con)
-          return q2_table       
+        con = self.getConnection()
+        q2="SELECT * FROM Image;" 
+        q2_table = read_sql(q2, con)
+        return q2_table       
+    @traced
+    @cached
     def getAnnotationsWithBody(self, bodyId:str):
-        with connect(self.getDbPathOrUrl())as con:
-            q3 = f"SELECT* FROM Annotation WHERE body = '{bodyId}'"
-            q3_table = read_sql(q3, con)
-            return q3_table         
+        con = self.getConnection()
+        q3 = "SELECT* FROM Annotation WHERE body = ?"
+        q3_table = read_sql(q3, con, params=(bodyId,))
+        return q3_table         
+    @traced
+    @cached
     def getAnnotationsWithBodyAndTarget(self, bodyId:str,targetId:str):
-        with connect(self.getDbPathOrUrl())as con:
-            q4 = f"SELECT* FROM Annotation WHERE body = '{bodyId}' AND target = '{targetId}'"
-            q4_table = read_sql (q4, con)
-            return q4_table         
+        con = self.getConnection()
+        q4 = "SELECT* FROM Annotation WHERE body = ? AND target = ?"
+        q4_table = read_sql (q4, con, params=(bodyId, targetId))
+        return q4_table         
+    @traced
+    @cached
     def getAnnotationsWithTarget(self, targetId:str):#I've decided not to catch the empty string since in this case a Dataframe is returned, witch is okay
-        with connect(self.getDbPathOrUrl())as con:
-            q5 = f"SELECT* FROM Annotation WHERE target = '{targetId}'"
-            q5_table = read_sql(q5, con)
-            return q5_table  
+        con = self.getConnection()
+        q5 = "SELECT* FROM Annotation WHERE target = ?"
+        q5_table = read_sql(q5, con, params=(targetId,))
+        return q5_table  
+    @traced
+    @cached
     def getEntitiesWithCreator(self, creatorName):
-        with connect(self.getDbPathOrUrl())as con:
-             q6 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId WHERE creator = '" + creatorName +"'"
-             result = read_sql(q6, con)
-             return result
+        con = self.getConnection()
+        q6 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId WHERE creator = ?"
+        result = read_sql(q6, con, params=(creatorName,))
+        return result
+    @traced
+    @cached
     def getEntitiesWithTitle(self,title):
-        with connect(self.getDbPathOrUrl())as con:
-             q6 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId WHERE title = '" + title +"'"
-             result = read_sql(q6, con)  
-             return result
+        con = self.getConnection()
+        q6 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId WHERE title = ?"
+        result = read_sql(q6, con, params=(title,))  
+        return result
+    @traced
+    @cached
     def getEntities(self):
-        with connect(self.getDbPathOrUrl())as con:
-             q7 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId"
-             result = read_sql(q7, con) 
-             return result 
+        con = self.getConnection()
+        q7 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId"
+        result = read_sql(q7, con) 
+        return result 
+
+    def selectIn(self, query:str, ids):
+        # run query, whose {} stands for the list of an IN (...), once for
+        # every inChunkSize distinct ids and concatenate the results; only the
+        # rows matching the ids are read, through the indexes of the tables
+        ids = list(dict.fromkeys(ids))
+        con = self.getConnection()
+        result = []
+        for start in range(0, len(ids), self.inChunkSize):
+            chunk = ids[start:start + self.inChunkSize]
+            result.append(read_sql(query.format(", ".join(["?"] * len(chunk))), con, params=chunk))
+        if result:
+            return concat(result, ignore_index=True)
+        else:
+            # no ids: an empty frame with the right columns
+            return read_sql(query.format("NULL"), con)
+
+    @traced
+    @cached
+    def getEntitiesWithIds(self, ids):
+        # the rows of getEntities for the given ids only
+        q8 = "SELECT Entity.entityid, Entity.id, Creators.creator, Entity.title FROM Entity LEFT JOIN Creators ON Entity.entityId == Creators.entityId WHERE Entity.id IN ({})"
+        return self.selectIn(q8, ids)
+
+    @traced
+    @cached
+    def getAnnotationsWithTargets(self, targetIds):
+        # the annotations of any of the given targets
+        q9 = "SELECT* FROM Annotation WHERE target IN ({})"
+        return self.selectIn(q9, targetIds)
         
         
-class TriplestoreQueryProcessor(QueryProcessor):
+class TriplestoreQueryProcessor(CachedQueries, QueryProcessor):
 
     def __init__(self):
         super().__init__()
+        # the dbPathOrUrl is either the URL of a SPARQL endpoint or the path
+        # of a local triplestore (.db), opened at the first query
+        self.graph = None
+        # maximum number of ids in the VALUES block of a single batch query
+        self.valuesChunkSize = 500
+        # connections to the endpoint kept alive between the queries and
+        # format of its answers, "json" or "tsv"
+        self.poolSize = 4
+        self.responseFormat = "json"
+        # the store holds the containment triples (CollectionProcessor
+        # setContainment), so the collection -> canvas lookups take one hop
+        self.containment = False
+
+    def setDbPathOrUrl(self, newpath):
+        result = super().setDbPathOrUrl(newpath)
+        if result:
+            self.close()
+        return result
+
+    def getPoolSize(self):
+        return self.poolSize
+
+    def setPoolSize(self, poolSize:int):
+        if type(poolSize) == int and poolSize > 0:
+            self.poolSize = poolSize
+            return True
+        else:
+            return False
+
+    def getContainment(self):
+        return self.containment
+
+    def setContainment(self, containment:bool):
+        self.containment = bool(containment)
+        return True
+
+    def cacheVariant(self):
+        # the two forms of the queries do not return the rows in the same order
+        return self.containment
+
+    def getResponseFormat(self):
+        return self.responseFormat
+
+    def setResponseFormat(self, responseFormat:str):
+        if responseFormat in ("json", "tsv"):
+            self.responseFormat = responseFormat
+            return True
+        else:
+            return False
+
+    def getValuesChunkSize(self):
+        return self.valuesChunkSize
+
+    def setValuesChunkSize(self, valuesChunkSize:int):
+        if type(valuesChunkSize) == int and valuesChunkSize > 0:
+            self.valuesChunkSize = valuesChunkSize
+            return True
+        else:
+            return False
+
+    def getGraph(self):
+        if self.graph is None:
+            self.graph = open_graph(self.getDbPathOrUrl())
+        return self.graph
+
+    def runQuery(self, query:str):
+        # same DataFrame from both backends
+        with span("TriplestoreQueryProcessor.runQuery", "sparql", query, self) as current:
+            if is_local(self.getDbPathOrUrl()):
+                result = query_frame(self.getGraph(), query)
+            else:
+                result = get_client(self.getDbPathOrUrl(), self.poolSize).select(query, self.responseFormat)
+            if current is not None:
+                current.rows = len(result)
+            return result
+
+    def close(self):
+        if self.graph is not None:
+            self.graph.close()
+            self.graph = None
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
+    @traced
+    @cached
     def getAllCanvases(self):
 
-        endpoint = self.getDbPathOrUrl()
         query_canvases = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -347,12 +824,13 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """
 
-        df_sparql_getAllCanvases = get(endpoint, query_canvases, True)
+        df_sparql_getAllCanvases = self.runQuery(query_canvases)
         return df_sparql_getAllCanvases
 
+    @traced
+    @cached
     def getAllCollections(self):
 
-        endpoint = self.getDbPathOrUrl()
         query_collections = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -367,12 +845,13 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """
 
-        df_sparql_getAllCollections = get(endpoint, query_collections, True)
+        df_sparql_getAllCollections = self.runQuery(query_collections)
         return df_sparql_getAllCollections
 
+    @traced
+    @cached
     def getAllManifests(self):
 
-        endpoint = self.getDbPathOrUrl()
         query_manifest = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -387,12 +866,29 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """
 
-        df_sparql_getAllManifest = get(endpoint, query_manifest, True)
+        df_sparql_getAllManifest = self.runQuery(query_manifest)
         return df_sparql_getAllManifest
 
+    @traced
+    @cached
     def getCanvasesInCollection(self, collectionId: str):
 
-        endpoint = self.getDbPathOrUrl()
+        if self.containment:
+            query_canInCol = """
+            PREFIX dc: <http://purl.org/dc/elements/1.1/> 
+            PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
+            PREFIX nikRel: <https://github.com/n1kg0r/ds-project-dhdk/relations/>
+
+            SELECT ?canvas ?id ?label 
+            WHERE {
+                ?collection dc:identifier "%s" ;
+                nikRel:contains ?canvas .
+                ?canvas dc:identifier ?id ;
+                nikAttr:label ?label .
+            }
+            """ % collectionId
+            return self.runQuery(query_canInCol)
+
         query_canInCol = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -412,12 +908,13 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ % collectionId
 
-        df_sparql_getCanvasesInCollection = get(endpoint, query_canInCol, True)
+        df_sparql_getCanvasesInCollection = self.runQuery(query_canInCol)
         return df_sparql_getCanvasesInCollection
 
+    @traced
+    @cached
     def getCanvasesInManifest(self, manifestId: str):
 
-        endpoint = self.getDbPathOrUrl()
         query_canInMan = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -432,16 +929,21 @@ class TriplestoreQueryProcessor(QueryProcessor):
             ?canvas a nikCl:Canvas ;
             dc:identifier ?id ;
             nikAttr:label ?label .
+            %s
         }
-        """ % manifestId
+        %s
+        """ % (manifestId, 
+               "OPTIONAL { ?canvas nikAttr:position ?position . }" if self.containment else "",
+               "ORDER BY ?position" if self.containment else "")
 
-        df_sparql_getCanvasesInManifest = get(endpoint, query_canInMan, True)
+        df_sparql_getCanvasesInManifest = self.runQuery(query_canInMan)
         return df_sparql_getCanvasesInManifest
 
 
+    @traced
+    @cached
     def getManifestsInCollection(self, collectionId: str):
 
-        endpoint = self.getDbPathOrUrl()
         query_manInCol = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -459,14 +961,101 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ % collectionId
 
-        df_sparql_getManifestInCollection = get(endpoint, query_manInCol, True)
+        df_sparql_getManifestInCollection = self.runQuery(query_manInCol)
         return df_sparql_getManifestInCollection
+
+    @traced
+    @cached
+    def getManifestsWithCanvasesInCollection(self, collectionId: str):
+        # collection -> manifest -> canvas in a single query: one row for each
+        # canvas of each manifest, a manifest without canvases has empty canvas columns
+        query_hierarchy = """
+        PREFIX dc: <http://purl.org/dc/elements/1.1/> 
+        PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
+        PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/> 
+        PREFIX nikRel: <https://github.com/n1kg0r/ds-project-dhdk/relations/>  
+
+        SELECT ?manifest ?id ?label ?canvas ?canvasId ?canvasLabel
+        WHERE {
+            ?collection a nikCl:Collection ;
+            dc:identifier "%s" ;
+            nikRel:items ?manifest .
+            ?manifest a nikCl:Manifest ;
+            dc:identifier ?id ;
+            nikAttr:label ?label .
+            OPTIONAL {
+                ?manifest nikRel:items ?canvas .
+                ?canvas a nikCl:Canvas ;
+                dc:identifier ?canvasId ;
+                nikAttr:label ?canvasLabel .
+            }
+        }
+        """ % collectionId
+
+        df_sparql_getManifestsWithCanvasesInCollection = self.runQuery(query_hierarchy)
+        return df_sparql_getManifestsWithCanvasesInCollection
     
 
+    @traced
+    @cached
+    def getAllManifestsWithCanvases(self):
+        # every manifest with its canvases, one row for each canvas as in
+        # getManifestsWithCanvasesInCollection
+        query_allHierarchy = """
+        PREFIX dc: <http://purl.org/dc/elements/1.1/> 
+        PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
+        PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/> 
+        PREFIX nikRel: <https://github.com/n1kg0r/ds-project-dhdk/relations/>  
+
+        SELECT ?manifest ?id ?label ?canvas ?canvasId ?canvasLabel
+        WHERE {
+            ?manifest a nikCl:Manifest ;
+            dc:identifier ?id ;
+            nikAttr:label ?label .
+            OPTIONAL {
+                ?manifest nikRel:items ?canvas .
+                ?canvas a nikCl:Canvas ;
+                dc:identifier ?canvasId ;
+                nikAttr:label ?canvasLabel .
+            }
+        }
+        """
+
+        df_sparql_getAllManifestsWithCanvases = self.runQuery(query_allHierarchy)
+        return df_sparql_getAllManifestsWithCanvases
+
+    @traced
+    @cached
+    def getEntityIdsInCollection(self, collectionId: str):
+        # ids of the manifests and of the canvases of a collection, with the
+        # containment triples the canvases take a single hop
+        if self.containment:
+            canvases = "?collection nikRel:contains ?entity ."
+        else:
+            canvases = "?collection nikRel:items ?manifest . ?manifest nikRel:items ?entity ."
+
+        query_idsInCol = """
+        PREFIX dc: <http://purl.org/dc/elements/1.1/> 
+        PREFIX nikRel: <https://github.com/n1kg0r/ds-project-dhdk/relations/>  
+
+        SELECT ?id
+        WHERE {
+            ?collection dc:identifier "%s" .
+            { ?collection nikRel:items ?entity . }
+            UNION
+            { %s }
+            ?entity dc:identifier ?id .
+        }
+        """ % (collectionId, canvases)
+
+        df_sparql_getEntityIdsInCollection = self.runQuery(query_idsInCol)
+        return df_sparql_getEntityIdsInCollection
+
+    @traced
+    @cached
     def getEntitiesWithLabel(self, label: str): 
             
 
-        endpoint = self.getDbPathOrUrl()
         query_entityLabel = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -482,13 +1071,14 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ % remove_special_chars(label)
 
-        df_sparql_getEntitiesWithLabel = get(endpoint, query_entityLabel, True)
+        df_sparql_getEntitiesWithLabel = self.runQuery(query_entityLabel)
         return df_sparql_getEntitiesWithLabel
     
 
+    @traced
+    @cached
     def getEntitiesWithCanvas(self, canvasId: str): 
             
-        endpoint = self.getDbPathOrUrl()
         query_entityCanvas = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -504,12 +1094,13 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ % canvasId
 
-        df_sparql_getEntitiesWithCanvas = get(endpoint, query_entityCanvas, True)
+        df_sparql_getEntitiesWithCanvas = self.runQuery(query_entityCanvas)
         return df_sparql_getEntitiesWithCanvas
     
+    @traced
+    @cached
     def getEntitiesWithId(self, id: str): 
             
-        endpoint = self.getDbPathOrUrl()
         query_entityId = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -525,13 +1116,44 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ % id
 
-        df_sparql_getEntitiesWithId = get(endpoint, query_entityId, True)
+        df_sparql_getEntitiesWithId = self.runQuery(query_entityId)
         return df_sparql_getEntitiesWithId
+
+    @traced
+    @cached
+    def getEntitiesWithIds(self, ids: list):
+        # same rows as getEntitiesWithId for many ids, with one query for every
+        # valuesChunkSize ids instead of one query per id
+        ids = list(dict.fromkeys(ids))
+        result = []
+        for start in range(0, len(ids), self.valuesChunkSize):
+            values = " ".join(Literal(id).n3() for id in ids[start:start + self.valuesChunkSize])
+            query_entityIds = """
+            PREFIX dc: <http://purl.org/dc/elements/1.1/> 
+            PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
+            PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/> 
+            PREFIX nikRel: <https://github.com/n1kg0r/ds-project-dhdk/relations/> 
+
+            SELECT ?id ?label ?type
+            WHERE {
+                VALUES ?id { %s }
+                ?entity dc:identifier ?id ;
+                nikAttr:label ?label ;
+                a ?type .
+            }
+            """ % values
+            result.append(self.runQuery(query_entityIds))
+
+        if result:
+            return concat(result, ignore_index=True)
+        else:
+            return DataFrame(columns=["id", "label", "type"])
     
 
+    @traced
+    @cached
     def getAllEntities(self): 
             
-        endpoint = self.getDbPathOrUrl()
         query_AllEntities = """
         PREFIX dc: <http://purl.org/dc/elements/1.1/> 
         PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/> 
@@ -547,15 +1169,88 @@ class TriplestoreQueryProcessor(QueryProcessor):
         }
         """ 
 
-        df_sparql_getAllEntities = get(endpoint, query_AllEntities, True)
+        df_sparql_getAllEntities = self.runQuery(query_AllEntities)
         return df_sparql_getAllEntities
 
 
 # NOTE: BLOCK GENERIC PROCESSOR
 
-class GenericQueryProcessor():
+class GenericQueryProcessor(CachedQueries, Instrumented):
     def __init__(self):
+        super().__init__()
         self.queryProcessors = []
+        # when concurrent is set the independent calls to the processors run
+        # together on a thread pool, each one waited for at most timeout
+        # seconds (None: no limit); the results are the same as when they run
+        # one after the other. A call still running at the timeout cannot be
+        # stopped (threads cannot be killed): its result is the TimeoutError,
+        # it goes on in the background until the processor answers and the
+        # pool is left to it, the next calls get a new one of maxWorkers
+        # threads. The calls that had not started yet are cancelled
+        self.concurrent = False
+        self.timeout = None
+        self.maxWorkers = 8
+        self.executor = None
+        self.executorLock = Lock()
+        # "objects": the methods return lists of model objects (the default)
+        # "batch": they return a ResultBatch with the same data in columns
+        self.resultFormat = "objects"
+    def getResultFormat(self):
+        return self.resultFormat
+    def setResultFormat(self, resultFormat:str):
+        if resultFormat in ("objects", "batch"):
+            self.resultFormat = resultFormat
+            return True
+        else:
+            return False
+    def getConcurrent(self):
+        return self.concurrent
+    def setConcurrent(self, concurrent:bool):
+        self.concurrent = bool(concurrent)
+        return True
+    def getTimeout(self):
+        return self.timeout
+    def setTimeout(self, timeout):
+        if timeout is None or (type(timeout) in (int, float) and timeout > 0):
+            self.timeout = timeout
+            return True
+        else:
+            return False
+    def cacheTargets(self):
+        # the results depend on the databases of all the processors
+        return [processor.getDbPathOrUrl() for processor in self.queryProcessors]
+    def cacheVariant(self):
+        # lists and batches of the same query are cached apart
+        return self.resultFormat
+    def getMaxWorkers(self):
+        return self.maxWorkers
+    def setMaxWorkers(self, maxWorkers:int):
+        if type(maxWorkers) == int and maxWorkers > 0:
+            self.close()
+            self.maxWorkers = maxWorkers
+            return True
+        else:
+            return False
+    def getExecutor(self):
+        # the thread pool of the concurrent mode, started at the first use
+        with self.executorLock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.maxWorkers)
+            return self.executor
+    def dropExecutor(self, executor):
+        # leave executor to the calls still running on it, see setTimeout
+        with self.executorLock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+    def close(self):
+        # stop the thread pool of the concurrent mode, if started
+        with self.executorLock:
+            executor = self.executor
+            self.executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return True
     def cleanQueryProcessors(self):
         self.queryProcessors = []
         return True
@@ -564,380 +1259,412 @@ class GenericQueryProcessor():
             self.queryProcessors.append(processor)
             return True 
         except Exception as e:
-            print(e)
+            report_error(e)
             return False
-        
-    def getAllAnnotations(self):
-        result = []
-        for processor in self.queryProcessors:
+
+    def runCalls(self, calls:list):
+        # calls is a list of (processor, method, args): the results of
+        # processor.method(*args) in the same order, with the exception raised
+        # by a call in place of its result
+        def call(processor, method, args):
+            return getattr(processor, method)(*args)
+
+        results = []
+        if not self.concurrent or len(calls) < 2:
+            for processor, method, args in calls:
+                try:
+                    results.append(call(processor, method, args))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        executor = self.getExecutor()
+        # each call runs in a copy of the context, so its spans are children
+        # of the current one
+        futures = [executor.submit(copy_context().run, call, *arguments) for arguments in calls]
+        # all the calls start together, so they share the same deadline
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        abandoned = False
+        for future in futures:
             try:
-                df = processor.getAllAnnotations()
-                df = df.reset_index() 
-
-                annotations_list = [
-                    Annotation(row['id'], 
-                               row['motivation'], 
-                               IdentifiableEntity(row['target']), 
-                               Image(row['body'])
-                               ) for _, row in df.iterrows()
-                ]
-                result += annotations_list
+                results.append(future.result(None if deadline is None else max(deadline - monotonic(), 0)))
             except Exception as e:
-                print(e)
-        return result
+                if not future.done() and not future.cancel():
+                    # still running: it keeps its worker busy
+                    abandoned = True
+                results.append(e)
+        if abandoned:
+            self.dropExecutor(executor)
+        return results
+
+    def collectAll(self, requests:list):
+        # requests is a list of (kind, method, args): for each of them the
+        # rows of method(*args) of all the processors of class kind, as in
+        # collect. All the calls go out together, so in concurrent mode the
+        # relational and the graph queries of a method overlap
+        calls = []
+        for position, (kind, method, args) in enumerate(requests):
+            calls += [(position, (processor, method, args)) for processor in self.queryProcessors if isinstance(processor, kind)]
+        frames = [[] for request in requests]
+        for (position, arguments), result in zip(calls, self.runCalls([arguments for position, arguments in calls])):
+            if isinstance(result, Exception):
+                report_error(result)
+                continue
+            frames[position].append(result)
+        return [concat(request_frames, ignore_index=True) if request_frames else DataFrame() for request_frames in frames]
+
+    def collect(self, kind, method:str, *args):
+        # the rows returned by method(*args) of all the processors of class
+        # kind, concatenated; a processor whose call fails is reported and
+        # left out, as in getAllAnnotations
+        return self.collectAll([(kind, method, args)])[0]
+
+    def graphWithEntities(self, method:str, *args, columns:tuple=("id",)):
+        # the rows of the graph processors for method(*args) and the
+        # relational entities of the ids in their columns. One after the other
+        # the entities are read by a semi-join on the ids; in concurrent mode
+        # the Entity rows are read while the graph query runs and filtered
+        # afterwards, so the call waits for the slower of the two instead of
+        # their sum. Only for the methods on the whole graph, whose ids cover
+        # most of the Entity table anyway
+        empty = DataFrame(columns=["entityId", "id", "creator", "title"])
+        if not self.concurrent:
+            graph_db = self.collect(TriplestoreQueryProcessor, method, *args)
+            if graph_db.empty:
+                return graph_db, empty
+            return graph_db, self.entitiesWithIds(concat([graph_db[column].dropna() for column in columns]))
+
+        graph_db, relation_db = self.collectAll([(TriplestoreQueryProcessor, method, args), (RelationalQueryProcessor, "getEntities", ())])
+        if graph_db.empty or relation_db.empty:
+            return graph_db, empty
+        ids = concat([graph_db[column].dropna() for column in columns])
+        return graph_db, relation_db[relation_db["id"].isin(ids)].reset_index(drop=True)
+
+    def entitiesWithIds(self, ids):
+        # semi-join: the entities of the relational processors restricted to
+        # the ids found on the graph side, instead of the whole Entity table
+        relation_db = self.collect(RelationalQueryProcessor, "getEntitiesWithIds", list(ids))
+        if relation_db.empty:
+            return DataFrame(columns=["entityId", "id", "creator", "title"])
+        return relation_db
+
+    def annotationsWithTargets(self, ids):
+        # semi-join as entitiesWithIds, for the annotations of the given targets
+        relation_db = self.collect(RelationalQueryProcessor, "getAnnotationsWithTargets", list(ids))
+        if relation_db.empty:
+            return DataFrame(columns=["annotationId", "id", "body", "target", "motivation"])
+        return relation_db
+        
+    @traced
+    @cached
+    def getAllAnnotations(self):
+        df = self.collect(RelationalQueryProcessor, "getAllAnnotations")
+        if df.empty:
+            df = DataFrame(columns=["id", "motivation", "target", "body"])
+        return self.makeResult(Annotation, {
+            "id": df["id"],
+            "motivation": df["motivation"],
+            "target": df["target"],
+            "body": df["body"]
+        })
     
     
+    @traced
+    @cached
     def getAllCanvas(self):
-        result = []
-        for processor in self.queryProcessors:
-            try:
-                df = processor.getAllCanvases()
-                df = df.reset_index() 
-                
-                canvases_list = [
-                    Canvas(row['id'],
-                               row['label'], 
-                               row['title'],
-                               []
-                               ) for _, row in df.iterrows()
-                ] 
-                result += canvases_list
-            except Exception as e:
-                print(e)
-        return result
+        graph_db, relation_db = self.graphWithEntities("getAllCanvases")
+        if graph_db.empty:
+            return self.makeResult(Canvas, {"id": [], "label": [], "title": [], "creators": []})
+        # the graph has no titles: they come from the relational side
+        titles, creators = self.metadataById(relation_db)
+        ids = graph_db["id"].tolist()
+        return self.makeResult(Canvas, {
+            "id": ids,
+            "label": graph_db["label"],
+            "title": [titles.get(id, "") for id in ids],
+            "creators": [creators.get(id, []) for id in ids]
+        })
     
 
+    @traced
+    @cached
     def getAllCollections(self):
-        result = []
-        for processor in self.queryProcessors:
-            try:
-                df = processor.getAllCollections()
-                df = df.reset_index() 
-                
-                collections_list = [
-                    Collection(row['id'],
-                               row['label'],
-                               row['collection'],
-                               [],
-                               [
-                                   Manifest('','','',[],Canvas('','','',''))
-                                ]
-                                ) for _, row in df.iterrows()
-                ] 
-                result += collections_list
-            except Exception as e:
-                print(e)
-        return result
-
-
+        df = self.collect(TriplestoreQueryProcessor, "getAllCollections")
+        if df.empty:
+            return self.makeResult(Collection, {"id": [], "label": [], "title": [], "creators": [], "items": []})
+        ids = df["id"].tolist()
+        return self.makeResult(Collection, {
+            "id": ids,
+            "label": df["label"].tolist(),
+            "title": df["collection"].tolist(),
+            "creators": [[] for id in ids],
+            "items": [[Manifest('','','',[],Canvas('','','',''))] for id in ids]
+        })
+
+
+    @traced
+    @cached
     def getAllImages(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAllImages()
-            except Exception as e:
-                print(e)
+        # an image is the body of one or more annotations, listed once
+        relation_db = self.collect(RelationalQueryProcessor, "getAllImages")
+        ids = relation_db["id"].drop_duplicates() if not relation_db.empty else []
+        return self.makeResult(Image, {"id": ids})
+
+    @traced
+    @cached
     def getAllManifests(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAllManifests()
-            except Exception as e:
-                print(e)
-    def getAnnotationsToCanvas(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsToCanvas()
-            except Exception as e:
-                print(e)
-    def getAnnotationsToCollection(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsToCollection()
-            except Exception as e:
-                print(e)
-    def getAnnotationsToManifest(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsToManifest()
-            except Exception as e:
-                print(e)
-    def getAnnotationsWithBody(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsWithBody()
-            except Exception as e:
-                print(e)
-    def getAnnotationsWithBodyAndTarget(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsWithBodyAndTarget()
-            except Exception as e:
-                print(e)
-    def getAnnotationsWithTarget(self):
-        for processor in self.queryProcessors:
-            try:
-                processor.getAnnotationsWithTarget()
-            except Exception as e:
-                print(e)
+        # every manifest with its canvases, from a single graph query
+        graph_db, relation_db = self.graphWithEntities("getAllManifestsWithCanvases", columns=("id", "canvasId"))
+        return self.manifestsFromHierarchy(graph_db, relation_db)
+
+    @traced
+    @cached
+    def getAnnotationsToCanvas(self, canvasId):
+        return self.annotationResult(self.annotationsWithTargets([canvasId]))
+
+    @traced
+    @cached
+    def getAnnotationsToCollection(self, collectionId):
+        # the annotations of the collection, of its manifests and of their
+        # canvases: one graph query for all the ids it contains, then one
+        # semi-join on the targets
+        graph_db = self.collect(TriplestoreQueryProcessor, "getEntityIdsInCollection", collectionId)
+        ids = [collectionId] + (graph_db["id"].tolist() if not graph_db.empty else [])
+        return self.annotationResult(self.annotationsWithTargets(ids))
+
+    @traced
+    @cached
+    def getAnnotationsToManifest(self, manifestId):
+        # the annotations of the manifest and of its canvases, as above
+        graph_db = self.collect(TriplestoreQueryProcessor, "getCanvasesInManifest", manifestId)
+        ids = [manifestId] + (graph_db["id"].tolist() if not graph_db.empty else [])
+        return self.annotationResult(self.annotationsWithTargets(ids))
+
+    @traced
+    @cached
+    def getAnnotationsWithBody(self, bodyId):
+        return self.annotationResult(self.collect(RelationalQueryProcessor, "getAnnotationsWithBody", bodyId))
+
+    @traced
+    @cached
+    def getAnnotationsWithBodyAndTarget(self, bodyId, targetId):
+        return self.annotationResult(self.collect(RelationalQueryProcessor, "getAnnotationsWithBodyAndTarget", bodyId, targetId))
+
+    @traced
+    @cached
+    def getAnnotationsWithTarget(self, targetId):
+        return self.annotationResult(self.collect(RelationalQueryProcessor, "getAnnotationsWithTarget", targetId))
 
 #Nicole 
+    @traced
+    @cached
     def getCanvasesInCollection(self, collectionId):
-        graph_db = DataFrame()
-        relation_db = DataFrame()
-        canvas_list = []
-        for item in self.queryProcessors:
-            if isinstance(item, TriplestoreQueryProcessor):
-                graph_to_add = item.getCanvasesInCollection(collectionId)#restituisce canva, id, collection
-                graph_db = concat([graph_db,graph_to_add], ignore_index= True)
-            elif isinstance(item, RelationalQueryProcessor):
-                relation_to_add = item.getEntities() #restituisce entityId, id, creator,title
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-        if not graph_db.empty:
-            df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
-            # itera le righe del dataframe e crea gli oggetti Canvas
-            for index, row in df_joined.iterrows():
-                canvas = Canvas(row['id'], row['label'], row['title'], row['creator'])
-                canvas_list.append(canvas)
-        return canvas_list 
+        graph_db = self.collect(TriplestoreQueryProcessor, "getCanvasesInCollection", collectionId) #restituisce canva, id, collection
+        if graph_db.empty:
+            return self.makeResult(Canvas, {"id": [], "label": [], "title": [], "creators": []})
+        relation_db = self.entitiesWithIds(graph_db["id"]) #restituisce entityId, id, creator,title
+        df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
+        return self.buildEntities(Canvas, df_joined)
     
+    @traced
+    @cached
     def getCanvasesInManifest(self, manifestId):
-        graph_db = DataFrame()
-        relation_db = DataFrame()
-        canvas_list = []
-        for item in self.queryProcessors:
-            if isinstance(item, TriplestoreQueryProcessor):
-                graph_to_add = item.getCanvasesInManifest(manifestId)
-                graph_db = concat([graph_db,graph_to_add], ignore_index= True)
-            elif isinstance(item, RelationalQueryProcessor):
-                relation_to_add = item.getEntities() #restituisce entityId, id, title, creator
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                break
-        if not graph_db.empty:
-            df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
-            for index, row in df_joined.iterrows():
-                    canvas = Canvas(row['id'], row['label'], row['title'], row['creator'])
-                    canvas_list.append(canvas)
-        return canvas_list 
+        graph_db = self.collect(TriplestoreQueryProcessor, "getCanvasesInManifest", manifestId)
+        if graph_db.empty:
+            return self.makeResult(Canvas, {"id": [], "label": [], "title": [], "creators": []})
+        relation_db = self.entitiesWithIds(graph_db["id"]) #restituisce entityId, id, title, creator
+        df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
+        return self.buildEntities(Canvas, df_joined)
     
+    @traced
+    @cached
     def getEntityById(self, id):#non ancora implementato
-        for item in self.queryProcessors:
-            if isinstance(item, TriplestoreQueryProcessor):
-                graph_db = item.getEntitiesWithId(id)  
-                for index, row in graph_db.iterrows(): 
-                    entity = IdentifiableEntity(row['id'])
-                    return entity
-            else:
-                pass
+        graph_db = self.collect(TriplestoreQueryProcessor, "getEntitiesWithId", id)
+        if not graph_db.empty:
+            return IdentifiableEntity(graph_db["id"].iloc[0])
+    @traced
+    @cached
     def getEntitiesWithCreator(self, creator):
         graph_db = DataFrame()
-        relation_db = DataFrame()
-        for item in self.queryProcessors:  
-            if isinstance(item, RelationalQueryProcessor):
-                relation_to_add = item.getEntitiesWithCreator(creator) #restituisce entityId, id, title, creator
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                pass
-        if not relation_db.empty:
-            id_db = relation_db[["id"]]
-            for item in self.queryProcessors:  
-                if isinstance(item, TriplestoreQueryProcessor):
-                    for i, r in id_db.iterrows():
-                        graph_to_add = item.getEntitiesWithId(r['id']) #restituisce id label title
-                        graph_db = concat([graph_db,graph_to_add], ignore_index= True)
-                else:
-                    pass    
-        entity_list =[]
+        relation_db = self.collect(RelationalQueryProcessor, "getEntitiesWithCreator", creator) #restituisce entityId, id, title, creator
         if not relation_db.empty:
-            df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
-            # itera le righe del dataframe e crea gli oggetti Canvas
-            for index, row in df_joined.iterrows():
-                entity = EntityWithMetadata(row['id'], row['label'], row['title'], row['creator'])
-                entity_list.append(entity)
-        return entity_list
+            # all the ids of the creator are looked up in a single batch query
+            id_list = relation_db["id"].tolist()
+            graph_db = self.collect(TriplestoreQueryProcessor, "getEntitiesWithIds", id_list) #restituisce id label title
+        if relation_db.empty or graph_db.empty:
+            return self.makeResult(EntityWithMetadata, {"id": [], "label": [], "title": [], "creators": []})
+        df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
+        return self.buildEntities(EntityWithMetadata, df_joined)
         
 
 # ERICA:
 
+    @traced
+    @cached
     def getEntitiesWithLabel(self, label):
-        
-        graph_db = DataFrame()
-        relation_db = DataFrame()
-        result = list()
-
-        for processor in self.queryProcessors:
-            if isinstance(processor, TriplestoreQueryProcessor):
-                graph_to_add = processor.getEntitiesWithLabel(label)
-                graph_db = concat([graph_db, graph_to_add], ignore_index= True)
-            elif isinstance(processor, RelationalQueryProcessor):
-                relation_to_add = processor.getEntities()
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                break
+
+        graph_db = self.collect(TriplestoreQueryProcessor, "getEntitiesWithLabel", label)
         
         if not graph_db.empty: #check if the call got some result
+            relation_db = self.entitiesWithIds(graph_db["id"])
             df_joined = merge(graph_db, relation_db, left_on="id", right_on="id") #create the merge with the two db
-            grouped = df_joined.groupby("id").agg({
-                                                        "label": "first",
-                                                        "title": "first",
-                                                        "creator": lambda x: "; ".join(x)
-                                                    }).reset_index() #this is to avoid duplicates when we have more than one creator
-            grouped_fill = grouped.fillna('')
-            sorted = grouped_fill.sort_values("id") #sorted for id
-
-            if not sorted.empty:
-                # if the merge has some result inside, proceed
-                for row_idx, row in sorted.iterrows():
-                    if row["title"] != '' and row["creator"] != '':
-                        id = row["id"]
-                        label = label
-                        title = row["title"]
-                        creators = row['creator']
-                        for item in creators: # iterate the string and find out if there are some ";", if there are, split them
-                            if ";" in item:
-                                creators = creators.split(';') 
-                            
-
-                        entities = EntityWithMetadata(id, label, title, creators)
-                        result.append(entities)
-                    
-                    else: 
-
-                        id = row["id"]
-                        label = label
-                        title = ""
-                        creators = ""
 
-                        entities = EntityWithMetadata(id, label, title, creators)
-                        result.append(entities)
-            
-                return result
-        
-            else:
-                for row_idx, row in graph_db.iterrows():
-                    id = row["id"]
-                    label = label
-                    title = ""
-                    creators = ""
-
-                    entities = EntityWithMetadata(id, label, title, creators)
-                    result.append(entities)
-                return result
+            if df_joined.empty:
+                ids = graph_db["id"].tolist()
+                return self.makeResult(EntityWithMetadata, {"id": ids, "label": [label] * len(ids), "title": [""] * len(ids), "creators": [""] * len(ids)})
+
+            # one entity for each id, with all its creators: the rows of the
+            # relational side already hold one creator each
+            titles, creators = self.metadataById(df_joined)
+            ids = sorted(titles) #sorted for id
+            complete = [titles[id] != '' and id in creators for id in ids]
+            return self.makeResult(EntityWithMetadata, {
+                "id": ids,
+                "label": [label] * len(ids),
+                "title": [titles[id] if ok else "" for id, ok in zip(ids, complete)],
+                "creators": [creators[id] if ok else "" for id, ok in zip(ids, complete)]
+            })
+
+        return self.makeResult(EntityWithMetadata, {"id": [], "label": [], "title": [], "creators": []})
                 
 
         
+    @traced
+    @cached
     def getEntitiesWithTitle(self, title):
 
         graph_db = DataFrame()
-        relation_db = DataFrame()
-        result = list()
-
-        for processor in self.queryProcessors:
-            if isinstance(processor, TriplestoreQueryProcessor):
-                graph_to_add = processor.getAllEntities()
-                graph_db = concat([graph_db ,graph_to_add], ignore_index= True)
-            elif isinstance(processor, RelationalQueryProcessor):
-                relation_to_add = processor.getEntitiesWithTitle(title)
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                break        
+
+        relation_db = self.collect(RelationalQueryProcessor, "getEntitiesWithTitle", title)
+
+        # the other way round: only the entities with that title are read from the graph
+        if not relation_db.empty:
+            graph_db = self.collect(TriplestoreQueryProcessor, "getEntitiesWithIds", relation_db["id"].tolist())
         
 
         if not graph_db.empty:
             df_joined = merge(graph_db, relation_db, left_on="id", right_on="id")
-            grouped = df_joined.groupby("id").agg({
-                                                        "label": "first",
-                                                        "title": "first",
-                                                        "creator": lambda x: "; ".join(x)
-                                                    }).reset_index() #this is to avoid duplicates when we have more than one creator
-            grouped_fill = grouped.fillna('')
-            sorted = grouped_fill.sort_values("id")
-
-            for row_idx, row in sorted.iterrows():
-                id = row["id"]
-                label = row["label"]
-                title = title
-                creators = row["creator"]
-                for item in creators: # iterate the string and find out if there are some ";", if there are, split them
-                            if ";" in item:
-                                creators = creators.split(';') 
-                entities = EntityWithMetadata(id, label, title, creators)
-                result.append(entities)
-
-        return result
+            labels = df_joined.groupby("id")["label"].first().fillna("").to_dict()
+            titles, creators = self.metadataById(df_joined)
+
+            ids = sorted(labels)
+            return self.makeResult(EntityWithMetadata, {
+                "id": ids,
+                "label": [labels[id] for id in ids],
+                "title": [title] * len(ids),
+                "creators": [creators.get(id, "") for id in ids]
+            })
+
+        return self.makeResult(EntityWithMetadata, {"id": [], "label": [], "title": [], "creators": []})
         
 
+    @traced
+    @cached
     def getImagesAnnotatingCanvas(self, canvasId):
 
-        graph_db = DataFrame()
-        relation_db = DataFrame()
-        result = list()
-
-        for processor in self.queryProcessors:
+        # the canvas and its annotations do not depend on each other: both
+        # queries go out together
+        graph_db, relation_db = self.collectAll([(TriplestoreQueryProcessor, "getEntitiesWithCanvas", (canvasId,)),
+                                                 (RelationalQueryProcessor, "getAnnotationsWithTargets", ([canvasId],))])
 
-            if isinstance(processor, TriplestoreQueryProcessor):
-                graph_to_add = processor.getEntitiesWithCanvas(canvasId)
-                graph_db = concat([graph_db,graph_to_add], ignore_index= True)
-            elif isinstance(processor, RelationalQueryProcessor):
-                relation_to_add = processor.getAllAnnotations()
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                break
-
-        if not graph_db.empty:
+        if not graph_db.empty and not relation_db.empty:
             df_joined = merge(graph_db, relation_db, left_on="id", right_on="target")
+            return self.makeResult(Image, {"id": df_joined["body"]})
 
-            for row_idx, row in df_joined.iterrows():
-                id = row["body"]
-                images = Image(id)
-            result.append(images)
-
-            return result
+        return self.makeResult(Image, {"id": []})
     
 
+    @traced
+    @cached
     def getManifestsInCollection(self, collectionId):
 
-        graph_db = DataFrame()
-        relation_db = DataFrame()
-        result = list()
-        
-        for processor in self.queryProcessors:
-            if isinstance(processor, TriplestoreQueryProcessor):
-                graph_to_add = processor.getManifestsInCollection(collectionId)
-                graph_db = concat([graph_db,graph_to_add], ignore_index= True)
-            elif isinstance(processor, RelationalQueryProcessor):
-                relation_to_add = processor.getEntities()
-                relation_db = concat([relation_db, relation_to_add], ignore_index=True)
-            else:
-                break
-        
-
-        if not graph_db.empty:
-            df_joined = merge(graph_db, relation_db, left_on="id", right_on="id") 
-
-            if not df_joined.empty:
-
-                for row_idx, row in df_joined.iterrows():
-                    id = row["id"]
-                    label = row["label"]
-                    title = row["title"]
-                    creators = row["creator"]
-                    items = processor.getCanvasesInManifest(id)
-                    manifests = Manifest(id, label, title, creators, items)
-                    result.append(manifests)
-
-            return result
-        else: 
-
-            for row_idx, row in graph_db.iterrows():
-                id = row["id"]
-                label = row["label"]
-                title = ""
-                creators = ""
-                items = processor.getCanvasesInManifest(id)
-                manifests = Manifest(id, label, title, creators, items)
-                result.append(manifests)            
-
-            return result
+        graph_db = self.collect(TriplestoreQueryProcessor, "getManifestsWithCanvasesInCollection", collectionId)
+        return self.manifestsFromHierarchy(graph_db)
+
+    @traced_as("build")
+    def manifestsFromHierarchy(self, graph_db, relation_db=None):
+        # Manifests with their Canvas items from the rows of a manifest ->
+        # canvas query (columns id, label, canvasId, canvasLabel) and the
+        # entities of their ids, read here when relation_db is None
+        if graph_db.empty:
+            return self.makeResult(Manifest, {"id": [], "label": [], "title": [], "creators": [], "items": []})
+
+        # metadata of the manifests and of their canvases only
+        if relation_db is None:
+            relation_db = self.entitiesWithIds(concat([graph_db["id"], graph_db["canvasId"].dropna()]))
+
+        titles, creators = self.metadataById(relation_db)
+
+        # the canvases of every manifest, from the rows of the hierarchy query
+        canvas_db = graph_db.dropna(subset=["canvasId"])
+        items = dict()
+        for manifest_id, group in canvas_db.groupby("id", sort=False):
+            items[manifest_id] = [
+                Canvas(canvas_id, canvas_label, titles.get(canvas_id, ""), creators.get(canvas_id, []))
+                for canvas_id, canvas_label in zip(group["canvasId"], group["canvasLabel"])
+            ]
+
+        manifest_db = graph_db.drop_duplicates(subset="id")
+        ids = manifest_db["id"].tolist()
+        return self.makeResult(Manifest, {
+            "id": ids,
+            "label": manifest_db["label"],
+            "title": [titles.get(id, "") for id in ids],
+            "creators": [creators.get(id, []) for id in ids],
+            "items": [items.get(id, []) for id in ids]
+        })
+
+    @traced_as("build")
+    def annotationResult(self, relation_db):
+        # Annotations from rows of the Annotation table
+        if relation_db.empty:
+            relation_db = DataFrame(columns=["annotationId", "id", "body", "target", "motivation"])
+        return self.makeResult(Annotation, {
+            "id": relation_db["id"],
+            "motivation": relation_db["motivation"],
+            "target": relation_db["target"],
+            "body": relation_db["body"]
+        })
+
+    @traced_as("build")
+    def makeResult(self, model, columns:dict):
+        # columns holds the arguments of the model constructor, in order, as
+        # lists or Series: the result is the list of model objects or, in
+        # "batch" format, a ResultBatch over the same columns
+        wraps = MODEL_WRAPS.get(model, dict())
+        if self.resultFormat == "batch":
+            return ResultBatch(model, columns, wraps)
+        values = []
+        for name, column in columns.items():
+            column = column.tolist() if isinstance(column, Series) else column
+            if name in wraps:
+                column = [wraps[name](value) for value in column]
+            values.append(column)
+        return [model(*arguments) for arguments in zip(*values)]
+
+    @traced_as("build")
+    def buildEntities(self, entity_class, df_joined):
+        # one entity_class for each row of a graph/relational merge, built
+        # from the column arrays instead of iterating over the rows
+        df_joined = df_joined.astype(object).where(df_joined.notna(), None)
+        return self.makeResult(entity_class, {
+            "id": df_joined["id"],
+            "label": df_joined["label"],
+            "title": df_joined["title"],
+            "creators": df_joined["creator"]
+        })
+
+    @traced_as("pandas")
+    def metadataById(self, relation_db):
+        # title and list of creators of every entity id in the rows of
+        # getEntities, as two dictionaries; empty creators are left out
+        if relation_db.empty:
+            return dict(), dict()
+        relation_db = relation_db.fillna("")
+        titles = relation_db.groupby("id")["title"].first().to_dict()
+        with_creator = relation_db[relation_db["creator"] != ""]
+        creators = with_creator.groupby("id")["creator"].agg(list).to_dict()
+        return titles, creators
 
 
 
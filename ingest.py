@@ -0,0 +1,215 @@
+# Bulk ingestion of many collection JSON, annotation CSV and metadata CSV files.
+# The files are parsed on a process pool and the results are funnelled into a
+# single writer for each backend: one thread writes the SQLite tables, another
+# one sends the triples in INSERT DATA batches.
+#
+#   python ingest.py data/ --relational relational.db --graph http://127.0.0.1:9999/blazegraph/sparql
+#
+# The collections are always ingested with hash ids (see create_Graph), so the
+# workers do not share any counter and the order of the files does not matter.
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from glob import glob
+from json import dumps
+from os.path import isdir, join
+from time import perf_counter
+from pandas import read_csv
+from impl import AnnotationProcessor, MetadataProcessor, CollectionProcessor
+from utils.stream_graph import stream_triples
+from utils.sparql_upload import triple_lines
+from utils.metrics import REGISTRY, start_call, end_call, report_error
+
+BASE_URL = "https://github.com/n1kg0r/ds-project-dhdk/"
+
+
+def expand_paths(patterns:list):
+    # files, glob patterns and directories (all their .json and .csv files)
+    paths = set()
+    for pattern in patterns:
+        if isdir(pattern):
+            paths.update(glob(join(pattern, "*.json")))
+            paths.update(glob(join(pattern, "*.csv")))
+        else:
+            paths.update(glob(pattern))
+    return sorted(paths)
+
+
+def file_kind(path:str):
+    # "collection", "annotations" or "metadata", None for anything else
+    if path.endswith(".json"):
+        return "collection"
+    if path.endswith(".csv"):
+        with open(path, mode='r', encoding="utf-8-sig") as f:
+            header = [column.strip() for column in f.readline().split(",")]
+        if "motivation" in header:
+            return "annotations"
+        if "creator" in header:
+            return "metadata"
+    return None
+
+
+def parse_collection(path:str, containment:bool=False):
+    # run by the workers: the triples of a collection file as N-Triples lines
+    start = perf_counter()
+    with open(path, mode='r', encoding="utf-8") as jsonfile:
+        lines = list(triple_lines(stream_triples(jsonfile, BASE_URL, "hash", containment)))
+    return lines, perf_counter() - start
+
+
+def parse_csv(path:str):
+    # run by the workers: the rows of an annotations or metadata file
+    start = perf_counter()
+    frame = read_csv(path, keep_default_na=False, dtype="string")
+    return frame, perf_counter() - start
+
+
+def file_report(path:str, kind:str, items:int, seconds:float):
+    return {
+        "path": path,
+        "kind": kind,
+        "items": items,
+        "parseSeconds": seconds,
+        "itemsPerSecond": items / seconds if seconds else 0.0
+    }
+
+
+def writer_error(report:dict, writer:str, error:Exception, path:str=None):
+    # printed and counted as the processors do (see utils.metrics), and kept
+    # in the report for the caller
+    report_error(error)
+    report["errors"].append({"writer": writer, "file": path, "error": repr(error)})
+
+
+def as_call(method:str):
+    # decorator of the writers: each one runs as a call of the metrics
+    # registry, so the errors they catch (or the processors catch for them)
+    # are counted under ("ingest", method) like the ones of the processors
+    def decorator(writer):
+        def wrapper(*args):
+            token = start_call(REGISTRY, "ingest", method)
+            start = perf_counter()
+            try:
+                return writer(*args)
+            finally:
+                end_call(token, perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@as_call("write_graph")
+def write_graph(endpoint:str, futures:list, batch_size:int, report:dict):
+    # single writer of the triplestore, files are sent as soon as they are parsed
+    collection = CollectionProcessor()
+    collection.setDbPathOrUrl(endpoint)
+    collection.setBatchSize(batch_size)
+    # only the time spent sending is counted, not the one waiting for the
+    # parsers (already in the parseSeconds of the files)
+    seconds_writing = 0.0
+    path = None
+    try:
+        for future in as_completed(futures):
+            path, kind = futures[future]
+            lines, seconds = future.result()
+            report["files"].append(file_report(path, kind, len(lines), seconds))
+            start = perf_counter()
+            collection.sendLines(lines)
+            seconds_writing += perf_counter() - start
+        report["writers"]["graph"] = seconds_writing
+        return True
+    except Exception as e:
+        writer_error(report, "graph", e, path)
+        return False
+
+
+def parsed_frames(futures:list, kind:str, report:dict, waits:list):
+    # frames in the order of the files, so the surrogate ids are reproducible;
+    # the seconds spent waiting for each of them are appended to waits
+    # a file that cannot be parsed is reported here and stops the upload
+    # (uploadFrames rolls it back)
+    for path, future in futures:
+        start = perf_counter()
+        try:
+            frame, seconds = future.result()
+        except Exception as e:
+            report["errors"].append({"writer": "relational", "file": path, "error": repr(e)})
+            raise
+        waits.append(perf_counter() - start)
+        report["files"].append(file_report(path, kind, len(frame), seconds))
+        yield frame
+
+
+@as_call("write_relational")
+def write_relational(path:str, annotations:list, metadata:list, report:dict):
+    # single writer of the SQLite database: all the annotation files become the
+    # Annotation and Image tables, all the metadata files Entity and Creators.
+    # The frames are pulled from the parsers while writing: the time waiting
+    # for them is taken out of the time of the writer
+    start = perf_counter()
+    waits = []
+    result = True
+    if annotations:
+        annotation = AnnotationProcessor()
+        annotation.setDbPathOrUrl(path)
+        annotation.setBulkLoad(True)
+        result = annotation.uploadFrames(parsed_frames(annotations, "annotations", report, waits)) and result
+    if metadata:
+        entity = MetadataProcessor()
+        entity.setDbPathOrUrl(path)
+        entity.setBulkLoad(True)
+        result = entity.uploadFrames(parsed_frames(metadata, "metadata", report, waits)) and result
+    report["writers"]["relational"] = perf_counter() - start - sum(waits)
+    if not result and not any(error["writer"] == "relational" for error in report["errors"]):
+        # failed in the processors, which have printed and counted the error
+        report["errors"].append({"writer": "relational", "file": None, "error": "upload failed"})
+    return result
+
+
+def bulk_ingest(patterns:list, relational:str=None, graph:str=None, workers:int=None, batch_size:int=1000, containment:bool=False):
+    # ingest all the files matched by patterns; relational is the path of the
+    # SQLite database, graph the SPARQL endpoint, either can be None to skip
+    # the related files; containment adds the triples of
+    # CollectionProcessor.setContainment. It returns a report with the
+    # figures of every file and the errors of the writers
+    paths = expand_paths(patterns)
+    kinds = {path: file_kind(path) for path in paths}
+    report = {"files": [], "writers": dict(), "errors": []}
+
+    start = perf_counter()
+    with ProcessPoolExecutor(workers) as pool, ThreadPoolExecutor(2) as writers:
+        writes = []
+        if graph:
+            futures = {pool.submit(parse_collection, path, containment): (path, kind) for path, kind in kinds.items() if kind == "collection"}
+            writes.append(writers.submit(write_graph, graph, futures, batch_size, report))
+        if relational:
+            annotations = [(path, pool.submit(parse_csv, path)) for path, kind in kinds.items() if kind == "annotations"]
+            metadata = [(path, pool.submit(parse_csv, path)) for path, kind in kinds.items() if kind == "metadata"]
+            writes.append(writers.submit(write_relational, relational, annotations, metadata, report))
+        report["success"] = all([write.result() for write in writes])
+    wall = perf_counter() - start
+
+    # speedup against running every parse and write one after the other
+    sequential = sum(f["parseSeconds"] for f in report["files"]) + sum(report["writers"].values())
+    report["wallSeconds"] = wall
+    report["sequentialSeconds"] = sequential
+    report["speedup"] = sequential / wall if wall else 0.0
+    report["skipped"] = [path for path, kind in kinds.items() if kind is None]
+    return report
+
+
+def main():
+    parser = ArgumentParser(description="Ingest many collection, annotation and metadata files in parallel")
+    parser.add_argument("paths", nargs="+", help="files, glob patterns or directories")
+    parser.add_argument("--relational", help="path of the SQLite database (.db)")
+    parser.add_argument("--graph", help="URL of the SPARQL endpoint")
+    parser.add_argument("--workers", type=int, default=None, help="size of the process pool (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="triples in each INSERT DATA request")
+    parser.add_argument("--containment", action="store_true", help="also write the collection -> canvas containment triples")
+    args = parser.parse_args()
+
+    report = bulk_ingest(args.paths, args.relational, args.graph, args.workers, args.batch_size, args.containment)
+    print(dumps(report, indent=2))
+    return 0 if report["success"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,57 @@
+# The databases of the sample data in data/, for the tests: the relational
+# one from the annotation and metadata files, the graph in a local store
+# (.db) from the collection files, with hash ids so no counter file is used
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from impl import (AnnotationProcessor, MetadataProcessor, CollectionProcessor, GenericQueryProcessor,
+                  RelationalQueryProcessor, TriplestoreQueryProcessor)
+
+COLLECTIONS = [join("data", "collection-1.json"), join("data", "collection-2.json")]
+
+
+def build_relational(path:str):
+    annotations = AnnotationProcessor()
+    annotations.setDbPathOrUrl(path)
+    metadata = MetadataProcessor()
+    metadata.setDbPathOrUrl(path)
+    return annotations.uploadData(join("data", "annotations.csv")) and metadata.uploadData(join("data", "metadata.csv"))
+
+
+def build_graph(path:str, containment:bool=False):
+    collection = CollectionProcessor()
+    collection.setDbPathOrUrl(path)
+    collection.setStreaming(True)
+    collection.setIdMode("hash")
+    collection.setContainment(containment)
+    return all([collection.uploadData(file) for file in COLLECTIONS])
+
+
+class SampleDataTestCase(unittest.TestCase):
+    # both databases, built once for the class, and for every test a
+    # relational, a graph and a generic processor over them
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.relational = join(cls.directory.name, "relational.db")
+        cls.graph = join(cls.directory.name, "graph.db")
+        assert build_relational(cls.relational) and build_graph(cls.graph)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.relational_processor = RelationalQueryProcessor()
+        self.relational_processor.setDbPathOrUrl(self.relational)
+        self.graph_processor = TriplestoreQueryProcessor()
+        self.graph_processor.setDbPathOrUrl(self.graph)
+        self.generic = GenericQueryProcessor()
+        self.generic.addQueryProcessor(self.relational_processor)
+        self.generic.addQueryProcessor(self.graph_processor)
+
+    def tearDown(self):
+        self.generic.close()
+        self.relational_processor.close()
+        self.graph_processor.close()
@@ -0,0 +1,36 @@
+# A local SPARQL 1.1 endpoint over a local store file, to run the triplestore
+# code without Blazegraph (see utils/sparql_server.py).
+#
+#   python sparql_server.py graph.db
+#
+# serves graph.db at http://127.0.0.1:9999/blazegraph/sparql, the URL used by
+# basic-test.py; --latency and --jitter delay every answer, as a remote
+# server on a slow network would.
+from argparse import ArgumentParser
+from utils.sparql_server import SparqlServer
+
+
+def main():
+    parser = ArgumentParser(description="Serve a local store file as a SPARQL 1.1 endpoint")
+    parser.add_argument("path", help="store file, created if missing (e.g. graph.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=9999, help="port to listen on, 0 for a free one")
+    parser.add_argument("--route", default="/blazegraph/sparql", help="path of the endpoint")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to these random seconds added too")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = SparqlServer(args.path, args.host, args.port, args.route, args.latency, args.jitter, args.verbose)
+    print(f"SPARQL endpoint at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+import unittest
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from pandas import DataFrame
+from impl import AnnotationProcessor
+
+
+def annotations(first:int, count:int):
+    return DataFrame({
+        "id": [f"https://example.org/annotation/{n}" for n in range(first, first + count)],
+        "body": [f"https://example.org/image/{n}.jpg" for n in range(first, first + count)],
+        "target": [f"https://example.org/canvas/{n}" for n in range(first, first + count)],
+        "motivation": ["painting"] * count
+    })
+
+
+class TestAnnotationProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.database = join(self.directory.name, "relational.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_chunked_upload(self):
+        # the same rows whatever the chunk size, with ids unique across chunks
+        path = join(self.directory.name, "annotations.csv")
+        annotations(0, 25).to_csv(path, index=False)
+        for chunk_size in (0, 7, 100):
+            processor = AnnotationProcessor()
+            processor.setDbPathOrUrl(self.database)
+            self.assertTrue(processor.setChunkSize(chunk_size))
+            self.assertTrue(processor.uploadData(path))
+            self.assertEqual(processor.getUploadStats()["annotations"], 25)
+            with connect(self.database) as con:
+                rows = con.execute("SELECT annotationId, id FROM Annotation ORDER BY id").fetchall()
+                images = con.execute("SELECT COUNT(*) FROM Image").fetchone()[0]
+            self.assertEqual(len(rows), 25)
+            self.assertEqual(len({annotation_id for annotation_id, id in rows}), 25)
+            self.assertEqual(images, 25)
+
+    def test_frames_are_not_modified(self):
+        processor = AnnotationProcessor()
+        processor.setDbPathOrUrl(self.database)
+        frames = [annotations(0, 5), annotations(5, 5)]
+        copies = [frame.copy() for frame in frames]
+        self.assertTrue(processor.uploadFrames(frames))
+        for frame, copy in zip(frames, copies):
+            self.assertTrue(frame.equals(copy))
+
+    def test_missing_file(self):
+        processor = AnnotationProcessor()
+        processor.setDbPathOrUrl(self.database)
+        self.assertFalse(processor.uploadData(join(self.directory.name, "missing.csv")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from benchmark import SCALES, check_graph, measure, run
+from impl import RelationalQueryProcessor, GenericQueryProcessor, TriplestoreQueryProcessor
+from utils.metrics import MetricsRegistry
+from sample_data import build_graph
+
+
+class TestMeasure(unittest.TestCase):
+
+    def test_rows(self):
+        measures = measure(lambda: [1, 2, 3], 2)
+        self.assertIsNone(measures["error"])
+        self.assertEqual(measures["rows"], 3)
+        self.assertGreater(measures["seconds"], 0)
+
+    def test_exception(self):
+        def fail():
+            raise ValueError("broken")
+        measures = measure(fail, 1)
+        self.assertEqual(measures["error"], "ValueError('broken')")
+        self.assertIsNone(measures["peakKiB"])
+
+    def test_false(self):
+        # what the uploads return when they fail
+        self.assertEqual(measure(lambda: False, 1, expect_rows=False)["error"], "returned False")
+        self.assertIsNone(measure(lambda: True, 1, expect_rows=False)["error"])
+
+    def test_empty_result(self):
+        self.assertEqual(measure(lambda: [], 1)["error"], "empty result")
+
+    def test_reported_error(self):
+        # the generic processor catches the error of the relational one and
+        # returns an empty result: only the metrics registry knows
+        registry = MetricsRegistry()
+        with TemporaryDirectory() as directory:
+            path = join(directory, "empty.db")
+            connect(path).close()
+            relational = RelationalQueryProcessor()
+            relational.setDbPathOrUrl(path)
+            generic = GenericQueryProcessor()
+            generic.addQueryProcessor(relational)
+            for processor in (relational, generic):
+                processor.setMetrics(registry)
+            with redirect_stdout(StringIO()):
+                measures = measure(lambda: generic.getAllImages(), 1, registry, expect_rows=False)
+            relational.close()
+        self.assertEqual(measures["error"], "reported DatabaseError in GenericQueryProcessor.getAllImages, "
+                                            "DatabaseError in RelationalQueryProcessor.getAllImages")
+        self.assertEqual(measures["seconds"], 0.0)
+
+    def test_peak_memory_of_the_call(self):
+        # about 8 MiB allocated by the call, whatever the process holds
+        measures = measure(lambda: bytearray(8 * 1024 * 1024), 1)
+        self.assertGreaterEqual(measures["peakKiB"], 8 * 1024)
+        self.assertLess(measures["peakKiB"], 9 * 1024)
+        self.assertLess(measure(lambda: [0], 1)["peakKiB"], 64)
+
+
+class TestRun(unittest.TestCase):
+
+    def test_tiny(self):
+        with TemporaryDirectory() as workdir, redirect_stdout(StringIO()):
+            results = run(["tiny"], 1, workdir)["results"]
+        uploads = [result for result in results if result["kind"] == "upload"]
+        self.assertEqual([result["error"] for result in uploads], [None, None, None])
+        self.assertTrue(all(result["rows"] > 0 and result["rowsPerSecond"] > 0 for result in uploads))
+        # every method of the three processors is timed
+        self.assertEqual([(result["processor"], result["method"]) for result in results if result["error"] is not None], [])
+        for result in results:
+            self.assertGreater(result["rows"], 0)
+            self.assertIsInstance(result["peakKiB"], int)
+        # on the generated dataset, loaded once: the upload run for the memory
+        # adds no entities
+        rows = {(result["processor"], result["method"]): result["rows"] for result in results}
+        collections, manifests, canvases, annotations = SCALES["tiny"]
+        self.assertEqual(rows[("TriplestoreQueryProcessor", "getAllCollections")], collections)
+        self.assertEqual(rows[("TriplestoreQueryProcessor", "getAllManifests")], collections * manifests)
+        self.assertEqual(rows[("TriplestoreQueryProcessor", "getAllCanvases")], collections * manifests * canvases)
+        self.assertEqual(rows[("GenericQueryProcessor", "getAllCollections")], collections)
+
+    def test_check_graph(self):
+        with TemporaryDirectory() as directory, redirect_stdout(StringIO()):
+            path = join(directory, "graph.db")
+            self.assertTrue(build_graph(path))
+            triplestore = TriplestoreQueryProcessor()
+            triplestore.setDbPathOrUrl(path)
+            found = {"collections": len(triplestore.getAllCollections()), "manifests": len(triplestore.getAllManifests()),
+                     "canvases": len(triplestore.getAllCanvases())}
+            self.assertIsNone(check_graph(triplestore, found))
+            self.assertEqual(check_graph(triplestore, dict(found, collections=1)),
+                             f"graph has {found['collections']} collections instead of 1")
+            triplestore.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Barrier, Thread
+from impl import AnnotationProcessor, RelationalQueryProcessor
+
+THREADS = 8
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.database = join(self.directory.name, "relational.db")
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(self.database)
+        self.assertTrue(annotations.uploadData("data/annotations.csv"))
+        self.processor = RelationalQueryProcessor()
+        self.processor.setDbPathOrUrl(self.database)
+
+    def tearDown(self):
+        self.processor.close()
+        self.directory.cleanup()
+
+    def test_connection_of_the_thread_is_reused(self):
+        con = self.processor.getConnection()
+        self.assertIs(self.processor.getConnection(), con)
+        self.assertEqual(len(self.processor.getAllAnnotations()), con.execute("SELECT COUNT(*) FROM Annotation").fetchone()[0])
+
+    def test_threads_share_one_pool(self):
+        # all the threads ask for their first connection at once
+        barrier = Barrier(THREADS)
+        connections = [None] * THREADS
+
+        def first_connection(position):
+            barrier.wait()
+            connections[position] = self.processor.getConnection()
+
+        threads = [Thread(target=first_connection, args=(position,)) for position in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(con) for con in connections}), THREADS)
+        self.assertEqual(len(self.processor.pool.connections), THREADS)
+
+    def test_release(self):
+        # only the connection of the calling thread is closed
+        con = self.processor.getConnection()
+        other = []
+        thread = Thread(target=lambda: other.append(self.processor.getConnection()))
+        thread.start()
+        thread.join()
+        self.processor.pool.release()
+        self.assertEqual(self.processor.pool.connections, other)
+        self.assertIsNot(self.processor.getConnection(), con)
+        self.assertEqual(len(self.processor.pool.connections), 2)
+
+    def test_close(self):
+        con = self.processor.getConnection()
+        self.assertTrue(self.processor.close())
+        self.assertIsNone(self.processor.pool)
+        self.assertIsNot(self.processor.getConnection(), con)
+
+    def test_settings_reopen_the_pool(self):
+        self.processor.getConnection()
+        self.assertTrue(self.processor.setCacheSize(1024))
+        self.assertIsNone(self.processor.pool)
+        con = self.processor.getConnection()
+        self.assertEqual(con.execute("PRAGMA cache_size").fetchone()[0], -1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
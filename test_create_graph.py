@@ -0,0 +1,77 @@
+import unittest
+from copy import deepcopy
+from json import load
+from os import getcwd
+from os.path import join
+from rdflib import Graph, Literal, URIRef
+from utils.CreateGraph import create_Graph, hash_internal_id, contains, items, position
+
+BASE_URL = "https://github.com/n1kg0r/ds-project-dhdk/"
+COUNTERS = ("collection_counter.txt", "manifest_counter.txt", "canvas_counter.txt")
+
+
+def read_collection(name:str="collection-1.json"):
+    with open(join("data", name), mode='r', encoding="utf-8") as f:
+        return load(f)
+
+
+def build(json_object:dict, id_mode:str="hash", containment:bool=False):
+    graph = Graph()
+    create_Graph(json_object, BASE_URL, graph, id_mode, containment)
+    return graph
+
+
+def counters():
+    contents = []
+    for name in COUNTERS:
+        with open(join(getcwd(), name), mode='r', encoding="utf-8") as f:
+            contents.append(f.read())
+    return contents
+
+
+class TestHashIds(unittest.TestCase):
+
+    def test_same_graph_every_time(self):
+        self.assertEqual(set(build(read_collection())), set(build(read_collection())))
+
+    def test_independent_of_order(self):
+        # the manifests and canvases in reverse order get the same IRIs
+        json_object = read_collection()
+        reversed_object = deepcopy(json_object)
+        reversed_object["items"].reverse()
+        for manifest in reversed_object["items"]:
+            manifest["items"].reverse()
+        subjects = {s for s in build(json_object).subjects()}
+        self.assertEqual(subjects, {s for s in build(reversed_object).subjects()})
+
+    def test_iri_of_the_iiif_id(self):
+        json_object = read_collection()
+        iri = URIRef(BASE_URL + hash_internal_id("Collection", json_object["id"]))
+        self.assertIn(iri, set(build(json_object).subjects()))
+        self.assertNotEqual(hash_internal_id("Canvas", "a"), hash_internal_id("Canvas", "b"))
+
+    def test_counters_are_not_used(self):
+        before = counters()
+        build(read_collection())
+        self.assertEqual(counters(), before)
+
+
+class TestContainment(unittest.TestCase):
+
+    def test_contains_and_positions(self):
+        json_object = read_collection()
+        plain = build(json_object)
+        graph = build(json_object, containment=True)
+        collection = URIRef(BASE_URL + hash_internal_id("Collection", json_object["id"]))
+        # the graph without containment is left as it is
+        self.assertEqual(set(plain), {triple for triple in graph if triple[1] not in (contains, position)})
+        canvases = {canvas for manifest in plain.objects(collection, items) for canvas in plain.objects(manifest, items)}
+        self.assertEqual(set(graph.objects(collection, contains)), canvases)
+        for manifest in json_object["items"]:
+            for number, canvas in enumerate(manifest["items"], 1):
+                iri = URIRef(BASE_URL + hash_internal_id("Canvas", canvas["id"]))
+                self.assertEqual(list(graph.objects(iri, position)), [Literal(number)])
+
+
+if __name__ == "__main__":
+    unittest.main()
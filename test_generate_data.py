@@ -0,0 +1,89 @@
+import unittest
+from json import load
+from os.path import join
+from tempfile import TemporaryDirectory
+from pandas import read_csv
+from generate_data import generate
+from impl import (AnnotationProcessor, CollectionProcessor, GenericQueryProcessor, MetadataProcessor,
+                  RelationalQueryProcessor, TriplestoreQueryProcessor)
+
+
+def read_json(path:str):
+    with open(path, mode='r', encoding="utf-8") as f:
+        return load(f)
+
+
+def read_bytes(path:str):
+    with open(path, mode='rb') as f:
+        return f.read()
+
+
+class TestGenerateData(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_counts_and_shared_ids(self):
+        report = generate(self.directory.name, collections=2, manifests=3, canvases=4, annotations=2, per_file=2)
+        self.assertEqual((report["manifests"], report["canvases"], report["entities"]), (6, 24, 2 * (1 + 3 * 5)))
+        # two collections in one file, as a list
+        collections = read_json(report["files"][0])
+        self.assertEqual(len(collections), 2)
+        canvases = {canvas["id"] for collection in collections for manifest in collection["items"] for canvas in manifest["items"]}
+        self.assertEqual(len(canvases), 24)
+
+        annotations = read_csv(join(self.directory.name, "annotations.csv"), keep_default_na=False)
+        metadata = read_csv(join(self.directory.name, "metadata.csv"), keep_default_na=False)
+        self.assertEqual(len(annotations), report["annotations"])
+        self.assertEqual(set(annotations["target"]), canvases)
+        self.assertEqual(len(metadata), report["metadataRows"])
+        self.assertTrue(canvases <= set(metadata["id"]))
+        # canvases have no metadata by default, the others two creators
+        with_title = metadata[metadata["title"] != ""]
+        self.assertEqual(len(with_title), 2 + 6)
+        self.assertTrue(all(len(creators.split("; ")) == 2 for creators in with_title["creator"]))
+
+    def test_seed(self):
+        first = generate(join(self.directory.name, "first"), seed=3)
+        second = generate(join(self.directory.name, "second"), seed=3)
+        for a, b in zip(first["files"], second["files"]):
+            self.assertEqual(read_bytes(a), read_bytes(b))
+
+    def test_loaded_by_the_processors(self):
+        report = generate(self.directory.name, collections=1, manifests=2, canvases=3, canvas_metadata=True)
+        relational = join(self.directory.name, "relational.db")
+        graph = join(self.directory.name, "graph.db")
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(relational)
+        metadata = MetadataProcessor()
+        metadata.setDbPathOrUrl(relational)
+        collection = CollectionProcessor()
+        collection.setDbPathOrUrl(graph)
+        collection.setStreaming(True)
+        collection.setIdMode("hash")
+        self.assertTrue(annotations.uploadData(join(self.directory.name, "annotations.csv")))
+        self.assertTrue(metadata.uploadData(join(self.directory.name, "metadata.csv")))
+        self.assertTrue(collection.uploadData(report["files"][0]))
+
+        relational_processor = RelationalQueryProcessor()
+        relational_processor.setDbPathOrUrl(relational)
+        graph_processor = TriplestoreQueryProcessor()
+        graph_processor.setDbPathOrUrl(graph)
+        generic = GenericQueryProcessor()
+        generic.addQueryProcessor(relational_processor)
+        generic.addQueryProcessor(graph_processor)
+        try:
+            manifests = generic.getAllManifests()
+            self.assertEqual(len(manifests), 2)
+            self.assertTrue(all(manifest.getTitle() and len(manifest.getItems()) == 3 for manifest in manifests))
+            self.assertTrue(all(canvas.getTitle() for manifest in manifests for canvas in manifest.getItems()))
+        finally:
+            relational_processor.close()
+            graph_processor.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
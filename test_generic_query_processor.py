@@ -0,0 +1,207 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from pandas.testing import assert_frame_equal
+from impl import AnnotationProcessor, GenericQueryProcessor, RelationalQueryProcessor, TriplestoreQueryProcessor
+from utils.metrics import MetricsRegistry
+from utils.tracing import merge
+from sample_data import build_graph, SampleDataTestCase
+from contextlib import redirect_stdout
+from io import StringIO
+from threading import Event
+from time import perf_counter, sleep
+
+
+def sorted_rows(frame, columns:list):
+    return frame[columns].fillna("").sort_values(columns).reset_index(drop=True)
+
+
+class TestSemiJoins(SampleDataTestCase):
+
+    def test_entities_with_ids(self):
+        entities = self.relational_processor.getEntities()
+        ids = entities["id"].tolist()[::2] + ["no such id"]
+        expected = entities[entities["id"].isin(ids)]
+        columns = ["entityId", "id", "creator", "title"]
+        for chunk_size in (1, 3, 500):
+            self.assertTrue(self.relational_processor.setInChunkSize(chunk_size))
+            result = self.relational_processor.getEntitiesWithIds(ids + ids[:2])
+            assert_frame_equal(sorted_rows(result, columns), sorted_rows(expected, columns), check_dtype=False)
+
+    def test_annotations_with_targets(self):
+        annotations = self.relational_processor.getAllAnnotations()
+        targets = annotations["target"].tolist()[:5]
+        self.assertTrue(self.relational_processor.setInChunkSize(2))
+        result = self.relational_processor.getAnnotationsWithTargets(targets)
+        expected = annotations[annotations["target"].isin(targets)]
+        self.assertEqual(sorted(result["annotationId"]), sorted(expected["annotationId"]))
+
+    def test_no_ids(self):
+        self.assertEqual(list(self.relational_processor.getEntitiesWithIds([]).columns), ["entityId", "id", "creator", "title"])
+        self.assertTrue(self.generic.annotationsWithTargets([]).empty)
+
+    def test_canvases_as_with_the_whole_table(self):
+        # the semi-join gives the entities of the merge with all the Entity rows
+        for collection_id in self.graph_processor.getAllCollections()["id"]:
+            graph_db = self.graph_processor.getCanvasesInCollection(collection_id)
+            joined = merge(graph_db, self.relational_processor.getEntities(), left_on="id", right_on="id")
+            result = self.generic.getCanvasesInCollection(collection_id)
+            self.assertEqual(sorted((canvas.getId(), canvas.getLabel(), canvas.getTitle() or "") for canvas in result),
+                             sorted(zip(joined["id"], joined["label"], joined["title"].fillna(""))))
+
+
+def describe(entities):
+    # comparable form of a list of model objects
+    rows = []
+    for entity in entities:
+        row = [entity.getId()]
+        if hasattr(entity, "getTitle"):
+            row += [entity.getLabel(), entity.getTitle(), tuple(entity.getCreators())]
+        if hasattr(entity, "getItems"):
+            row.append(tuple(item.getId() for item in entity.getItems()))
+        rows.append(tuple(str(value) for value in row))
+    return sorted(rows)
+
+
+# seconds taken by each side of a slow generic call
+DELAY = 0.3
+
+
+class SlowRelational(RelationalQueryProcessor):
+    def getEntities(self):
+        sleep(DELAY)
+        return super().getEntities()
+
+
+class SlowGraph(TriplestoreQueryProcessor):
+    def __init__(self, release:Event=None):
+        super().__init__()
+        # when given, getAllCanvases hangs until it is set
+        self.release = release
+
+    def getAllCanvases(self):
+        if self.release is not None:
+            self.release.wait()
+        else:
+            sleep(DELAY)
+        return super().getAllCanvases()
+
+
+class TestConcurrent(SampleDataTestCase):
+
+    def test_same_results(self):
+        collection_id = self.graph_processor.getAllCollections()["id"].iloc[0]
+        canvas_id = self.relational_processor.getAllAnnotations()["target"].iloc[0]
+        calls = [("getAllCanvas",), ("getAllManifests",), ("getImagesAnnotatingCanvas", canvas_id),
+                 ("getAnnotationsToCollection", collection_id), ("getEntitiesWithCreator", "Alighieri, Dante"),
+                 ("getManifestsInCollection", collection_id)]
+        sequential = [describe(getattr(self.generic, method)(*args)) for method, *args in calls]
+        self.assertTrue(self.generic.setConcurrent(True))
+        concurrent = [describe(getattr(self.generic, method)(*args)) for method, *args in calls]
+        self.assertEqual(concurrent, sequential)
+        self.assertTrue(all(sequential))
+
+    def generic_of(self, relational, graph):
+        relational.setDbPathOrUrl(self.relational)
+        graph.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.addQueryProcessor(relational)
+        generic.addQueryProcessor(graph)
+        return generic
+
+    def test_relational_and_graph_overlap(self):
+        generic = self.generic_of(SlowRelational(), SlowGraph())
+        generic.setConcurrent(True)
+        start = perf_counter()
+        canvases = generic.getAllCanvas()
+        elapsed = perf_counter() - start
+        generic.close()
+        self.assertLess(elapsed, 1.7 * DELAY)
+        self.assertEqual(describe(canvases), describe(self.generic.getAllCanvas()))
+
+    def test_timeout(self):
+        release = Event()
+        graph = SlowGraph(release)
+        generic = self.generic_of(RelationalQueryProcessor(), graph)
+        generic.setConcurrent(True)
+        generic.setTimeout(0.1)
+        # a single worker: the relational call waits behind the graph one
+        self.assertTrue(generic.setMaxWorkers(1))
+        try:
+            with redirect_stdout(StringIO()):
+                self.assertEqual(generic.getAllCanvas(), [])
+            # the hanging call keeps the old pool, the next calls get a new one
+            self.assertIsNone(generic.executor)
+            start = perf_counter()
+            images = generic.getImagesAnnotatingCanvas(self.relational_processor.getAllAnnotations()["target"].iloc[0])
+            self.assertLess(perf_counter() - start, 1.0)
+            self.assertGreater(len(images), 0)
+        finally:
+            release.set()
+            generic.close()
+            graph.close()
+
+
+class TestFailingProcessors(unittest.TestCase):
+    # no metadata uploaded, and a second relational processor without any table
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.relational = join(cls.directory.name, "relational.db")
+        cls.graph = join(cls.directory.name, "graph.db")
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(cls.relational)
+        assert annotations.uploadData(join("data", "annotations.csv")) and build_graph(cls.graph)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.processors = []
+        for path, kind in ((self.relational, RelationalQueryProcessor), (join(self.directory.name, "empty.db"), RelationalQueryProcessor),
+                           (self.graph, TriplestoreQueryProcessor)):
+            processor = kind()
+            processor.setDbPathOrUrl(path)
+            self.processors.append(processor)
+        self.generic = GenericQueryProcessor()
+        self.registry = MetricsRegistry()
+        self.generic.setMetrics(self.registry)
+        for processor in self.processors:
+            self.generic.addQueryProcessor(processor)
+        self.output = StringIO()
+
+    def tearDown(self):
+        for processor in self.processors:
+            processor.close()
+
+    def errors(self, method:str):
+        counter = self.registry.counter("processor_errors_total")
+        return sum(counter.get("GenericQueryProcessor", method, error) for error in ("OperationalError", "DatabaseError"))
+
+    def test_failing_processor_is_skipped(self):
+        with redirect_stdout(self.output):
+            images = self.generic.getAllImages()
+            annotations = self.generic.getAnnotationsWithTarget("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
+        expected = self.processors[0].getAllImages()["id"].drop_duplicates()
+        self.assertEqual(sorted(image.getId() for image in images), sorted(expected))
+        self.assertGreater(len(annotations), 0)
+        self.assertEqual(self.errors("getAllImages"), 1)
+        self.assertIn("no such table", self.output.getvalue())
+
+    def test_no_metadata(self):
+        # the entities come without titles nor creators
+        with redirect_stdout(self.output):
+            manifests = self.generic.getAllManifests()
+            entities = self.generic.getEntitiesWithCreator("Alighieri, Dante")
+            canvases = self.generic.getCanvasesInManifest(manifests[0].getId())
+        self.assertEqual(len(manifests), 3)
+        self.assertTrue(all(manifest.getTitle() is None and manifest.getCreators() == [] for manifest in manifests))
+        self.assertEqual(entities, [])
+        self.assertEqual(canvases, [])
+        self.assertGreater(self.errors("getAllManifests"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from json import dump
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from time import sleep
+from contextlib import redirect_stdout
+from io import StringIO
+from pandas import read_csv
+from ingest import bulk_ingest, parse_collection, write_graph, write_relational
+from utils.local_store import open_graph
+from utils.metrics import REGISTRY
+from utils.sparql_server import SparqlServer
+
+# seconds each fake parser takes before handing its result to the writer
+PARSE_SECONDS = 0.3
+
+
+def canvas(manifest:int, number:int):
+    canvas_id = f"https://example.org/iiif/{manifest}/canvas/p{number}"
+    return {
+        "id": canvas_id,
+        "type": "Canvas",
+        "label": {"none": [f"p. {number}"]},
+        # a IIIF canvas holds AnnotationPages, they are not part of the graph
+        "items": [{"id": canvas_id + "/page", "type": "AnnotationPage",
+                   "items": [{"id": canvas_id + "/page/1", "type": "Annotation", "motivation": "painting",
+                              "body": {"id": canvas_id + "/full.jpg", "type": "Image"}, "target": canvas_id}]}]
+    }
+
+
+def collection(number:int):
+    return {
+        "id": f"https://example.org/iiif/collection/{number}",
+        "type": "Collection",
+        "label": {"none": [f"Collection {number}"]},
+        "items": [{
+            "id": f"https://example.org/iiif/{number}/manifest",
+            "type": "Manifest",
+            "label": {"en": [f"Manifest {number}"]},
+            "items": [canvas(number, 1), canvas(number, 2)]
+        }]
+    }
+
+
+def slow(result):
+    sleep(PARSE_SECONDS)
+    return result, PARSE_SECONDS
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        for number in (1, 2):
+            with open(join(self.directory.name, f"collection-{number}.json"), mode='w', encoding="utf-8") as f:
+                dump(collection(number), f)
+        self.server = SparqlServer(join(self.directory.name, "graph.db"))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def test_parse_collection_with_annotation_pages(self):
+        lines, seconds = parse_collection(join(self.directory.name, "collection-1.json"))
+        # 3 triples for each entity, 1 for each items link
+        self.assertEqual(len(lines), 4 * 3 + 3)
+
+    def test_bulk_ingest(self):
+        database = join(self.directory.name, "relational.db")
+        report = bulk_ingest([self.directory.name, "data/annotations.csv", "data/metadata.csv"],
+                             database, self.server.url, workers=2, containment=True)
+        self.assertTrue(report["success"])
+        self.assertEqual(len(report["files"]), 4)
+        graph = open_graph(join(self.directory.name, "graph.db"))
+        try:
+            canvases = graph.query("SELECT ?c WHERE { ?c a <https://github.com/n1kg0r/ds-project-dhdk/classes/Canvas> }")
+            self.assertEqual(len(list(canvases)), 4)
+        finally:
+            graph.close()
+        with connect(database) as con:
+            self.assertGreater(con.execute("SELECT COUNT(*) FROM Annotation").fetchone()[0], 0)
+            self.assertGreater(con.execute("SELECT COUNT(*) FROM Entity").fetchone()[0], 0)
+
+    def test_writer_time_excludes_parsing(self):
+        report = {"files": [], "writers": dict(), "errors": []}
+        lines, seconds = parse_collection(join(self.directory.name, "collection-1.json"))
+        with ThreadPoolExecutor(1) as pool:
+            futures = {pool.submit(slow, lines): ("collection-1.json", "collection")}
+            self.assertTrue(write_graph(self.server.url, futures, 1000, report))
+        self.assertLess(report["writers"]["graph"], PARSE_SECONDS)
+
+        database = join(self.directory.name, "relational.db")
+        frame = read_csv("data/annotations.csv", keep_default_na=False, dtype="string")
+        with ThreadPoolExecutor(1) as pool:
+            annotations = [("annotations.csv", pool.submit(slow, frame))]
+            self.assertTrue(write_relational(database, annotations, [], report))
+        self.assertLess(report["writers"]["relational"], PARSE_SECONDS)
+
+    def test_writer_errors(self):
+        # the files that cannot be parsed are reported, printed and counted
+        with open(join(self.directory.name, "broken.json"), mode='w', encoding="utf-8") as f:
+            f.write('{"id": "https://example.org/iiif/broken", "type": "Collection", "items": [')
+        with open(join(self.directory.name, "broken.csv"), mode='w', encoding="utf-8") as f:
+            f.write('id,body,target,motivation\n"unterminated,a,b,c\n')
+        errors = REGISTRY.counter("processor_errors_total", labels=("processor", "method", "error"))
+        before = sum(errors.get("ingest", writer, error) for writer in ("write_graph", "write_relational")
+                     for error in ("JSONDecodeError", "ParserError"))
+        database = join(self.directory.name, "relational.db")
+        with redirect_stdout(StringIO()) as output:
+            report = bulk_ingest([join(self.directory.name, "broken.*")], database, self.server.url, workers=1)
+        self.assertFalse(report["success"])
+        files = {error["writer"]: error["file"] for error in report["errors"]}
+        self.assertEqual(files, {"graph": join(self.directory.name, "broken.json"),
+                                 "relational": join(self.directory.name, "broken.csv")})
+        self.assertTrue(output.getvalue())
+        after = sum(errors.get("ingest", writer, error) for writer in ("write_graph", "write_relational")
+                    for error in ("JSONDecodeError", "ParserError"))
+        self.assertEqual(after - before, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
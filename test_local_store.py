@@ -0,0 +1,81 @@
+import unittest
+from json import load
+from os.path import join
+from tempfile import TemporaryDirectory
+from rdflib import Graph, Literal, URIRef
+from utils.CreateGraph import create_Graph
+from utils.local_store import open_graph, query_frame, is_local
+from utils.sparql_upload import triple_lines
+
+BASE_URL = "https://github.com/n1kg0r/ds-project-dhdk/"
+QUERY = """
+PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/>
+PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/>
+PREFIX dc: <http://purl.org/dc/elements/1.1/>
+SELECT ?entity ?id ?label WHERE {
+    ?entity a nikCl:Canvas ; dc:identifier ?id ; nikAttr:label ?label .
+} ORDER BY ?id
+"""
+
+
+def reference_graph():
+    with open(join("data", "collection-1.json"), mode='r', encoding="utf-8") as f:
+        json_object = load(f)
+    graph = Graph()
+    create_Graph(json_object, BASE_URL, graph, "hash")
+    return graph
+
+
+class TestLocalStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = join(self.directory.name, "graph.db")
+        self.reference = reference_graph()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_is_local(self):
+        self.assertTrue(is_local("graph.db"))
+        self.assertFalse(is_local("http://127.0.0.1:9999/blazegraph/sparql"))
+
+    def test_add_lines_and_reopen(self):
+        graph = open_graph(self.path)
+        self.assertEqual(graph.store.add_lines(triple_lines(self.reference), 7), len(self.reference))
+        # the lines already stored are ignored
+        graph.store.add_lines(triple_lines(self.reference), 0)
+        graph.close()
+        graph = open_graph(self.path)
+        try:
+            self.assertEqual(len(graph), len(self.reference))
+            self.assertEqual(set(graph), set(self.reference))
+        finally:
+            graph.close()
+
+    def test_same_query_results(self):
+        graph = open_graph(self.path)
+        try:
+            for triple in self.reference:
+                graph.add(triple)
+            expected = query_frame(self.reference, QUERY)
+            self.assertGreater(len(expected), 0)
+            self.assertTrue(query_frame(graph, QUERY).equals(expected))
+        finally:
+            graph.close()
+
+    def test_update_and_remove(self):
+        graph = open_graph(self.path)
+        try:
+            graph.update('INSERT DATA { <https://example.org/a> <https://example.org/p> "a \\"quoted\\" value"@en . }')
+            graph.commit()
+            subject = URIRef("https://example.org/a")
+            self.assertEqual(list(graph.objects(subject, None)), [Literal('a "quoted" value', lang="en")])
+            graph.update("DELETE WHERE { <https://example.org/a> ?p ?o }")
+            self.assertEqual(len(graph), 0)
+        finally:
+            graph.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from pandas import DataFrame
+from impl import MetadataProcessor
+
+
+class TestMetadataProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.database = join(self.directory.name, "relational.db")
+        self.metadata = DataFrame({
+            "id": ["https://example.org/collection", "https://example.org/manifest", "https://example.org/canvas"],
+            "title": ["A collection", "A manifest", ""],
+            "creator": ["Doe, John; Doe, Jane", "Doe, John", ""]
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_creators_are_split(self):
+        processor = MetadataProcessor()
+        processor.setDbPathOrUrl(self.database)
+        self.assertTrue(processor.uploadFrames([self.metadata]))
+        with connect(self.database) as con:
+            creators = con.execute(
+                "SELECT Entity.id, Creators.creator FROM Entity JOIN Creators ON Entity.entityId = Creators.entityId "
+                "ORDER BY Entity.id, Creators.creator").fetchall()
+        self.assertEqual(creators, [
+            ("https://example.org/canvas", ""),
+            ("https://example.org/collection", "Doe, Jane"),
+            ("https://example.org/collection", "Doe, John"),
+            ("https://example.org/manifest", "Doe, John")
+        ])
+        self.assertEqual(processor.getUploadStats()["entities"], 3)
+        self.assertEqual(processor.getUploadStats()["creators"], 4)
+
+    def test_frames_are_not_modified(self):
+        processor = MetadataProcessor()
+        processor.setDbPathOrUrl(self.database)
+        copy = self.metadata.copy()
+        self.assertTrue(processor.uploadFrames([self.metadata]))
+        self.assertTrue(self.metadata.equals(copy))
+
+    def test_upload_csv(self):
+        path = join(self.directory.name, "metadata.csv")
+        self.metadata.to_csv(path, index=False)
+        processor = MetadataProcessor()
+        processor.setDbPathOrUrl(self.database)
+        self.assertTrue(processor.uploadData(path))
+        with connect(self.database) as con:
+            self.assertEqual(con.execute("SELECT COUNT(*) FROM Entity").fetchone()[0], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
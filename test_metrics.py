@@ -0,0 +1,153 @@
+import unittest
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from impl import GenericQueryProcessor, RelationalQueryProcessor, TriplestoreQueryProcessor
+from utils.metrics import MetricsRegistry, MetricsExporter, REGISTRY
+from utils.result_cache import ResultCache
+from utils.sparql_client import close_clients
+from utils.sparql_server import SparqlServer
+from sample_data import SampleDataTestCase
+from contextlib import redirect_stdout
+from io import StringIO
+
+
+class TestRendering(unittest.TestCase):
+
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("calls_total", "Calls", ("method",))
+        counter.inc("get")
+        counter.inc("get", amount=2)
+        counter.inc('say "hi"\n')
+        self.assertIs(registry.counter("calls_total"), counter)
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP calls_total Calls",
+            "# TYPE calls_total counter",
+            'calls_total{method="get"} 3',
+            'calls_total{method="say \\"hi\\"\\n"} 1',
+        ]) + "\n")
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe("get", value=value)
+        self.assertEqual(histogram.get("get"), (4, 3.05))
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP latency_seconds Latency",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{method="get",le="0.1"} 1',
+            'latency_seconds_bucket{method="get",le="1"} 3',
+            'latency_seconds_bucket{method="get",le="+Inf"} 4',
+            'latency_seconds_sum{method="get"} 3.05',
+            'latency_seconds_count{method="get"} 4',
+        ])
+        # the buckets of the dump are not cumulative
+        [value] = registry.dump()["latency_seconds"]["values"]
+        self.assertEqual(value["buckets"], {"0.1": 1, "1": 2, "+Inf": 1})
+
+    def test_gauge_and_reset(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge("open_connections")
+        gauge.set(value=3)
+        gauge.set(value=1)
+        self.assertEqual(registry.dump()["open_connections"], {"type": "gauge", "help": "", "values": [{"labels": {}, "value": 1}]})
+        self.assertTrue(registry.reset())
+        self.assertEqual(registry.render(), "# HELP open_connections \n# TYPE open_connections gauge\n")
+
+
+class TestProcessorMetrics(SampleDataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = MetricsRegistry()
+        for processor in (self.relational_processor, self.graph_processor, self.generic):
+            processor.setMetrics(self.registry)
+
+    def test_default_registry(self):
+        self.assertIs(RelationalQueryProcessor().getMetrics(), REGISTRY)
+
+    def test_calls_and_rows(self):
+        annotations = self.relational_processor.getAllAnnotations()
+        self.relational_processor.getAllAnnotations()
+        labels = ("RelationalQueryProcessor", "getAllAnnotations")
+        self.assertEqual(self.registry.counter("processor_requests_total").get(*labels), 2)
+        self.assertEqual(self.registry.histogram("processor_latency_seconds").get(*labels)[0], 2)
+        self.assertEqual(self.registry.counter("sqlite_rows_read_total").get(*labels), 2 * len(annotations))
+        self.assertEqual(self.registry.counter("processor_errors_total").get(*labels, "DatabaseError"), 0)
+
+    def test_no_errors_on_healthy_calls(self):
+        # every processor is asked only the methods of its kind
+        collection_id = self.graph_processor.getAllCollections()["id"].iloc[0]
+        with redirect_stdout(StringIO()) as output:
+            self.assertTrue(self.generic.getAllAnnotations())
+            self.assertTrue(self.generic.getAllCollections())
+            self.assertTrue(self.generic.getAllCanvas())
+            self.assertTrue(self.generic.getManifestsInCollection(collection_id))
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(self.registry.dump().get("processor_errors_total", {"values": []})["values"], [])
+        self.assertNotIn("processor_errors_total{", self.registry.render())
+
+    def test_errors(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, "empty.db")
+            connect(path).close()
+            relational = RelationalQueryProcessor()
+            relational.setDbPathOrUrl(path)
+            relational.setMetrics(self.registry)
+            generic = GenericQueryProcessor()
+            generic.addQueryProcessor(relational)
+            generic.setMetrics(self.registry)
+            # raised by the relational processor, caught and reported by the
+            # generic one: counted for both
+            with redirect_stdout(StringIO()) as output:
+                self.assertEqual(len(generic.getAllImages()), 0)
+            relational.close()
+        self.assertIn("no such table: Image", output.getvalue())
+        errors = self.registry.counter("processor_errors_total")
+        self.assertEqual(errors.get("RelationalQueryProcessor", "getAllImages", "DatabaseError"), 1)
+        self.assertEqual(errors.get("GenericQueryProcessor", "getAllImages", "DatabaseError"), 1)
+        self.assertIn('processor_errors_total{processor="GenericQueryProcessor",method="getAllImages",error="DatabaseError"} 1',
+                      self.registry.render())
+
+    def test_cache_lookups(self):
+        self.generic.setResultCache(ResultCache())
+        for call in range(3):
+            self.generic.getAllImages()
+        lookups = self.registry.counter("processor_cache_lookups_total")
+        self.assertEqual(lookups.get("GenericQueryProcessor", "getAllImages", "miss"), 1)
+        self.assertEqual(lookups.get("GenericQueryProcessor", "getAllImages", "hit"), 2)
+
+    def test_sparql_bytes(self):
+        with SparqlServer(self.graph) as server:
+            processor = TriplestoreQueryProcessor()
+            processor.setDbPathOrUrl(server.url)
+            processor.setMetrics(self.registry)
+            self.assertFalse(processor.getAllManifests().empty)
+            close_clients()
+        labels = ("TriplestoreQueryProcessor", "getAllManifests")
+        self.assertEqual(self.registry.counter("sparql_requests_total").get(*labels), server.getStats()["queries"])
+        self.assertGreater(self.registry.counter("sparql_bytes_received_total").get(*labels), 0)
+        self.assertGreater(self.registry.counter("sparql_bytes_sent_total").get(*labels), 0)
+
+
+class TestMetricsExporter(unittest.TestCase):
+
+    def test_metrics_endpoint(self):
+        registry = MetricsRegistry()
+        registry.counter("calls_total", "Calls").inc()
+        with MetricsExporter(registry) as exporter:
+            with urlopen(exporter.url) as response:
+                self.assertEqual(response.headers["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+                self.assertEqual(response.read().decode("utf-8"), registry.render())
+            with self.assertRaises(HTTPError) as raised:
+                urlopen(exporter.url.replace("/metrics", "/other"))
+            self.assertEqual(raised.exception.code, 404)
+            raised.exception.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
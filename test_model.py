@@ -0,0 +1,60 @@
+import unittest
+from pandas import DataFrame
+from impl import Annotation, Canvas, Collection, EntityWithMetadata, IdentifiableEntity, Image, Manifest
+from sample_data import SampleDataTestCase
+
+
+class TestModel(unittest.TestCase):
+
+    def test_slots(self):
+        canvas = Canvas("c", "label", "title", ["a"])
+        entities = [IdentifiableEntity("e"), Image("i"), Annotation("a", "painting", IdentifiableEntity("c"), Image("i")),
+                    canvas, Manifest("m", "label", "title", [], [canvas]), Collection("k", "label", "title", [], [])]
+        for entity in entities:
+            self.assertFalse(hasattr(entity, "__dict__"), type(entity).__name__)
+            with self.assertRaises(AttributeError):
+                entity.other = 1
+
+    def test_getters(self):
+        self.assertEqual(Canvas("c", "label", "", "Doe, John").getCreators(), ["Doe, John"])
+        self.assertEqual(Canvas("c", "label", "", None).getCreators(), [])
+        self.assertIsNone(Canvas("c", "label", "", []).getTitle())
+        manifest = Manifest("m", "label", "title", ["a", "b"], [Canvas("c", "", "", [])])
+        self.assertEqual([item.getId() for item in manifest.getItems()], ["c"])
+        self.assertEqual(manifest.getTitle(), "title")
+
+
+class TestBuildEntities(SampleDataTestCase):
+
+    def test_same_as_rows(self):
+        # the objects built from the columns are those of a row by row loop
+        joined = DataFrame({"id": ["a", "b"], "label": ["A", "B"], "title": ["T", ""], "creator": ["Doe, John", ""]})
+        built = self.generic.buildEntities(Canvas, joined)
+        rows = [Canvas(row["id"], row["label"], row["title"], row["creator"]) for index, row in joined.iterrows()]
+        self.assertEqual([(c.getId(), c.getLabel(), c.getTitle(), c.getCreators()) for c in built],
+                         [(c.getId(), c.getLabel(), c.getTitle(), c.getCreators()) for c in rows])
+        # the missing cells of a left join become None, not NaN
+        built = self.generic.buildEntities(Canvas, DataFrame({"id": ["a"], "label": [None], "title": [None], "creator": [None]}))
+        self.assertEqual((built[0].getLabel(), built[0].getTitle(), built[0].getCreators()), (None, None, []))
+
+    def test_creators_as_lists(self):
+        # the creators of an entity are a list, without leading spaces
+        result = self.generic.getEntitiesWithTitle("Dante Alighieri: Opere")
+        self.assertEqual([(entity.getId(), entity.getCreators()) for entity in result],
+                         [("https://dl.ficlit.unibo.it/iiif/28429/collection", ["Doe, John", "Doe, Jane"])])
+        self.assertIsInstance(result[0], EntityWithMetadata)
+        result = self.generic.getEntitiesWithLabel("Il Canzoniere")
+        self.assertEqual([(entity.getTitle(), entity.getCreators()) for entity in result], [("Il Canzoniere", ["Alighieri, Dante"])])
+
+    def test_no_match(self):
+        self.assertEqual(self.generic.getEntitiesWithLabel("no such label"), [])
+        self.assertEqual(self.generic.getEntitiesWithTitle("no such title"), [])
+
+    def test_all_canvas_titles(self):
+        canvases = self.generic.getAllCanvas()
+        self.assertEqual(len(canvases), len(self.graph_processor.getAllCanvases()))
+        self.assertTrue(all(isinstance(canvas.getCreators(), list) for canvas in canvases))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from pandas import DataFrame
+from impl import AnnotationProcessor, MetadataProcessor, RelationalQueryProcessor
+
+# values that broke the queries when they were built by string formatting
+TITLE = "Dante's \"Commedia\"; DROP TABLE Entity; --"
+CREATOR = "O'Brien, Flann"
+TARGET = "https://example.org/canvas/1?page='1'"
+
+
+class TestRelationalQueryProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        database = join(self.directory.name, "relational.db")
+        metadata = MetadataProcessor()
+        metadata.setDbPathOrUrl(database)
+        self.assertTrue(metadata.uploadFrames([DataFrame({
+            "id": ["https://example.org/manifest/1", "https://example.org/manifest/2"],
+            "title": [TITLE, "Plain"],
+            "creator": [CREATOR + "; Doe, John", "Doe, John"]
+        })]))
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(database)
+        self.assertTrue(annotations.uploadFrames([DataFrame({
+            "id": ["https://example.org/annotation/1", "https://example.org/annotation/2"],
+            "body": ["https://example.org/image/1.jpg", "https://example.org/image/2.jpg"],
+            "target": [TARGET, "https://example.org/canvas/2"],
+            "motivation": ["painting", "painting"]
+        })]))
+        self.processor = RelationalQueryProcessor()
+        self.processor.setDbPathOrUrl(database)
+
+    def tearDown(self):
+        self.processor.close()
+        self.directory.cleanup()
+
+    def test_title_with_quotes(self):
+        result = self.processor.getEntitiesWithTitle(TITLE)
+        self.assertEqual(set(result["id"]), {"https://example.org/manifest/1"})
+        # the table is still there
+        self.assertEqual(len(self.processor.getEntities()), 3)
+
+    def test_creator_with_quote(self):
+        result = self.processor.getEntitiesWithCreator(CREATOR)
+        self.assertEqual(list(result["id"]), ["https://example.org/manifest/1"])
+        self.assertEqual(len(self.processor.getEntitiesWithCreator("Doe, John")), 2)
+
+    def test_target_with_quotes(self):
+        result = self.processor.getAnnotationsWithTarget(TARGET)
+        self.assertEqual(list(result["id"]), ["https://example.org/annotation/1"])
+        result = self.processor.getAnnotationsWithBodyAndTarget("https://example.org/image/1.jpg", TARGET)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(self.processor.getAnnotationsWithBody("https://example.org/image/2.jpg")), 1)
+
+    def test_no_match(self):
+        result = self.processor.getEntitiesWithTitle("' OR '1'='1")
+        self.assertEqual(len(result), 0)
+        self.assertIn("title", result.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
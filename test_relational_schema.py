@@ -0,0 +1,58 @@
+import unittest
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from impl import AnnotationProcessor, MetadataProcessor
+from utils.schema import INDEXES
+
+
+class TestRelationalSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.database = join(self.directory.name, "relational.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def upload(self, bulk_load:bool=False):
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(self.database)
+        annotations.setBulkLoad(bulk_load)
+        self.assertTrue(annotations.uploadData("data/annotations.csv"))
+        metadata = MetadataProcessor()
+        metadata.setDbPathOrUrl(self.database)
+        metadata.setBulkLoad(bulk_load)
+        self.assertTrue(metadata.uploadData("data/metadata.csv"))
+
+    def test_primary_keys(self):
+        self.upload()
+        with connect(self.database) as con:
+            for table, key in (("Annotation", "annotationId"), ("Image", "imageId"), ("Entity", "entityId")):
+                columns = con.execute(f"PRAGMA table_info({table})").fetchall()
+                self.assertEqual([column[1] for column in columns if column[5]], [key])
+
+    def test_indexes(self):
+        # all the secondary indexes exist after an upload, also the second one
+        self.upload()
+        self.upload()
+        with connect(self.database) as con:
+            indexes = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+        expected = {statement.split()[2] for statements in INDEXES.values() for statement in statements}
+        self.assertEqual(indexes, expected)
+
+    def test_lookup_uses_index(self):
+        self.upload()
+        with connect(self.database) as con:
+            plan = con.execute("EXPLAIN QUERY PLAN SELECT * FROM Annotation WHERE target = ?", ("x",)).fetchall()
+        self.assertIn("Annotation_target", " ".join(row[-1] for row in plan))
+
+    def test_bulk_load(self):
+        self.upload(bulk_load=True)
+        with connect(self.database) as con:
+            self.assertEqual(con.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertGreater(con.execute("SELECT COUNT(*) FROM Creators").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from numpy import shares_memory
+from impl import Annotation, Canvas
+from utils.result_batch import ResultBatch
+from utils.result_cache import ResultCache
+from sample_data import SampleDataTestCase
+
+GETTERS = ("getId", "getLabel", "getTitle", "getCreators", "getMotivation")
+
+
+def describe(entity, model):
+    # the values of the getters of model (a RowView has all of them)
+    row = [getattr(entity, getter)() for getter in GETTERS if hasattr(model, getter)]
+    if hasattr(model, "getTarget"):
+        row += [entity.getTarget().getId(), entity.getBody().getId()]
+    if hasattr(model, "getItems"):
+        row.append([item.getId() for item in entity.getItems()])
+    return row
+
+
+class TestResultBatch(SampleDataTestCase):
+
+    def test_same_data_as_objects(self):
+        collection_id = self.graph_processor.getAllCollections()["id"].iloc[0]
+        calls = [("getAllAnnotations",), ("getAllCanvas",), ("getAllImages",), ("getAllManifests",),
+                 ("getManifestsInCollection", collection_id), ("getEntitiesWithTitle", "Il Canzoniere")]
+        for method, *args in calls:
+            self.generic.setResultFormat("objects")
+            objects = getattr(self.generic, method)(*args)
+            self.generic.setResultFormat("batch")
+            batch = getattr(self.generic, method)(*args)
+            self.assertIsInstance(batch, ResultBatch, method)
+            expected = [describe(entity, batch.model) for entity in objects]
+            self.assertEqual([describe(row, batch.model) for row in batch], expected, method)
+            self.assertEqual([describe(entity, batch.model) for entity in batch.toObjects()], expected, method)
+
+    def test_views(self):
+        self.generic.setResultFormat("batch")
+        batch = self.generic.getAllAnnotations()
+        self.assertEqual(batch[0].getTarget().getId(), batch.column("target")[0])
+        self.assertIsInstance(batch[-1].materialize(), Annotation)
+        self.assertEqual(batch[-1].getId(), batch[len(batch) - 1].getId())
+        with self.assertRaises(IndexError):
+            batch[len(batch)]
+        # slices and toPandas use the same arrays
+        part = batch[1:3]
+        self.assertEqual(len(part), 2)
+        self.assertEqual(part[0].getId(), batch[1].getId())
+        self.assertTrue(shares_memory(part.column("id"), batch.column("id")))
+        frame = batch.toPandas()
+        self.assertEqual(list(frame.columns), batch.getColumnNames())
+        self.assertEqual(len(frame), len(batch))
+
+    def test_empty(self):
+        self.generic.setResultFormat("batch")
+        batch = self.generic.getEntitiesWithTitle("no such title")
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.toObjects(), [])
+        self.assertFalse(self.generic.setResultFormat("arrow"))
+
+    def test_cached_apart(self):
+        self.generic.setResultCache(ResultCache())
+        objects = self.generic.getAllCanvas()
+        self.generic.setResultFormat("batch")
+        batch = self.generic.getAllCanvas()
+        self.assertIsInstance(objects, list)
+        self.assertIsInstance(objects[0], Canvas)
+        self.assertIsInstance(batch, ResultBatch)
+        self.assertEqual(self.generic.getCacheStats()["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
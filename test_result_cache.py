@@ -0,0 +1,103 @@
+import unittest
+from os.path import join
+from time import sleep
+from impl import AnnotationProcessor
+from utils.result_cache import ResultCache, bump_generation
+from sample_data import SampleDataTestCase
+
+TARGET = "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"
+
+
+class TestResultCache(SampleDataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = ResultCache()
+        self.generic.setResultCache(self.cache)
+
+    def test_setters(self):
+        # the same ones on the three query processors
+        for processor in (self.relational_processor, self.graph_processor, self.generic):
+            self.assertFalse(processor.setResultCache("cache"))
+            self.assertTrue(processor.setResultCache(self.cache))
+            self.assertIs(processor.getResultCache(), self.cache)
+            self.assertEqual(processor.getCacheStats()["entries"], 0)
+            self.assertTrue(processor.setResultCache(None))
+            self.assertEqual(processor.getCacheStats(), dict())
+            self.assertFalse(processor.setMetrics("registry"))
+
+    def test_keyword_arguments(self):
+        # with and without a cache
+        expected = self.relational_processor.getAnnotationsWithTarget(TARGET)
+        self.assertTrue(self.relational_processor.getAnnotationsWithTarget(targetId=TARGET).equals(expected))
+        self.relational_processor.setResultCache(self.cache)
+        self.assertTrue(self.relational_processor.getAnnotationsWithTarget(targetId=TARGET).equals(expected))
+        self.assertTrue(self.relational_processor.getAnnotationsWithTarget(targetId=TARGET).equals(expected))
+        self.assertEqual(self.cache.getStats()["hits"], 1)
+        self.assertEqual(len(self.relational_processor.getAnnotationsWithTarget(targetId="no such target")), 0)
+
+    def test_frames_are_copies(self):
+        self.relational_processor.setResultCache(self.cache)
+        first = self.relational_processor.getAllAnnotations()
+        first.loc[0, "id"] = "changed"
+        first.drop(columns=["body"], inplace=True)
+        second = self.relational_processor.getAllAnnotations()
+        self.assertNotEqual(second.loc[0, "id"], "changed")
+        self.assertIn("body", second.columns)
+
+    def test_objects_are_copies(self):
+        first = self.generic.getAllManifests()
+        expected = [(manifest.getId(), manifest.getTitle(), list(manifest.getCreators()), len(manifest.getItems())) for manifest in first]
+        # everything a caller could change in its result
+        first[0].getItems().clear()
+        first[0].getCreators().append("someone")
+        first[0].title = "changed"
+        first.pop()
+        second = self.generic.getAllManifests()
+        self.assertEqual(self.cache.getStats()["hits"], 1)
+        self.assertEqual([(manifest.getId(), manifest.getTitle(), list(manifest.getCreators()), len(manifest.getItems())) for manifest in second], expected)
+
+    def test_batches_are_copies(self):
+        self.generic.setResultFormat("batch")
+        first = self.generic.getAllCanvas()
+        first.column("creators")[0].append("someone")
+        second = self.generic.getAllCanvas()
+        self.assertNotIn("someone", second[0].getCreators())
+
+    def test_upload_invalidates(self):
+        self.relational_processor.setResultCache(self.cache)
+        before = len(self.relational_processor.getAllAnnotations())
+        annotations = AnnotationProcessor()
+        annotations.setDbPathOrUrl(self.relational)
+        self.assertTrue(annotations.uploadData(join("data", "annotations.csv")))
+        self.assertEqual(len(self.relational_processor.getAllAnnotations()), before)
+        stats = self.cache.getStats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 2))
+        self.assertGreaterEqual(stats["invalidations"], 1)
+
+    def test_generic_invalidated_by_any_target(self):
+        self.generic.getAllCanvas()
+        bump_generation(self.graph)
+        self.generic.getAllCanvas()
+        self.assertEqual(self.cache.getStats()["hits"], 0)
+
+    def test_ttl_and_size(self):
+        cache = ResultCache(ttl=0.05)
+        self.relational_processor.setResultCache(cache)
+        self.relational_processor.getAllImages()
+        sleep(0.1)
+        self.relational_processor.getAllImages()
+        self.assertEqual(cache.getStats()["expirations"], 1)
+
+        # room for the images only: the next result evicts them
+        cache = ResultCache(max_bytes=cache.getStats()["bytes"])
+        self.relational_processor.setResultCache(cache)
+        self.relational_processor.getAllImages()
+        self.relational_processor.getAnnotationsWithTarget(TARGET)
+        stats = cache.getStats()
+        self.assertLessEqual(stats["bytes"], stats["maxBytes"])
+        self.assertEqual((stats["evictions"], stats["entries"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
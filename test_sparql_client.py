@@ -0,0 +1,86 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from pandas.testing import assert_frame_equal
+from impl import TriplestoreQueryProcessor
+from utils.sparql_client import SparqlClient, SparqlError, get_client, close_clients
+from utils.sparql_server import SparqlServer
+from sample_data import build_graph
+
+QUERY = """
+PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/>
+PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/>
+PREFIX dc: <http://purl.org/dc/elements/1.1/>
+SELECT ?manifest ?id ?label WHERE {
+    ?manifest a nikCl:Manifest ; dc:identifier ?id ; nikAttr:label ?label .
+} ORDER BY ?id
+"""
+
+
+class TestSparqlClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.path = join(cls.directory.name, "graph.db")
+        assert build_graph(cls.path)
+        cls.server = SparqlServer(cls.path)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        close_clients()
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.client = SparqlClient(self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_keep_alive(self):
+        for request in range(5):
+            self.assertEqual(len(self.client.select(QUERY)), 3)
+        self.assertEqual(self.client.opened, 1)
+
+    def test_json_and_tsv(self):
+        # the same frame from both formats, including quotes in the labels
+        json = self.client.select(QUERY)
+        tsv = self.client.select(QUERY, "tsv")
+        assert_frame_equal(tsv, json)
+        self.assertTrue(any('"' in label for label in json["label"]))
+
+    def test_error_status(self):
+        with self.assertRaises(SparqlError) as raised:
+            self.client.select("SELECT WHERE {")
+        self.assertEqual(raised.exception.status, 400)
+        # the connection is still usable
+        self.assertEqual(len(self.client.select(QUERY)), 3)
+
+    def test_update(self):
+        self.client.update('INSERT DATA { <https://example.org/s> <https://example.org/p> "o" . }')
+        result = self.client.select("SELECT ?o WHERE { <https://example.org/s> <https://example.org/p> ?o }")
+        self.assertEqual(result["o"].tolist(), ["o"])
+        self.client.update("DELETE WHERE { <https://example.org/s> ?p ?o }")
+
+    def test_shared_client(self):
+        self.assertIs(get_client(self.server.url), get_client(self.server.url, 8))
+        self.assertEqual(get_client(self.server.url).pool_size, 8)
+
+    def test_processor_over_http(self):
+        # the endpoint and the local store give the same frames
+        local = TriplestoreQueryProcessor()
+        local.setDbPathOrUrl(self.path)
+        remote = TriplestoreQueryProcessor()
+        remote.setDbPathOrUrl(self.server.url)
+        try:
+            for response_format in ("json", "tsv"):
+                self.assertTrue(remote.setResponseFormat(response_format))
+                assert_frame_equal(remote.getAllManifests(), local.getAllManifests())
+        finally:
+            local.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
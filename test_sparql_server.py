@@ -0,0 +1,83 @@
+import unittest
+from http.client import HTTPConnection
+from resource import getrlimit, setrlimit, RLIMIT_NOFILE
+from time import sleep
+from urllib.parse import quote, urlparse
+import pytest
+import sparql_dataframe
+from rdflib import Literal, URIRef
+from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+
+PREFIXES = """
+PREFIX nikCl: <https://github.com/n1kg0r/ds-project-dhdk/classes/>
+PREFIX nikAttr: <https://github.com/n1kg0r/ds-project-dhdk/attributes/>
+PREFIX dc: <http://purl.org/dc/elements/1.1/>
+"""
+MANIFESTS = PREFIXES + """
+SELECT ?manifest ?id ?label WHERE {
+    ?manifest a nikCl:Manifest ; dc:identifier ?id ; nikAttr:label ?label .
+} ORDER BY ?id
+"""
+LABEL = URIRef("https://github.com/n1kg0r/ds-project-dhdk/attributes/label")
+NOTE = URIRef("https://example.org/note")
+
+
+# the clients the notebooks and basic-test.py use, against the local endpoint
+@pytest.mark.usefixtures("sparql_server")
+class TestSparqlServer(unittest.TestCase):
+
+    def test_select_with_sparql_dataframe(self):
+        df = sparql_dataframe.get(self.server.url, MANIFESTS, True)
+        self.assertEqual(list(df.columns), ["manifest", "id", "label"])
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df["id"].tolist(), sorted(df["id"].tolist()))
+        # by GET too
+        self.assertEqual(sparql_dataframe.get(self.server.url, MANIFESTS)["id"].tolist(), df["id"].tolist())
+
+    def test_update_with_sparql_update_store(self):
+        # as the CollectionProcessor of code_blocks uploads its triples
+        store = SPARQLUpdateStore()
+        store.open((self.server.url, self.server.url))
+        query = PREFIXES + "SELECT ?label WHERE { <https://example.org/note> nikAttr:label ?label } ORDER BY ?label"
+        try:
+            updates = self.server.getStats()["updates"]
+            store.add((NOTE, LABEL, Literal("a note")))
+            store.update(PREFIXES + 'INSERT DATA { <https://example.org/note> nikAttr:label "another note" }')
+            self.assertEqual(self.server.getStats()["updates"], updates + 2)
+            self.assertEqual(sparql_dataframe.get(self.server.url, query, True)["label"].tolist(), ["a note", "another note"])
+
+            store.remove((NOTE, LABEL, None), None)
+            self.assertTrue(sparql_dataframe.get(self.server.url, query, True).empty)
+            # the sample data is still there
+            self.assertEqual(len(sparql_dataframe.get(self.server.url, MANIFESTS, True)), 3)
+        finally:
+            store.close()
+
+    def test_connections_are_released(self):
+        # one client connection for each request: the sqlite connection of
+        # the thread serving it is closed with it, so the server keeps working
+        # past the limit of open files
+        url = urlparse(self.server.url)
+        path = url.path + "?query=" + quote("ASK { ?s ?p ?o }")
+        soft, hard = getrlimit(RLIMIT_NOFILE)
+        setrlimit(RLIMIT_NOFILE, (min(1024, soft), hard))
+        try:
+            for request in range(1100):
+                connection = HTTPConnection(url.hostname, url.port)
+                connection.request("GET", path, headers={"Connection": "close"})
+                response = connection.getresponse()
+                self.assertEqual(response.status, 200, request)
+                response.read()
+                connection.close()
+        finally:
+            setrlimit(RLIMIT_NOFILE, (soft, hard))
+        # the last threads may still be finishing
+        for attempt in range(100):
+            if len(self.server.graph.store.pool.connections) <= 1:
+                break
+            sleep(0.01)
+        self.assertLessEqual(len(self.server.graph.store.pool.connections), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from rdflib import URIRef, Literal
+from utils.sparql_client import SparqlError
+from utils.sparql_upload import upload_lines, triple_lines
+
+
+class RecordingStore(object):
+    # stands for an endpoint that accepts at most max_triples per request
+    def __init__(self, max_triples:int=None, error:Exception=None):
+        self.max_triples = max_triples
+        self.error = error
+        self.requests = []
+
+    def update(self, update:str):
+        lines = update.split("\n")[1:-1]
+        if self.error is not None:
+            raise self.error
+        if self.max_triples is not None and len(lines) > self.max_triples:
+            raise SparqlError("413 Payload Too Large", 413)
+        self.requests.append(lines)
+
+
+def lines(count:int):
+    return [f"<https://example.org/{n}> <https://example.org/p> \"{n}\" ." for n in range(count)]
+
+
+class TestSparqlUpload(unittest.TestCase):
+
+    def test_triple_lines(self):
+        triple = (URIRef("https://example.org/s"), URIRef("https://example.org/p"), Literal("a \"b\""))
+        self.assertEqual(list(triple_lines([triple])),
+                         ['<https://example.org/s> <https://example.org/p> "a \\"b\\"" .'])
+
+    def test_batches(self):
+        store = RecordingStore()
+        self.assertEqual(upload_lines(store, lines(25), 10), (25, 10))
+        self.assertEqual([len(request) for request in store.requests], [10, 10, 5])
+
+    def test_single_request(self):
+        store = RecordingStore()
+        self.assertEqual(upload_lines(store, lines(25), 0)[0], 25)
+        self.assertEqual(len(store.requests), 1)
+
+    def test_payload_too_large(self):
+        # every triple is sent once, in batches the endpoint accepts
+        store = RecordingStore(max_triples=30)
+        sent, batch_size = upload_lines(store, lines(1000), 100)
+        self.assertEqual(sent, 1000)
+        self.assertEqual(sorted(line for request in store.requests for line in request), sorted(lines(1000)))
+        self.assertTrue(all(len(request) <= 30 for request in store.requests))
+        # the batch size grows back close to the limit
+        self.assertGreaterEqual(batch_size, 25)
+
+    def test_other_errors_are_raised(self):
+        for error in (ConnectionResetError(), SparqlError("500 Internal Server Error", 500)):
+            store = RecordingStore(error=error)
+            with self.assertRaises(type(error)):
+                upload_lines(store, lines(100), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
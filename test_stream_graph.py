@@ -0,0 +1,64 @@
+import unittest
+from io import StringIO
+from json import dumps
+from rdflib import Graph
+from utils.CreateGraph import create_Graph
+from utils.stream_graph import stream_triples
+
+BASE_URL = "https://github.com/n1kg0r/ds-project-dhdk/"
+
+
+def annotation_page(canvas_id:str):
+    # what a IIIF canvas holds in its items: no label, one more level down
+    return {
+        "id": canvas_id + "/page",
+        "type": "AnnotationPage",
+        "items": [{"id": canvas_id + "/page/1", "type": "Annotation", "motivation": "painting",
+                   "body": {"id": canvas_id + "/full.jpg", "type": "Image"}, "target": canvas_id}]
+    }
+
+
+def canvas(number:int, items_first:bool=False):
+    canvas_id = f"https://example.org/iiif/canvas/p{number}"
+    fields = [("id", canvas_id), ("type", "Canvas"), ("label", {"none": [f"p. {number}"]})]
+    page = ("items", [annotation_page(canvas_id)])
+    return dict([page] + fields if items_first else fields + [page])
+
+
+def collection():
+    return {
+        "id": "https://example.org/iiif/collection",
+        "type": "Collection",
+        "label": {"none": ["A collection"]},
+        "items": [{
+            "id": f"https://example.org/iiif/manifest/{m}",
+            "type": "Manifest",
+            "label": {"en": [f"Manifest {m}"]},
+            "items": [canvas(1), canvas(2, items_first=True)]
+        } for m in (1, 2)]
+    }
+
+
+class TestStreamGraph(unittest.TestCase):
+
+    def assertSameTriples(self, json_object, containment:bool=False):
+        graph = Graph()
+        create_Graph(json_object, BASE_URL, graph, "hash", containment)
+        streamed = set(stream_triples(StringIO(dumps(json_object)), BASE_URL, "hash", containment))
+        self.assertEqual(streamed, set(graph))
+
+    def test_canvas_with_annotation_page(self):
+        self.assertSameTriples(collection())
+
+    def test_canvas_with_annotation_page_containment(self):
+        self.assertSameTriples(collection(), containment=True)
+
+    def test_items_before_label(self):
+        # the collection items come first, so the whole object is buffered
+        json_object = collection()
+        json_object = {"items": json_object.pop("items"), **json_object}
+        self.assertSameTriples(json_object)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+from json import loads
+from os.path import join
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+from impl import RelationalQueryProcessor
+from utils.result_cache import ResultCache
+from utils.tracing import Tracer, MemorySink, JsonLinesSink, get_default_tracer
+from sample_data import SampleDataTestCase
+from contextlib import redirect_stdout
+from io import StringIO
+
+
+def children(spans:list, parent):
+    return [span for span in spans if span.parentId == parent.id]
+
+
+class TestTracing(SampleDataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sink = MemorySink()
+        self.tracer = Tracer([self.sink])
+
+    def test_nothing_without_tracer(self):
+        self.assertIsNone(get_default_tracer())
+        self.relational_processor.getAllAnnotations()
+        self.assertEqual(self.sink.getSpans(), [])
+
+    def test_sqlite_span(self):
+        self.relational_processor.setTracer(self.tracer)
+        result = self.relational_processor.getAllAnnotations()
+        [method] = self.sink.getSpans("method")
+        [read] = self.sink.getSpans("sqlite")
+        self.assertEqual(method.name, "RelationalQueryProcessor.getAllAnnotations")
+        self.assertIsNone(method.parentId)
+        self.assertEqual(method.traceId, method.id)
+        self.assertEqual(method.rows, len(result))
+        self.assertEqual((read.parentId, read.traceId), (method.id, method.id))
+        self.assertIn("Annotation", read.query)
+        self.assertEqual(read.rows, len(result))
+        # the inner span ends first
+        self.assertEqual(self.sink.getSpans(), [read, method])
+        self.assertLessEqual(read.seconds, method.seconds)
+
+    def test_sparql_span(self):
+        self.graph_processor.setTracer(self.tracer)
+        result = self.graph_processor.getAllManifests()
+        [method] = self.sink.getSpans("method")
+        [query] = self.sink.getSpans("sparql")
+        self.assertEqual(query.parentId, method.id)
+        self.assertEqual(query.name, "TriplestoreQueryProcessor.runQuery")
+        self.assertIn("Manifest", query.query)
+        self.assertEqual(query.rows, len(result))
+        self.assertIsNone(query.error)
+
+    def test_generic_traces_its_processors(self):
+        # the processors have no tracer of their own: they use the one of the
+        # generic call, sequential or concurrent
+        self.generic.setTracer(self.tracer)
+        for concurrent in (False, True):
+            self.sink.clear()
+            self.assertTrue(self.generic.setConcurrent(concurrent))
+            self.generic.getAllCanvas()
+            spans = self.sink.getSpans()
+            [root] = [span for span in spans if span.parentId is None]
+            self.assertEqual(root.name, "GenericQueryProcessor.getAllCanvas")
+            self.assertTrue(all(span.traceId == root.id for span in spans))
+            names = {span.name for span in children(spans, root)}
+            self.assertIn("TriplestoreQueryProcessor.getAllCanvases", names)
+            graph = [span for span in children(spans, root) if span.name == "TriplestoreQueryProcessor.getAllCanvases"]
+            self.assertEqual([span.kind for span in children(spans, graph[0])], ["sparql"])
+            self.assertTrue(self.sink.getSpans("sqlite"))
+
+    def test_error(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, "empty.db")
+            connect(path).close()
+            processor = RelationalQueryProcessor()
+            processor.setDbPathOrUrl(path)
+            processor.setTracer(self.tracer)
+            with self.assertRaises(Exception):
+                processor.getAllImages()
+            processor.close()
+        [method] = self.sink.getSpans("method")
+        self.assertIn("no such table: Image", method.error)
+        self.assertIsNone(method.rows)
+
+    def test_cache_annotation(self):
+        self.generic.setTracer(self.tracer)
+        self.generic.setResultCache(ResultCache())
+        self.generic.getAllImages()
+        self.generic.getAllImages()
+        calls = [span for span in self.sink.getSpans("method") if span.name == "GenericQueryProcessor.getAllImages"]
+        self.assertEqual([span.attributes for span in calls], [{"cache": "miss"}, {"cache": "hit"}])
+        # the hit reads nothing
+        self.assertEqual(len(self.sink.getSpans("sqlite")), 1)
+
+    def test_slow_log(self):
+        tracer = Tracer([self.sink], slow_threshold=0)
+        self.graph_processor.setTracer(tracer)
+        with self.assertLogs("processors.slow", "WARNING") as logs:
+            self.graph_processor.getAllManifests()
+        # the method and its query, not the steps that build the result
+        self.assertEqual(tracer.slow, 2)
+        self.assertTrue(logs.output[0].startswith("WARNING:processors.slow:slow sparql TriplestoreQueryProcessor.runQuery"))
+        self.assertTrue(logs.output[1].startswith("WARNING:processors.slow:slow method TriplestoreQueryProcessor.getAllManifests"))
+
+        self.assertFalse(tracer.setSlowThreshold(-1))
+        self.assertTrue(tracer.setSlowThreshold(60))
+        self.graph_processor.getAllManifests()
+        self.assertEqual(tracer.slow, 2)
+
+    def test_json_lines(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, "spans.jsonl")
+            sink = JsonLinesSink(path)
+            self.relational_processor.setTracer(Tracer([sink]))
+            self.relational_processor.getAllImages()
+            sink.close()
+            with open(path, encoding="utf-8") as file:
+                spans = [loads(line) for line in file]
+        self.assertEqual([span["kind"] for span in spans], ["sqlite", "method"])
+        self.assertEqual(spans[0]["parentId"], spans[1]["id"])
+        self.assertEqual(spans[1]["name"], "RelationalQueryProcessor.getAllImages")
+
+    def test_failing_sink(self):
+        # a sink that fails does not break the call nor the other sinks
+        class Broken(object):
+            def emit(self, span):
+                raise ValueError("broken sink")
+        self.relational_processor.setTracer(Tracer([Broken(), self.sink]))
+        with redirect_stdout(StringIO()) as output:
+            self.assertFalse(self.relational_processor.getAllImages().empty)
+        self.assertIn("broken sink", output.getvalue())
+        self.assertEqual(len(self.sink.getSpans("method")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
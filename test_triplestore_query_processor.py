@@ -0,0 +1,116 @@
+import unittest
+from json import load
+from os.path import join
+from tempfile import TemporaryDirectory
+from pandas import concat
+from impl import TriplestoreQueryProcessor
+from sample_data import build_graph, COLLECTIONS
+
+
+def sorted_rows(frame, columns:list):
+    return frame[columns].sort_values(columns).reset_index(drop=True)
+
+
+class TestTriplestoreQueryProcessor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.path = join(cls.directory.name, "graph.db")
+        assert build_graph(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.processor = TriplestoreQueryProcessor()
+        self.processor.setDbPathOrUrl(self.path)
+
+    def tearDown(self):
+        self.processor.close()
+
+    def test_entities_with_ids_batches(self):
+        # the VALUES batches give the rows of one query per id
+        ids = self.processor.getAllCanvases()["id"].tolist()[:7] + self.processor.getAllManifests()["id"].tolist()
+        expected = concat([self.processor.getEntitiesWithId(id) for id in ids], ignore_index=True)
+        for chunk_size in (2, 500):
+            self.assertTrue(self.processor.setValuesChunkSize(chunk_size))
+            result = self.processor.getEntitiesWithIds(ids + ids[:3])
+            self.assertTrue(sorted_rows(result, ["id", "label", "type"]).equals(sorted_rows(expected, ["id", "label", "type"])))
+
+    def test_entities_with_ids_empty(self):
+        result = self.processor.getEntitiesWithIds([])
+        self.assertTrue(result.empty)
+        self.assertEqual(list(result.columns), ["id", "label", "type"])
+        self.assertTrue(self.processor.getEntitiesWithIds(['no "such" id']).empty)
+        self.assertFalse(self.processor.setValuesChunkSize(0))
+
+    def hierarchy(self, manifests):
+        # manifest id -> set of (canvas id, canvas label), one query per manifest
+        return {id: set(zip(*[self.processor.getCanvasesInManifest(id)[column] for column in ("id", "label")]))
+                for id in manifests["id"]}
+
+    def rows_by_manifest(self, rows):
+        result = dict()
+        for id, canvas_id, canvas_label in zip(rows["id"], rows["canvasId"], rows["canvasLabel"]):
+            result.setdefault(id, set())
+            if canvas_id is not None:
+                result[id].add((canvas_id, canvas_label))
+        return result
+
+    def test_manifests_with_canvases_in_collection(self):
+        for collection_id in self.processor.getAllCollections()["id"]:
+            manifests = self.processor.getManifestsInCollection(collection_id)
+            rows = self.processor.getManifestsWithCanvasesInCollection(collection_id)
+            self.assertEqual(set(rows["id"]), set(manifests["id"]))
+            self.assertEqual(self.rows_by_manifest(rows), self.hierarchy(manifests))
+
+    def test_all_manifests_with_canvases(self):
+        manifests = self.processor.getAllManifests()
+        rows = self.processor.getAllManifestsWithCanvases()
+        self.assertEqual(self.rows_by_manifest(rows), self.hierarchy(manifests))
+        self.assertTrue(self.processor.getManifestsWithCanvasesInCollection("no such collection").empty)
+
+
+class TestContainment(unittest.TestCase):
+    # the queries over the containment triples against the two-hop ones
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        cls.plain = join(cls.directory.name, "plain.db")
+        cls.containment = join(cls.directory.name, "containment.db")
+        assert build_graph(cls.plain) and build_graph(cls.containment, containment=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.plain_processor = TriplestoreQueryProcessor()
+        self.plain_processor.setDbPathOrUrl(self.plain)
+        self.processor = TriplestoreQueryProcessor()
+        self.processor.setDbPathOrUrl(self.containment)
+        self.assertTrue(self.processor.setContainment(True))
+
+    def tearDown(self):
+        self.plain_processor.close()
+        self.processor.close()
+
+    def test_canvases_in_collection(self):
+        for collection_id in self.plain_processor.getAllCollections()["id"]:
+            self.assertEqual(sorted(self.processor.getCanvasesInCollection(collection_id)["id"]),
+                             sorted(self.plain_processor.getCanvasesInCollection(collection_id)["id"]))
+            self.assertEqual(sorted(self.processor.getEntityIdsInCollection(collection_id)["id"]),
+                             sorted(self.plain_processor.getEntityIdsInCollection(collection_id)["id"]))
+
+    def test_canvases_in_manifest_in_order(self):
+        with open(COLLECTIONS[0], mode='r', encoding="utf-8") as f:
+            manifest = load(f)["items"][0]
+        result = self.processor.getCanvasesInManifest(manifest["id"])
+        self.assertEqual(result["id"].tolist(), [canvas["id"] for canvas in manifest["items"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
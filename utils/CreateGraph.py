@@ -1,41 +1,62 @@
 
 from rdflib import Graph, URIRef, RDF, Literal 
 from clean_str import remove_special_chars
-
-def create_Graph(json_object:dict, base_url, my_graph:Graph):
+from hashlib import sha1
+
+# classes
+Collection = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Collection")
+Manifest = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Manifest")
+Canvas = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Canvas")
+
+# attributes related to classes
+label = URIRef("https://github.com/n1kg0r/ds-project-dhdk/attributes/label")
+# 1-based position of a canvas among the items of its manifest
+position = URIRef("https://github.com/n1kg0r/ds-project-dhdk/attributes/position")
+
+# relations among classes
+items = URIRef("https://github.com/n1kg0r/ds-project-dhdk/relations/items")
+has_id = URIRef("http://purl.org/dc/elements/1.1/identifier")
+# shortcut collection -> canvas of the two items hops, written only when the
+# containment triples are asked for
+contains = URIRef("https://github.com/n1kg0r/ds-project-dhdk/relations/contains")
+
+
+def hash_internal_id(entity_type:str, iiif_id:str) -> str:
+    # the internal id is derived from the IIIF id only, so the same entity gets
+    # the same IRI whatever the order, the process or the number of times
+    # its collection is ingested
+    return entity_type + "_" + sha1(iiif_id.encode("utf-8")).hexdigest()[:20]
+
+
+def create_Graph(json_object:dict, base_url, my_graph:Graph, id_mode:str="counter", containment:bool=False):
+    # id_mode "counter": internal ids from the external counter files below,
+    # they are not safe to use from parallel processes and a re-upload mints new ids
+    # id_mode "hash": internal ids from hash_internal_id, no file is used
+    # containment: add the contains and position triples as well
     
-    # create an internal id for the collections using an external counter
-    # .strip is for removing eventually white space
-    with open('collection_counter.txt', 'r', encoding='utf-8') as a:
-        collection_counter = int(a.read().strip())
-
-    # create an internal id for the manifest using an external counter
-    with open('manifest_counter.txt', 'r', encoding='utf-8') as b:
-        manifest_counter = int(b.read().strip())
-
-    # create an internal id for the canvases using an external counter
-    with open('canvas_counter.txt', 'r', encoding='utf-8') as c:
-        canvas_counter = int(c.read().strip())
+    if id_mode == "counter":
+        # create an internal id for the collections using an external counter
+        # .strip is for removing eventually white space
+        with open('collection_counter.txt', 'r', encoding='utf-8') as a:
+            collection_counter = int(a.read().strip())
 
+        # create an internal id for the manifest using an external counter
+        with open('manifest_counter.txt', 'r', encoding='utf-8') as b:
+            manifest_counter = int(b.read().strip())
 
-    # classes
-    Collection = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Collection")
-    Manifest = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Manifest")
-    Canvas = URIRef("https://github.com/n1kg0r/ds-project-dhdk/classes/Canvas")
-
-    # attributes related to classes
-    label = URIRef("https://github.com/n1kg0r/ds-project-dhdk/attributes/label")
-
-    # relations among classes
-    items = URIRef("https://github.com/n1kg0r/ds-project-dhdk/relations/items")
-    has_id = URIRef("http://purl.org/dc/elements/1.1/identifier")
+        # create an internal id for the canvases using an external counter
+        with open('canvas_counter.txt', 'r', encoding='utf-8') as c:
+            canvas_counter = int(c.read().strip())
 
     # create a variable for the id
     collection_id = json_object['id'] 
 
     # create an internal id with an external counter
-    collection_counter += 1
-    collection_IntId = json_object['type'] + f"_{collection_counter}"
+    if id_mode == "hash":
+        collection_IntId = hash_internal_id(json_object['type'], collection_id)
+    else:
+        collection_counter += 1
+        collection_IntId = json_object['type'] + f"_{collection_counter}"
     Coll_internalId = URIRef(base_url + collection_IntId)
 
     # create a list from the dictionary of label and catch the value of the key "none" (language) in a variable
@@ -57,8 +78,11 @@ def create_Graph(json_object:dict, base_url, my_graph:Graph):
         manifest_id = manifest['id']
 
         # here i raise the counter for the manifest internal id
-        manifest_counter += 1
-        manifest_IntId = manifest['type'] + f"_{manifest_counter}" 
+        if id_mode == "hash":
+            manifest_IntId = hash_internal_id(manifest['type'], manifest_id)
+        else:
+            manifest_counter += 1
+            manifest_IntId = manifest['type'] + f"_{manifest_counter}" 
         Man_internalId = URIRef(base_url + manifest_IntId)
 
         #add the "has Item" to connect Collection to Manifest
@@ -79,12 +103,15 @@ def create_Graph(json_object:dict, base_url, my_graph:Graph):
 
         # third step is entering the manifest items list (enter the canvases) -> entering a list of dictionaries
         # here i take the id and I store it in a variable
-        for canvas in manifest["items"]:
+        for canvas_position, canvas in enumerate(manifest["items"], 1):
             canvas_id = canvas['id']
 
             # here i raise the counter for the manifest internal id
-            canvas_counter += 1
-            canvas_IntId = canvas['type'] + f"_{canvas_counter}" 
+            if id_mode == "hash":
+                canvas_IntId = hash_internal_id(canvas['type'], canvas_id)
+            else:
+                canvas_counter += 1
+                canvas_IntId = canvas['type'] + f"_{canvas_counter}" 
             Can_internalId = URIRef(base_url + canvas_IntId)
 
             #add the "has Item" to connect Collection to Manifest
@@ -103,15 +130,20 @@ def create_Graph(json_object:dict, base_url, my_graph:Graph):
             my_graph.add((Can_internalId, RDF.type, Canvas))
             my_graph.add((Can_internalId, label, Literal(str(C_value_label))))
 
+            if containment:
+                my_graph.add((Coll_internalId, contains, Can_internalId))
+                my_graph.add((Can_internalId, position, Literal(canvas_position)))
+
     #upload the counters text file
-    with open('collection_counter.txt', 'w') as a:
-        a.write(str(collection_counter))
+    if id_mode == "counter":
+        with open('collection_counter.txt', 'w') as a:
+            a.write(str(collection_counter))
 
-    with open('manifest_counter.txt', 'w') as b:
-        b.write(str(manifest_counter))
+        with open('manifest_counter.txt', 'w') as b:
+            b.write(str(manifest_counter))
 
-    with open('canvas_counter.txt', 'w') as c:
-        c.write(str(canvas_counter))
+        with open('canvas_counter.txt', 'w') as c:
+            c.write(str(canvas_counter))
 
 
 
@@ -0,0 +1,61 @@
+from sqlite3 import connect
+from threading import local, Lock
+from os.path import abspath
+from urllib.request import pathname2url
+
+
+class ConnectionPool(object):
+    # one sqlite connection for each thread that asks for it, kept open and
+    # reused by all the following calls of that thread until close()
+    def __init__(self, path:str, cache_size:int, mmap_size:int, immutable:bool, cached_statements:int):
+        self.path = path
+        self.cache_size = cache_size  # KiB of page cache per connection
+        self.mmap_size = mmap_size  # bytes of memory-mapped I/O, 0 disables it
+        # immutable=1 opens the file read-only and tells sqlite that nobody
+        # will change it, so no locking nor change detection is done at all:
+        # use it only when no upload runs while the pool is open
+        self.immutable = immutable
+        # prepared statements kept by each connection: a parameterized query
+        # is parsed and planned once and then reused whatever its arguments
+        self.cached_statements = cached_statements
+        self.local = local()
+        self.connections = []
+        self.lock = Lock()
+
+    def get(self):
+        con = getattr(self.local, "con", None)
+        if con is None:
+            # connections are only used by the thread that created them, but
+            # close() may be called by any thread
+            if self.immutable:
+                uri = "file:" + pathname2url(abspath(self.path)) + "?immutable=1"
+                con = connect(uri, uri=True, check_same_thread=False, cached_statements=self.cached_statements)
+            else:
+                con = connect(self.path, check_same_thread=False, cached_statements=self.cached_statements)
+            con.execute(f"PRAGMA cache_size = -{self.cache_size}")
+            if self.mmap_size:
+                con.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+
+            with self.lock:
+                self.connections.append(con)
+            self.local.con = con
+        return con
+
+    def release(self):
+        # close the connection of the current thread, when the thread is done
+        # with the pool (e.g. the handler of a request): the next get() of
+        # the thread opens a new one
+        con = getattr(self.local, "con", None)
+        if con is not None:
+            self.local.con = None
+            with self.lock:
+                self.connections.remove(con)
+            con.close()
+
+    def close(self):
+        with self.lock:
+            for con in self.connections:
+                con.close()
+            self.connections = []
+            # forget the closed connections in every thread
+            self.local = local()
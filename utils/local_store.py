@@ -0,0 +1,145 @@
+from itertools import islice
+from json import loads
+from rdflib import Graph
+from rdflib.store import Store, VALID_STORE
+from rdflib.term import Node
+from utils.connection_pool import ConnectionPool
+from utils.sparql_results import term, json_frame
+from utils.tracing import add_bytes
+
+# the triples are stored as N3 terms; the primary key is the SPO index and the
+# other two orders are covered by secondary indexes, so every triple pattern of
+# a query is answered by an index range scan
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS triples (s TEXT, p TEXT, o TEXT, PRIMARY KEY (s, p, o)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s)",
+    "CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p)"
+]
+
+
+def is_local(path:str) -> bool:
+    # a .db path selects the local store, anything else is a SPARQL endpoint
+    return path.endswith(".db")
+
+
+class SQLiteTripleStore(Store):
+    # persistent rdflib store on a sqlite file, usable by Graph.query and
+    # Graph.update as any other store. It holds a single default graph
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        self.pool = None
+        self.bindings = dict()
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration:str, create:bool=False):
+        self.pool = ConnectionPool(configuration, 64 * 1024, 0, False, 128)
+        con = self.pool.get()
+        for statement in SCHEMA:
+            con.execute(statement)
+        con.commit()
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction:bool=False):
+        if self.pool is not None:
+            self.commit()
+            self.pool.close()
+            self.pool = None
+
+    def release(self):
+        # the connection of the current thread is closed, the others stay
+        if self.pool is not None:
+            self.pool.release()
+
+    def commit(self):
+        self.pool.get().commit()
+
+    def rollback(self):
+        self.pool.get().rollback()
+
+    def pattern(self, triple_pattern):
+        # WHERE clause and parameters of a triple pattern, None matches anything
+        conditions = []
+        params = []
+        for column, value in zip(("s", "p", "o"), triple_pattern):
+            if isinstance(value, Node):
+                conditions.append(f"{column} = ?")
+                params.append(value.n3())
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
+    def add(self, triple, context=None, quoted:bool=False):
+        Store.add(self, triple, context, quoted)
+        self.pool.get().execute("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)", tuple(t.n3() for t in triple))
+
+    def addN(self, quads):
+        self.pool.get().executemany("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)",
+                                    ((s.n3(), p.n3(), o.n3()) for s, p, o, c in quads))
+
+    def add_lines(self, lines, batch_size:int):
+        # fast path for the lines made by utils.sparql_upload.triple_lines:
+        # they already hold the N3 terms, so nothing has to be parsed. Every
+        # batch is committed on its own; it returns the number of lines
+        con = self.pool.get()
+        lines = iter(lines)
+        sent = 0
+        while True:
+            batch = list(islice(lines, batch_size if batch_size > 0 else None))
+            if not batch:
+                break
+            # "<s> <p> object ." where only the object can contain spaces
+            con.executemany("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)",
+                            (line[:-2].split(" ", 2) for line in batch))
+            con.commit()
+            sent += len(batch)
+        return sent
+
+    def remove(self, triple_pattern, context=None):
+        Store.remove(self, triple_pattern, context)
+        where, params = self.pattern(triple_pattern)
+        self.pool.get().execute("DELETE FROM triples" + where, params)
+
+    def triples(self, triple_pattern, context=None):
+        where, params = self.pattern(triple_pattern)
+        for s, p, o in self.pool.get().execute("SELECT s, p, o FROM triples" + where, params):
+            yield (term(s), term(p), term(o)), iter(())
+
+    def __len__(self, context=None):
+        return self.pool.get().execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def bind(self, prefix, namespace, override:bool=True):
+        if override or prefix not in self.bindings:
+            self.bindings[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self.bindings.get(prefix)
+
+    def prefix(self, namespace):
+        for prefix, bound in self.bindings.items():
+            if bound == namespace:
+                return prefix
+        return None
+
+    def namespaces(self):
+        for prefix, namespace in list(self.bindings.items()):
+            yield prefix, namespace
+
+
+def open_graph(path:str):
+    # rdflib Graph over the local store in path, created if missing
+    graph = Graph(store=SQLiteTripleStore())
+    graph.open(path, create=True)
+    return graph
+
+
+def query_frame(graph:Graph, query:str):
+    # run a SELECT and build the DataFrame from its JSON results, as
+    # SparqlClient.select does with the answer of an endpoint, so both
+    # backends return the same frames
+    result = graph.query(query)
+    serialized = result.serialize(format="json")
+    add_bytes(len(serialized))
+    return json_frame(loads(serialized))
@@ -0,0 +1,303 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+
+# aggregate figures of the processors: calls and errors of every method,
+# their latency, the result cache lookups, the rows read from SQLite and the
+# bytes exchanged with the SPARQL endpoints. The processors count into the
+# registry of their metrics attribute (REGISTRY unless set otherwise), which
+# can be rendered in the Prometheus text format, dumped as a dict or served
+# by a MetricsExporter
+
+# seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# registry, processor and method of the call running in the current thread
+# (or task), None outside of any: the rows, bytes and errors counted inside
+# it are labelled with its method
+CALL = ContextVar("current_call", default=None)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names:tuple, values:tuple, extra:str=""):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter(object):
+    # a value for each combination of the labels, that only grows
+    kind = "counter"
+
+    def __init__(self, name:str, help:str, labels:tuple=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = dict()
+        self.lock = Lock()
+
+    def inc(self, *values, amount:float=1):
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + amount
+
+    def get(self, *values):
+        with self.lock:
+            return self.values.get(values, 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [(self.name + format_labels(self.labels, values), value) for values, value in items]
+
+    def dump(self):
+        with self.lock:
+            return [{"labels": dict(zip(self.labels, values)), "value": value}
+                    for values, value in sorted(self.values.items())]
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Gauge(Counter):
+    # a value that can go up and down
+    kind = "gauge"
+
+    def set(self, *values, value:float):
+        with self.lock:
+            self.values[values] = value
+
+
+class Histogram(object):
+    # the observations of each combination of the labels, counted in
+    # buckets (cumulative in the output, as Prometheus wants them)
+    kind = "histogram"
+
+    def __init__(self, name:str, help:str, labels:tuple=(), buckets:tuple=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count of each bucket and +Inf, sum, count]
+        self.values = dict()
+        self.lock = Lock()
+
+    def observe(self, *values, value:float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(values)
+            if entry is None:
+                entry = self.values[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def get(self, *values):
+        # (count, sum) of the observations
+        with self.lock:
+            entry = self.values.get(values)
+            return (entry[2], entry[1]) if entry is not None else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((values, (list(entry[0]), entry[1], entry[2])) for values, entry in self.values.items())
+        lines = []
+        for values, (counts, total, number) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % format_number(bound)
+                lines.append((self.name + "_bucket" + format_labels(self.labels, values, le), cumulative))
+            lines.append((self.name + "_sum" + format_labels(self.labels, values), total))
+            lines.append((self.name + "_count" + format_labels(self.labels, values), number))
+        return lines
+
+    def dump(self):
+        with self.lock:
+            return [{"labels": dict(zip(self.labels, values)), "count": entry[2], "sum": entry[1],
+                     "buckets": dict(zip([format_number(b) for b in self.buckets + (float("inf"),)], entry[0]))}
+                    for values, entry in sorted(self.values.items())]
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class MetricsRegistry(object):
+    # the metrics by name; counter, gauge and histogram return the existing
+    # metric of that name or create it
+    def __init__(self):
+        self.metrics = dict()
+        self.lock = Lock()
+
+    def metric(self, kind, name:str, help:str, labels:tuple, **options):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = kind(name, help, labels, **options)
+            return metric
+
+    def counter(self, name:str, help:str="", labels:tuple=()):
+        return self.metric(Counter, name, help, labels)
+
+    def gauge(self, name:str, help:str="", labels:tuple=()):
+        return self.metric(Gauge, name, help, labels)
+
+    def histogram(self, name:str, help:str="", labels:tuple=(), buckets:tuple=LATENCY_BUCKETS):
+        return self.metric(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        # Prometheus text exposition format (version 0.0.4)
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name} {format_number(value)}" for name, value in metric.samples()]
+        return "\n".join(lines) + "\n"
+
+    def dump(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: {"type": metric.kind, "help": metric.help, "values": metric.dump()} for metric in metrics}
+
+    def reset(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            metric.reset()
+        return True
+
+
+# the registry of the processors unless they are given their own
+REGISTRY = MetricsRegistry()
+
+
+def start_call(registry, processor:str, method:str):
+    # called when a public method starts, the token ends it (see end_call)
+    registry.counter("processor_requests_total", "Calls of the methods of the processors",
+                     ("processor", "method")).inc(processor, method)
+    return CALL.set((registry, processor, method))
+
+
+def end_call(token, seconds:float, error:Exception=None):
+    registry, processor, method = CALL.get()
+    CALL.reset(token)
+    registry.histogram("processor_latency_seconds", "Duration of the calls of the methods of the processors",
+                       ("processor", "method")).observe(processor, method, value=seconds)
+    if error is not None:
+        count_error(registry, processor, method, error)
+
+
+def count_error(registry, processor:str, method:str, error:Exception):
+    registry.counter("processor_errors_total", "Exceptions raised or caught in the methods of the processors",
+                     ("processor", "method", "error")).inc(processor, method, type(error).__name__)
+
+
+def report_error(error:Exception):
+    # what the processors do with the exceptions they catch: print them, as
+    # they always did, and count them for the method that caught them
+    print(error)
+    call = CALL.get()
+    if call is not None:
+        count_error(*call, error)
+
+
+def count_cache(hit:bool):
+    call = CALL.get()
+    if call is not None:
+        registry, processor, method = call
+        registry.counter("processor_cache_lookups_total", "Result cache lookups of the methods of the processors",
+                         ("processor", "method", "result")).inc(processor, method, "hit" if hit else "miss")
+
+
+def count_sqlite_rows(rows:int):
+    call = CALL.get()
+    if call is not None:
+        registry, processor, method = call
+        registry.counter("sqlite_rows_read_total", "Rows read from SQLite by the methods of the processors",
+                         ("processor", "method")).inc(processor, method, amount=rows)
+
+
+def count_sparql_bytes(received:int, sent:int):
+    call = CALL.get()
+    if call is not None:
+        registry, processor, method = call
+        registry.counter("sparql_requests_total", "SPARQL requests sent by the methods of the processors",
+                         ("processor", "method")).inc(processor, method)
+        registry.counter("sparql_bytes_received_total", "Bytes received from the SPARQL endpoints (compressed)",
+                         ("processor", "method")).inc(processor, method, amount=received)
+        registry.counter("sparql_bytes_sent_total", "Bytes sent to the SPARQL endpoints",
+                         ("processor", "method")).inc(processor, method, amount=sent)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            content = b"Not Found"
+            self.send_response(404)
+            self.send_header("Content-Type", "text/plain")
+        else:
+            content = self.server.registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class MetricsExporter(ThreadingHTTPServer):
+    # serves the registry at http://host:port/metrics for Prometheus:
+    #
+    #   with MetricsExporter(port=9464) as exporter:
+    #       ...
+    #
+    # port 0 takes a free port
+    daemon_threads = True
+
+    def __init__(self, registry:MetricsRegistry=None, host:str="127.0.0.1", port:int=0):
+        super().__init__((host, port), MetricsRequestHandler)
+        self.registry = registry if registry is not None else REGISTRY
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target=self.serve_forever, daemon=True)
+            self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,109 @@
+from numpy import asarray, empty
+from pandas import DataFrame
+
+
+def column_array(values):
+    # 1-D array of the values; lists (creators, items) stay single cells
+    if isinstance(values, list):
+        array = empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    return asarray(values)
+
+
+class RowView(object):
+    # one row of a ResultBatch with the getters of the model classes; it only
+    # keeps the batch and the position, the values are read when asked for
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index:int):
+        self.batch = batch
+        self.index = index
+
+    def value(self, name:str):
+        value = self.batch.columns[name][self.index]
+        wrap = self.batch.wraps.get(name)
+        return wrap(value) if wrap is not None else value
+
+    def getId(self):
+        return self.value("id")
+
+    def getLabel(self):
+        return self.value("label")
+
+    def getTitle(self):
+        # as EntityWithMetadata.getTitle
+        title = self.value("title")
+        return title if title else None
+
+    def getCreators(self):
+        # as EntityWithMetadata: a string becomes a one-item list
+        creators = self.value("creators")
+        if type(creators) == str:
+            return [creators]
+        if type(creators) == list:
+            return creators
+        return []
+
+    def getItems(self):
+        return self.value("items")
+
+    def getMotivation(self):
+        return self.value("motivation")
+
+    def getTarget(self):
+        return self.value("target")
+
+    def getBody(self):
+        return self.value("body")
+
+    def materialize(self):
+        # the model object of the row
+        return self.batch.model(*[self.value(name) for name in self.batch.names])
+
+
+class ResultBatch(object):
+    # columnar result of a GenericQueryProcessor method: one NumPy array for
+    # each argument of the model class, in the order of its constructor.
+    # Indexing with an int or iterating gives RowViews, slicing gives a
+    # batch over the same arrays and toPandas wraps them without copying
+    def __init__(self, model, columns:dict, wraps:dict=None):
+        self.model = model
+        self.names = list(columns)
+        self.columns = {name: column_array(values) for name, values in columns.items()}
+        # constructors applied to the cells of some columns when read, e.g.
+        # the target of an annotation is an IdentifiableEntity
+        self.wraps = wraps if wraps is not None else dict()
+
+    def __len__(self):
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ResultBatch(self.model, {name: array[key] for name, array in self.columns.items()}, self.wraps)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("ResultBatch index out of range")
+        return RowView(self, key)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield RowView(self, index)
+
+    def column(self, name:str):
+        return self.columns[name]
+
+    def getColumnNames(self):
+        return list(self.names)
+
+    def copy(self):
+        # a new batch over the same arrays
+        return ResultBatch(self.model, dict(self.columns), self.wraps)
+
+    def toPandas(self):
+        return DataFrame(self.columns, copy=False)
+
+    def toObjects(self):
+        # the list of model objects the method returns by default
+        return [view.materialize() for view in self]
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from copy import deepcopy
+from functools import wraps
+from os.path import abspath
+from sys import getsizeof
+from threading import Lock
+from time import monotonic
+from weakref import WeakSet
+from numpy import ndarray
+from pandas import DataFrame
+from utils.tracing import annotate
+from utils.metrics import count_cache
+
+# generation of every database path or endpoint: it is bumped by each
+# successful upload, so the results read before it are known to be stale
+GENERATIONS = dict()
+# all the live caches, purged of the entries of a target when it is bumped
+CACHES = WeakSet()
+LOCK = Lock()
+
+
+def target_key(target:str):
+    # the same database whatever the spelling of its path or URL
+    if target.endswith(".db"):
+        return abspath(target)
+    return target.rstrip("/")
+
+
+def generations(targets:list):
+    with LOCK:
+        return tuple((key, GENERATIONS.get(key, 0)) for key in map(target_key, targets))
+
+
+def bump_generation(target:str):
+    # to be called after every successful upload to target
+    key = target_key(target)
+    with LOCK:
+        GENERATIONS[key] = GENERATIONS.get(key, 0) + 1
+        caches = list(CACHES)
+    for cache in caches:
+        cache.invalidate(key)
+
+
+def estimate_size(value, seen:set=None):
+    # rough number of bytes held by a result: the DataFrames are measured by
+    # pandas, the model objects by walking their attributes
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, ndarray):
+        # object arrays hold references, the other ones their data
+        if value.dtype == object:
+            return value.nbytes + sum(estimate_size(item, seen) for item in value)
+        return value.nbytes
+    size = getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), seen)
+    elif hasattr(value, "__slots__"):
+        # every class of the hierarchy declares its own slots
+        slots = [slot for cls in type(value).__mro__ for slot in getattr(cls, "__slots__", ())]
+        size += sum(estimate_size(getattr(value, slot, None), seen) for slot in slots)
+    return size
+
+
+def freeze(value):
+    # hashable version of the arguments of a query (lists of ids, ...)
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+def copy_result(value):
+    # the cached result is never handed out, so the callers can modify theirs:
+    # the copy is deep, the model objects in a list (and the items of a
+    # Manifest, the creators of an entity) are copies too. The DataFrames are
+    # copied by pandas, their cells are strings and numbers
+    if isinstance(value, DataFrame):
+        return value.copy(deep=True)
+    return deepcopy(value)
+
+
+class ResultCache(object):
+    # LRU cache of query results, bounded by the estimated bytes of the
+    # results; an entry expires ttl seconds after it is stored (None: never)
+    # and as soon as an upload changes one of the databases it was read from.
+    # One cache can be shared by several processors
+    def __init__(self, max_bytes:int=64 * 1024 * 1024, ttl:float=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (result, size, expiry time, generations of its targets)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.lock = Lock()
+        with LOCK:
+            CACHES.add(self)
+
+    def drop(self, key):
+        value, size, expires, snapshot = self.entries.pop(key)
+        self.bytes -= size
+
+    def lookup(self, key, snapshot:tuple):
+        # (True, result) for a valid entry, (False, None) otherwise
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, size, expires, stored = entry
+                if expires is not None and expires <= monotonic():
+                    self.drop(key)
+                    self.expirations += 1
+                elif stored != snapshot:
+                    self.drop(key)
+                    self.invalidations += 1
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+            self.misses += 1
+            return False, None
+
+    def store(self, key, value, snapshot:tuple):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            if key in self.entries:
+                self.drop(key)
+            expires = None if self.ttl is None else monotonic() + self.ttl
+            self.entries[key] = (value, size, expires, snapshot)
+            self.bytes += size
+            # least recently used first
+            while self.bytes > self.max_bytes:
+                self.drop(next(iter(self.entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key:str):
+        # drop the entries read from the target key
+        with self.lock:
+            stale = [k for k, entry in self.entries.items() if any(t == key for t, g in entry[3])]
+            for k in stale:
+                self.drop(k)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        return True
+
+    def getStats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes
+            }
+
+
+def cached(method):
+    # decorator of the query methods of the processors: the result is taken
+    # from self.resultCache when there is one, keyed by the method, its
+    # arguments (the keyword ones sorted by name) and the databases returned
+    # by self.cacheTargets()
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.resultCache
+        if cache is None:
+            return method(self, *args, **kwargs)
+        targets = self.cacheTargets()
+        # processors with a cacheVariant (e.g. the result format) keep a
+        # separate entry for each variant
+        variant = self.cacheVariant() if hasattr(self, "cacheVariant") else None
+        key = (method.__qualname__, freeze(args), freeze(kwargs), tuple(targets), variant)
+        # taken before the query, so a result read while an upload runs is
+        # already stale when stored
+        snapshot = generations(targets)
+        found, value = cache.lookup(key, snapshot)
+        annotate(cache="hit" if found else "miss")
+        count_cache(found)
+        if not found:
+            value = method(self, *args, **kwargs)
+            cache.store(key, value, snapshot)
+        return copy_result(value)
+    return wrapper
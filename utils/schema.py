@@ -0,0 +1,57 @@
+# explicit schema of the relational database, so that the tables get their
+# primary keys and the columns used by RelationalQueryProcessor get an index
+TABLES = {
+    "Annotation": "CREATE TABLE Annotation (annotationId TEXT PRIMARY KEY, id TEXT, body TEXT, target TEXT, motivation TEXT)",
+    "Image": "CREATE TABLE Image (imageId TEXT PRIMARY KEY, id TEXT)",
+    "Entity": "CREATE TABLE Entity (entityId TEXT PRIMARY KEY, id TEXT, title TEXT)",
+    # an entity can list the same creator more than once, so the proxy table
+    # keeps the rowid and is only indexed on both columns
+    "Creators": "CREATE TABLE Creators (entityId TEXT, creator TEXT)"
+}
+
+INDEXES = {
+    "Annotation": [
+        "CREATE INDEX Annotation_target ON Annotation (target)",
+        "CREATE INDEX Annotation_body ON Annotation (body)"
+    ],
+    "Image": [
+        "CREATE INDEX Image_id ON Image (id)"
+    ],
+    "Entity": [
+        "CREATE INDEX Entity_id ON Entity (id)",
+        "CREATE INDEX Entity_title ON Entity (title)"
+    ],
+    "Creators": [
+        "CREATE INDEX Creators_entityId ON Creators (entityId)",
+        "CREATE INDEX Creators_creator ON Creators (creator)"
+    ]
+}
+
+# page cache used while loading, in KiB (negative values are KiB for sqlite)
+BULK_LOAD_CACHE_KIB = 256 * 1024
+
+
+def create_tables(con, tables:list):
+    # drop and create again the tables, without their secondary indexes
+    for table in tables:
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.execute(TABLES[table])
+
+
+def create_indexes(con, tables:list):
+    # to be called after the data is loaded: building an index once is much
+    # cheaper than keeping it up to date row by row
+    for table in tables:
+        for index in INDEXES[table]:
+            con.execute(index)
+
+
+def set_bulk_load(con):
+    # WAL journaling, relaxed fsync and a large page cache for the ingestion.
+    # It must be called outside of a transaction (journal_mode cannot change
+    # inside one); journal_mode is stored in the file, the others last as
+    # long as the connection
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute(f"PRAGMA cache_size = -{BULK_LOAD_CACHE_KIB}")
+    con.execute("PRAGMA temp_store = MEMORY")
@@ -0,0 +1,140 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from gzip import decompress
+from json import loads
+from threading import Lock
+from urllib.parse import urlparse
+from utils.sparql_results import json_frame, tsv_frame
+from utils.tracing import add_bytes
+from utils.metrics import count_sparql_bytes
+
+JSON_RESULTS = "application/sparql-results+json"
+TSV_RESULTS = "text/tab-separated-values"
+
+# errors of a kept-alive connection that the server has closed meanwhile:
+# the request is sent again once on a new connection
+STALE_ERRORS = (HTTPException, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+
+class SparqlError(Exception):
+    # an error answer of the endpoint, with its HTTP status
+    def __init__(self, message:str, status:int=None):
+        super().__init__(message)
+        self.status = status
+
+
+class SparqlClient(object):
+    # HTTP/1.1 client of a SPARQL endpoint: the connections are kept alive
+    # and reused by the following requests, at most pool_size of them are
+    # kept when idle; the responses are asked gzip-compressed
+    def __init__(self, url:str, pool_size:int=4, timeout:float=60):
+        parsed = urlparse(url)
+        self.url = url
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += "?" + parsed.query
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle = []
+        self.lock = Lock()
+        # number of connections opened so far
+        self.opened = 0
+
+    def connection(self):
+        # an idle connection, or a new one when there is none
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+            self.opened += 1
+        if self.scheme == "https":
+            return HTTPSConnection(self.host, self.port, timeout=self.timeout), False
+        return HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, con):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(con)
+                return
+        con.close()
+
+    def request(self, body:str, content_type:str, accept:str="*/*"):
+        # POST body and return the (decompressed) response body
+        headers = {
+            "Content-Type": content_type + "; charset=utf-8",
+            "Accept": accept,
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive"
+        }
+        data = body.encode("utf-8")
+        con, reused = self.connection()
+        try:
+            try:
+                con.request("POST", self.path, data, headers)
+                response = con.getresponse()
+            except STALE_ERRORS:
+                if not reused:
+                    raise
+                con.close()
+                con, reused = self.connection()
+                con.request("POST", self.path, data, headers)
+                response = con.getresponse()
+            # the whole body must be read before the connection is reused
+            content = response.read()
+        except Exception:
+            con.close()
+            raise
+
+        if response.getheader("Connection", "").lower() == "close":
+            con.close()
+        else:
+            self.release(con)
+        # bytes on the wire, before the decompression
+        add_bytes(len(content), len(data))
+        count_sparql_bytes(len(content), len(data))
+        if response.getheader("Content-Encoding", "").lower() == "gzip":
+            content = decompress(content)
+        if response.status >= 400:
+            raise SparqlError(f"{response.status} {response.reason}: {content[:500].decode('utf-8', 'replace')}",
+                              response.status)
+        return content
+
+    def select(self, query:str, response_format:str="json"):
+        # DataFrame of a SELECT query, from the JSON or the TSV results
+        if response_format == "tsv":
+            return tsv_frame(self.request(query, "application/sparql-query", TSV_RESULTS).decode("utf-8"))
+        return json_frame(loads(self.request(query, "application/sparql-query", JSON_RESULTS)))
+
+    def update(self, update:str):
+        # same signature as SPARQLUpdateStore.update, see utils.sparql_upload
+        self.request(update, "application/sparql-update")
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for con in idle:
+            con.close()
+
+
+CLIENTS = dict()
+CLIENTS_LOCK = Lock()
+
+
+def get_client(url:str, pool_size:int=4):
+    # the client shared by all the processors that use the endpoint url
+    with CLIENTS_LOCK:
+        client = CLIENTS.get(url)
+        if client is None:
+            client = CLIENTS[url] = SparqlClient(url, pool_size)
+        else:
+            client.pool_size = max(client.pool_size, pool_size)
+        return client
+
+
+def close_clients():
+    with CLIENTS_LOCK:
+        clients = list(CLIENTS.values())
+        CLIENTS.clear()
+    for client in clients:
+        client.close()
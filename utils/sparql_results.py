@@ -0,0 +1,64 @@
+from functools import lru_cache
+from pandas import DataFrame
+from rdflib import Literal, URIRef
+from rdflib.util import from_n3
+
+# conversion of the SPARQL results formats into DataFrames with typed columns:
+# numbers, booleans and dates become python values, IRIs and plain literals
+# strings, unbound variables None
+
+
+@lru_cache(maxsize=1 << 16)
+def term(n3:str):
+    # IRIs, labels and types repeat a lot in the results, parse them once
+    return from_n3(n3)
+
+
+@lru_cache(maxsize=1 << 16)
+def literal_value(value:str, datatype:str):
+    # python value of a typed literal (int, float, bool, date...), the
+    # lexical form when rdflib does not know the datatype
+    python = Literal(value, datatype=URIRef(datatype)).toPython()
+    return value if isinstance(python, Literal) else python
+
+
+def binding_value(binding:dict):
+    # a term of the JSON results format
+    if binding is None:
+        return None
+    if binding["type"] in ("literal", "typed-literal") and "datatype" in binding:
+        return literal_value(binding["value"], binding["datatype"])
+    return binding["value"]
+
+
+def json_frame(results:dict):
+    # DataFrame of the SPARQL JSON results: one column for each variable,
+    # None for the unbound ones
+    names = results["head"]["vars"]
+    rows = results["results"]["bindings"]
+    columns = {name: [binding_value(row.get(name)) for row in rows] for name in names}
+    return DataFrame(columns, columns=names).infer_objects()
+
+
+def tsv_value(cell:str):
+    # a term of the TSV results format, written in N-Triples syntax
+    if not cell:
+        return None
+    node = term(cell)
+    if isinstance(node, Literal):
+        python = node.toPython()
+        return str(node) if isinstance(python, Literal) else python
+    return str(node)
+
+
+def tsv_frame(text:str):
+    lines = text.split("\n")
+    names = [name.lstrip("?$") for name in lines[0].rstrip("\r").split("\t")]
+    columns = {name: [] for name in names}
+    for line in lines[1:]:
+        line = line.rstrip("\r")
+        if not line:
+            continue
+        for name, cell in zip(names, line.split("\t")):
+            columns[name].append(tsv_value(cell))
+    return DataFrame(columns, columns=names).infer_objects()
@@ -0,0 +1,272 @@
+from gzip import compress
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from random import uniform
+from socket import IPPROTO_TCP, TCP_NODELAY
+from threading import Thread, Lock
+from time import sleep
+from urllib.parse import urlparse, parse_qs
+from rdflib import Literal
+from utils.local_store import open_graph
+
+# the SPARQL 1.1 protocol on top of the local store: queries by GET
+# (?query=), by POST of a form (query=) or of the query itself
+# (application/sparql-query), updates by POST of a form (update=) or of the
+# update itself (application/sparql-update). The results format is chosen by
+# the format/output parameters (as sent by SPARQLWrapper) or by the Accept
+# header, and the responses are gzip-compressed when the client accepts it
+
+# SELECT and ASK results: rdflib format by media type
+RESULTS_TYPES = {
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "application/sparql-results+xml": "xml",
+    "application/xml": "xml",
+    "text/xml": "xml",
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv"
+}
+RESULTS_MEDIA = {
+    "json": "application/sparql-results+json",
+    "xml": "application/sparql-results+xml",
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values"
+}
+# CONSTRUCT and DESCRIBE results
+GRAPH_TYPES = {
+    "text/turtle": "turtle",
+    "application/n-triples": "nt",
+    "text/plain": "nt",
+    "application/rdf+xml": "xml",
+    "application/ld+json": "json-ld"
+}
+GRAPH_MEDIA = {
+    "turtle": "text/turtle",
+    "nt": "application/n-triples",
+    "xml": "application/rdf+xml",
+    "json-ld": "application/ld+json"
+}
+
+
+def accepted(accept:str):
+    # media types of an Accept header, the preferred ones first
+    types = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for part in parts[1:]:
+            if part.startswith("q="):
+                try:
+                    quality = float(part[2:])
+                except ValueError:
+                    pass
+        if parts[0]:
+            types.append((-quality, position, parts[0].lower()))
+    return [media for quality, position, media in sorted(types)]
+
+
+def negotiate(accept:str, requested:str, types:dict, default:str):
+    # the format asked by a format/output parameter ("json", "csv", ... or a
+    # media type), else the first format of the Accept header we can write
+    if requested:
+        requested = requested.lower()
+        if requested in types:
+            return types[requested]
+        if requested in types.values():
+            return requested
+    for media in accepted(accept or ""):
+        if media in types:
+            return types[media]
+    return default
+
+
+def tsv_term(node):
+    # a term in N-Triples syntax, with the tabs and newlines escaped
+    if node is None:
+        return ""
+    text = node.n3()
+    if isinstance(node, Literal):
+        text = text.replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+
+def serialize_results(result, format:str):
+    # body of the results of a query in format (rdflib has no TSV writer and
+    # its CSV one only handles SELECT)
+    if result.type == "ASK":
+        if format in ("csv", "tsv"):
+            return ("_askResult\n%s\n" % ("true" if result.askAnswer else "false")).encode("utf-8")
+        return result.serialize(format=format)
+    if result.type in ("CONSTRUCT", "DESCRIBE"):
+        return result.graph.serialize(format=format, encoding="utf-8")
+    if format == "tsv":
+        lines = ["\t".join("?" + str(var) for var in result.vars)]
+        lines += ["\t".join(tsv_term(value) for value in row) for row in result]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+    return result.serialize(format=format, encoding="utf-8")
+
+
+class SparqlRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so the clients can keep their connections alive
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # the headers and the body are written separately: without this the
+        # body waits for the delayed ACK of the headers (about 40 ms)
+        self.connection.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != self.server.route:
+            return self.reply(404, b"Not Found", "text/plain")
+        params = parse_qs(url.query)
+        self.handle_sparql(params.get("query", [None])[0], params.get("update", [None])[0], params)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        if url.path != self.server.route:
+            return self.reply(404, b"Not Found", "text/plain")
+        params = parse_qs(url.query)
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        query = update = None
+        if content_type == "application/sparql-query":
+            query = body
+        elif content_type == "application/sparql-update":
+            update = body
+        elif content_type == "application/x-www-form-urlencoded":
+            form = parse_qs(body)
+            params.update(form)
+            query = form.get("query", [None])[0]
+            update = form.get("update", [None])[0]
+        else:
+            return self.reply(415, b"Unsupported Media Type", "text/plain")
+        self.handle_sparql(query, update, params)
+
+    def handle_sparql(self, query:str, update:str, params:dict):
+        self.server.wait()
+        if query is None and update is None:
+            return self.reply(400, b"Missing query or update", "text/plain")
+        try:
+            if update is not None:
+                self.server.run_update(update)
+                return self.reply(200, b"", "text/plain")
+            result = self.server.run_query(query)
+        except Exception as e:
+            # syntax errors and everything else the store cannot answer
+            return self.reply(400, str(e).encode("utf-8"), "text/plain")
+
+        requested = (params.get("format") or params.get("output") or [None])[0]
+        if result.type in ("CONSTRUCT", "DESCRIBE"):
+            format = negotiate(self.headers.get("Accept"), requested, GRAPH_TYPES, "turtle")
+            media = GRAPH_MEDIA[format]
+        else:
+            format = negotiate(self.headers.get("Accept"), requested, RESULTS_TYPES, "json")
+            media = RESULTS_MEDIA[format]
+        self.reply(200, serialize_results(result, format), media + "; charset=utf-8")
+
+    def reply(self, status:int, content:bytes, content_type:str):
+        gzip = "gzip" in (self.headers.get("Accept-Encoding") or "").lower() and len(content) > 0
+        if gzip:
+            content = compress(content)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        if gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class SparqlServer(ThreadingHTTPServer):
+    # SPARQL endpoint over a local store file (see utils.local_store), a
+    # stand-in for Blazegraph in tests and benchmarks:
+    #
+    #   with SparqlServer("graph.db", latency=0.005) as server:
+    #       processor.setDbPathOrUrl(server.url)
+    #
+    # port 0 takes a free port; every request waits latency seconds plus a
+    # random part up to jitter before being answered, like a remote server
+    daemon_threads = True
+
+    def __init__(self, path:str, host:str="127.0.0.1", port:int=0, route:str="/sparql",
+                 latency:float=0.0, jitter:float=0.0, verbose:bool=False):
+        super().__init__((host, port), SparqlRequestHandler)
+        self.path = path
+        self.route = route
+        self.latency = latency
+        self.jitter = jitter
+        self.verbose = verbose
+        self.graph = open_graph(path)
+        # the updates are applied one at a time, the queries run in parallel
+        self.update_lock = Lock()
+        self.stats_lock = Lock()
+        self.queries = 0
+        self.updates = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{self.route}"
+
+    def process_request_thread(self, request, client_address):
+        # every connection of a client is served by a thread of its own,
+        # which opens its own sqlite connection: it is closed with the thread,
+        # so the open files do not grow with the number of connections served
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.graph.store.release()
+
+    def wait(self):
+        delay = self.latency + (uniform(0, self.jitter) if self.jitter > 0 else 0)
+        if delay > 0:
+            sleep(delay)
+
+    def run_query(self, query:str):
+        with self.stats_lock:
+            self.queries += 1
+        return self.graph.query(query)
+
+    def run_update(self, update:str):
+        with self.stats_lock:
+            self.updates += 1
+        with self.update_lock:
+            try:
+                self.graph.update(update)
+                self.graph.commit()
+            except Exception:
+                self.graph.rollback()
+                raise
+
+    def getStats(self):
+        with self.stats_lock:
+            return {"queries": self.queries, "updates": self.updates}
+
+    def start(self):
+        # serve from a daemon thread, it returns the URL of the endpoint
+        if self.thread is None:
+            self.thread = Thread(target=self.serve_forever, daemon=True)
+            self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+        self.graph.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
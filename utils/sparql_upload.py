@@ -0,0 +1,76 @@
+from itertools import islice
+
+# statuses of a request too big for the endpoint: the only errors for which
+# the same triples are sent again in smaller batches
+PAYLOAD_STATUSES = (413, 414)
+
+
+def payload_too_large(error:Exception) -> bool:
+    # SparqlError has a status, urllib's HTTPError (SPARQLUpdateStore) a code
+    status = getattr(error, "status", None) or getattr(error, "code", None)
+    return status in PAYLOAD_STATUSES
+
+
+# accepted requests after which a rejected batch size may be tried again
+RETRY_AFTER = 64
+
+
+def triple_lines(triples):
+    # serialize every triple as an N-Triples line, so that it can be placed
+    # as it is inside an INSERT DATA block
+    for triple in triples:
+        yield " ".join(term.n3() for term in triple) + " ."
+
+
+def upload_lines(store, lines, batch_size:int):
+    # send the lines to the endpoint grouped in INSERT DATA requests of
+    # batch_size triples (batch_size <= 0 means everything in one request).
+    # When the endpoint rejects a request as too large the same triples are
+    # sent again in a smaller batch, down to one triple per request; any other
+    # error (connection, syntax, server) is raised at once. The batch size then
+    # grows back by bisection between the largest accepted and the smallest
+    # rejected size; the rejected size is forgotten after RETRY_AFTER accepted
+    # requests, so one oversized batch does not slow the rest of the upload.
+    # It returns the number of triples sent and the batch size reached.
+    lines = iter(lines)
+    pending = []
+    sent = 0
+    requested = batch_size
+    # largest accepted size and last rejected size (None: no limit known)
+    accepted = 0
+    rejected = None
+    requests_since = 0
+
+    while True:
+        if batch_size > 0:
+            pending += list(islice(lines, max(batch_size - len(pending), 0)))
+        else:
+            pending += list(lines)
+            batch_size = requested = max(len(pending), 1)
+        if not pending:
+            break
+
+        chunk = pending[:batch_size]
+        try:
+            store.update("INSERT DATA {\n%s\n}" % "\n".join(chunk))
+        except Exception as e:
+            if len(chunk) == 1 or not payload_too_large(e):
+                raise
+            rejected = len(chunk)
+            accepted = min(accepted, rejected - 1)
+            requests_since = 0
+            batch_size = max(rejected // 2, 1)
+            continue
+
+        pending = pending[len(chunk):]
+        sent += len(chunk)
+        requests_since += 1
+        accepted = max(accepted, len(chunk))
+        if rejected is not None and requests_since >= RETRY_AFTER:
+            rejected = None
+        if rejected is None:
+            batch_size = min(requested, batch_size * 2)
+        else:
+            batch_size = max(batch_size, min(requested, (accepted + rejected) // 2))
+
+    return sent, batch_size
@@ -0,0 +1,187 @@
+from re import compile
+from json import JSONDecoder
+from json.decoder import JSONDecodeError
+from rdflib import URIRef, RDF, Literal
+from clean_str import remove_special_chars
+from utils.CreateGraph import Collection, Manifest, Canvas, label, items, has_id, contains, position, hash_internal_id
+
+WHITESPACE = compile(r"[ \t\n\r]*")
+
+# class of the entities at each level of a collection file
+LEVEL_CLASSES = [Collection, Manifest, Canvas]
+# the canvases are the last level: their "items" hold AnnotationPages, which
+# create_Graph ignores, so they are skipped too
+LAST_LEVEL = len(LEVEL_CLASSES) - 1
+
+COUNTER_FILES = {
+    "Collection": "collection_counter.txt",
+    "Manifest": "manifest_counter.txt",
+    "Canvas": "canvas_counter.txt"
+}
+
+
+class JsonStream(object):
+    # minimal pull parser: the file is read in blocks and only the value being
+    # decoded is kept in memory, so the "items" arrays can be walked one
+    # element at a time whatever their size
+    def __init__(self, fp, block_size:int=1 << 16):
+        self.fp = fp
+        self.block_size = block_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = JSONDecoder()
+
+    def fill(self, size:int=0):
+        # drop the consumed text and read another block, False at end of file
+        if self.eof:
+            return False
+        block = self.fp.read(max(size, self.block_size))
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        if not block:
+            self.eof = True
+        return bool(block)
+
+    def peek(self):
+        # next character that is not whitespace, without consuming it
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def next(self, expected:str):
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Expected one of {expected!r} but found {char!r} in the JSON stream")
+        self.pos += 1
+        return char
+
+    def value(self):
+        # decode the whole value at the current position; while it is incomplete
+        # the buffer is doubled, so a big value is not decoded again at every block
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except JSONDecodeError:
+                if self.fill(len(self.buffer) - self.pos):
+                    continue
+                raise
+            # a number touching the end of the buffer may go on in the next block
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def elements(self):
+        # walk an array: at each step the caller must consume one element
+        self.next("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.next(",]") == "]":
+                return
+
+    def keys(self):
+        # walk an object: at each step the caller must consume the value of the key
+        self.next("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.next(":")
+            yield key
+            if self.next(",}") == "}":
+                return
+
+
+def walk_entities(stream:JsonStream, parent:dict, level:int):
+    # yield (entity, parent, level) for the object at the current position and
+    # for everything inside its "items", without the "items" themselves. The
+    # entity is yielded as soon as its id, type and label are known, so its
+    # children can refer to it; if "items" comes before them it is decoded
+    # as a whole and walked afterwards
+    entity = dict()
+    yielded = False
+    buffered = []
+    for key in stream.keys():
+        if key == "items" and level >= LAST_LEVEL:
+            stream.value()
+        elif key == "items" and not yielded and all(k in entity for k in ("id", "type", "label")):
+            yield entity, parent, level
+            yielded = True
+            for _ in stream.elements():
+                yield from walk_entities(stream, entity, level + 1)
+        elif key == "items":
+            buffered += stream.value()
+        else:
+            entity[key] = stream.value()
+
+    if not yielded:
+        yield entity, parent, level
+    for child in buffered:
+        yield from walk_dicts(child, entity, level + 1)
+
+
+def walk_dicts(json_object:dict, parent:dict, level:int):
+    # same as walk_entities for an object that is already in memory
+    entity = {key: value for key, value in json_object.items() if key != "items"}
+    yield entity, parent, level
+    if level < LAST_LEVEL:
+        for child in json_object.get("items", []):
+            yield from walk_dicts(child, entity, level + 1)
+
+
+def stream_triples(jsonfile, base_url:str, id_mode:str="counter", containment:bool=False):
+    # generate the same triples as create_Graph while the file is parsed, for a
+    # collection or a list of collections. In "counter" mode the counter files
+    # are read at the start and written back once the whole file is consumed
+    stream = JsonStream(jsonfile)
+    counters = dict()
+    if id_mode == "counter":
+        for entity_type, file_name in COUNTER_FILES.items():
+            with open(file_name, 'r', encoding='utf-8') as f:
+                counters[entity_type] = int(f.read().strip())
+
+    if stream.peek() == "[":
+        walks = (walk_entities(stream, None, 0) for _ in stream.elements())
+    else:
+        walks = [walk_entities(stream, None, 0)]
+
+    for walk in walks:
+        for entity, parent, level in walk:
+            if id_mode == "hash":
+                internal_id = hash_internal_id(entity['type'], entity['id'])
+            else:
+                counters[entity['type']] = counters.get(entity['type'], 0) + 1
+                internal_id = entity['type'] + f"_{counters[entity['type']]}"
+            # the IRI is kept on the entity, the children receive it as parent
+            entity["@iri"] = URIRef(base_url + internal_id)
+
+            if parent is not None:
+                yield (parent["@iri"], items, entity["@iri"])
+                # the children are counted on their parent to know the position
+                parent["@items"] = parent.get("@items", 0) + 1
+                entity["@parent"] = parent
+
+            if containment and level == 2:
+                yield (entity["@parent"]["@parent"]["@iri"], contains, entity["@iri"])
+                yield (entity["@iri"], position, Literal(parent["@items"]))
+
+            # first value of the first language of the label, as in create_Graph
+            value_label = remove_special_chars(str(list(entity['label'].values())[0][0]))
+
+            yield (entity["@iri"], has_id, Literal(entity['id']))
+            yield (entity["@iri"], RDF.type, LEVEL_CLASSES[level])
+            yield (entity["@iri"], label, Literal(str(value_label)))
+
+    if id_mode == "counter":
+        for entity_type, file_name in COUNTER_FILES.items():
+            with open(file_name, 'w') as f:
+                f.write(str(counters[entity_type]))
@@ -0,0 +1,311 @@
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from itertools import count
+from json import dumps
+from logging import getLogger, DEBUG, WARNING
+from threading import Lock
+from time import perf_counter, time
+import pandas
+from utils.metrics import start_call, end_call, count_sqlite_rows
+
+# spans of the calls to the processors: every public method opens one, and
+# inside it the SPARQL requests, the SQLite reads and the pandas and model
+# building steps open their own, so the time of a slow call can be split
+# between them. The spans of a call share its trace id and point to their
+# parent; they are sent to the sinks of the tracer when they end (the inner
+# ones first). Nothing is measured when no tracer is set
+
+# the span open in the current thread (or task), None outside of any
+CURRENT = ContextVar("current_span", default=None)
+# tracer of the processors that have none of their own, see set_default_tracer
+DEFAULT_TRACER = None
+IDS = count(1)
+
+
+def set_default_tracer(tracer):
+    global DEFAULT_TRACER
+    DEFAULT_TRACER = tracer
+
+
+def get_default_tracer():
+    return DEFAULT_TRACER
+
+
+class Span(object):
+    __slots__ = ("id", "traceId", "parentId", "name", "kind", "start", "seconds", "rows", "bytes",
+                 "bytesSent", "query", "error", "attributes", "tracer", "began", "token")
+
+    def __init__(self, tracer, name:str, kind:str, parent, query:str=None):
+        self.id = next(IDS)
+        self.traceId = parent.traceId if parent is not None else self.id
+        self.parentId = parent.id if parent is not None else None
+        self.name = name
+        self.kind = kind
+        self.start = time()
+        self.seconds = None
+        self.rows = None
+        # bytes received and sent on the network (SPARQL), or read from the
+        # local store
+        self.bytes = 0
+        self.bytesSent = 0
+        self.query = query
+        self.error = None
+        self.attributes = dict()
+        self.tracer = tracer
+        self.began = perf_counter()
+        self.token = None
+
+    def __enter__(self):
+        self.token = CURRENT.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = perf_counter() - self.began
+        if exc_value is not None:
+            self.error = repr(exc_value)
+        CURRENT.reset(self.token)
+        self.tracer.finish(self)
+
+    def toDict(self):
+        return {
+            "id": self.id,
+            "traceId": self.traceId,
+            "parentId": self.parentId,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "bytesSent": self.bytesSent,
+            "query": self.query,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class LoggingSink(object):
+    # one log record for each span
+    def __init__(self, logger=None, level:int=DEBUG):
+        self.logger = logger if logger is not None else getLogger("processors.trace")
+        self.level = level
+
+    def emit(self, span):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "%s %s %.3f ms rows=%s bytes=%s%s%s", span.kind, span.name,
+                            span.seconds * 1000, span.rows, span.bytes,
+                            " error=" + span.error if span.error else "",
+                            "\n" + span.query if span.query else "")
+
+    def close(self):
+        pass
+
+
+class MemorySink(object):
+    # the last max_spans spans (all of them when None), for tests and notebooks
+    def __init__(self, max_spans:int=None):
+        self.spans = deque(maxlen=max_spans)
+        self.lock = Lock()
+
+    def emit(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def getSpans(self, kind:str=None):
+        with self.lock:
+            return [span for span in self.spans if kind is None or span.kind == kind]
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(object):
+    # one JSON object for each span, appended to a file
+    def __init__(self, path:str):
+        self.path = path
+        self.file = open(path, mode='a', encoding="utf-8")
+        self.lock = Lock()
+
+    def emit(self, span):
+        line = dumps(span.toDict(), default=str) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class Tracer(object):
+    # sends the spans to its sinks; the ones of kind "method", "sparql" or
+    # "sqlite" that last at least slow_threshold seconds (None: never) also
+    # go to the slow query log, a warning of the "processors.slow" logger
+    # by default
+    SLOW_KINDS = ("method", "sparql", "sqlite")
+
+    def __init__(self, sinks:list=None, slow_threshold:float=None, slow_logger=None):
+        self.sinks = list(sinks) if sinks is not None else []
+        self.slow_threshold = slow_threshold
+        self.slow_logger = slow_logger if slow_logger is not None else getLogger("processors.slow")
+        self.slow = 0
+
+    def addSink(self, sink):
+        self.sinks.append(sink)
+        return True
+
+    def getSlowThreshold(self):
+        return self.slow_threshold
+
+    def setSlowThreshold(self, slow_threshold):
+        if slow_threshold is None or (type(slow_threshold) in (int, float) and slow_threshold >= 0):
+            self.slow_threshold = slow_threshold
+            return True
+        else:
+            return False
+
+    def span(self, name:str, kind:str="step", query:str=None):
+        return Span(self, name, kind, CURRENT.get(), query)
+
+    def finish(self, span):
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception as e:
+                print(e)
+        if self.slow_threshold is not None and span.kind in self.SLOW_KINDS and span.seconds >= self.slow_threshold:
+            self.slow += 1
+            self.slow_logger.log(WARNING, "slow %s %s: %.3f s, rows=%s, bytes=%s%s", span.kind, span.name,
+                                 span.seconds, span.rows, span.bytes, "\n" + span.query if span.query else "")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        return True
+
+
+def active_tracer(processor=None):
+    # the tracer of the processor, else the one of the enclosing span (so a
+    # traced GenericQueryProcessor traces its processors too), else the default
+    tracer = getattr(processor, "tracer", None)
+    if tracer is not None:
+        return tracer
+    parent = CURRENT.get()
+    if parent is not None:
+        return parent.tracer
+    return DEFAULT_TRACER
+
+
+def count_rows(result):
+    # rows of a DataFrame, items of a list or a ResultBatch, None otherwise
+    if isinstance(result, (bool, str)) or result is None:
+        return None
+    if hasattr(result, "__len__"):
+        return len(result)
+    return 1
+
+
+class NoSpan(object):
+    # stands for the span when nothing is traced
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name:str, kind:str="step", query:str=None, processor=None):
+    # context manager of a span, to time a part of a method
+    tracer = active_tracer(processor)
+    if tracer is None:
+        return NO_SPAN
+    return tracer.span(name, kind, query)
+
+
+def traced_as(kind:str):
+    # decorator of the methods of the processors: a span of kind named after
+    # the class and the method, with the rows of the result. The "method"
+    # ones are also counted in the metrics registry of the processor (see
+    # utils.metrics)
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            tracer = active_tracer(self)
+            registry = getattr(self, "metrics", None) if kind == "method" else None
+            if tracer is None and registry is None:
+                return method(self, *args, **kwargs)
+            token = None
+            if registry is not None:
+                token = start_call(registry, type(self).__name__, method.__name__)
+            began = perf_counter()
+            error = None
+            try:
+                with tracer.span(f"{type(self).__name__}.{method.__name__}", kind) if tracer is not None else NO_SPAN as current:
+                    result = method(self, *args, **kwargs)
+                    if current is not None:
+                        current.rows = count_rows(result)
+                    return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if token is not None:
+                    end_call(token, perf_counter() - began, error)
+        return wrapper
+    return decorator
+
+
+# the public methods; the helpers use traced_as("build") (model objects and
+# batches) or traced_as("pandas") (joins and groupings)
+traced = traced_as("method")
+
+
+def add_bytes(received:int, sent:int=0):
+    # bytes moved by the current span, called by the SPARQL client
+    current = CURRENT.get()
+    if current is not None:
+        current.bytes += received
+        current.bytesSent += sent
+
+
+def set_rows(rows:int):
+    current = CURRENT.get()
+    if current is not None:
+        current.rows = rows
+
+
+def annotate(**attributes):
+    # extra attributes of the current span (e.g. cache="hit")
+    current = CURRENT.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def read_sql(query, con, *args, **kwargs):
+    # pandas.read_sql in a "sqlite" span with its query and rows
+    with span("read_sql", "sqlite", query) as current:
+        result = pandas.read_sql(query, con, *args, **kwargs)
+        count_sqlite_rows(len(result))
+        if current is not None:
+            current.rows = len(result)
+        return result
+
+
+def merge(left, right, *args, **kwargs):
+    # pandas.merge in a "pandas" span with the rows of the join
+    with span("merge", "pandas") as current:
+        result = pandas.merge(left, right, *args, **kwargs)
+        if current is not None:
+            current.rows = len(result)
+        return result